@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,15 +49,36 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Responses at least this many bytes long are compressed with brotli or
+# gzip, as the client prefers; None turns compression off. Brotli's default
+# quality (11) is too slow for dynamic responses.
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Add X-Query-Count and Server-Timing headers with per-request SQL metrics
+QUERY_METRICS = DEBUG
+
+# On-demand profiling: staff users send the header to profile a request, and
+# a fraction of all requests can be sampled. Collapsed stacks are written to
+# PROFILE_DIR; summarize them with `manage.py profile_report`.
+PROFILE_HEADER = 'X-Profile'
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_INTERVAL = 0.001  # seconds between stack samples
+PROFILE_DIR = BASE_DIR / 'profiles'
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -85,9 +107,38 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Read replica of the primary. Locally it is the same file; point it at
+    # the real replica in production and list it in DATABASE_REPLICAS.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
 }
 
+# Catalog and order history reads go to one of these aliases (see
+# core.replicas). After a write, a client reads from the primary for
+# REPLICA_PIN_SECONDS so it sees its own changes despite replication lag.
+DATABASE_ROUTERS = ['core.replicas.PrimaryReplicaRouter']
+DATABASE_REPLICAS = []
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = 'primary_until'
+
+
+# Session and user caches live here. The local memory cache is per process:
+# in production point it at a cache all workers share (e.g. RedisCache), so
+# that a logout or password change is seen by every worker at once.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Users loaded for sessions are cached for this many seconds (core.auth);
+# 0 reads auth_user on every request.
+AUTHENTICATION_BACKENDS = ['core.auth.CachedModelBackend']
+AUTH_USER_CACHE_TTL = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -131,11 +182,28 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Token bucket rate limits (core.throttling): 'N/period' lets bursts of N
+# requests through, then one per period/N. Password attempts are limited per
+# client IP and per username, the rest of the API per user, or per IP for
+# anonymous clients. Buckets are per process, or in the default cache with
+# RATE_LIMIT_STORE = 'cache'. Behind a proxy, set NUM_PROXIES in
+# REST_FRAMEWORK so clients are told apart by X-Forwarded-For.
+RATE_LIMITS = {
+    'login_ip': '30/min',
+    'login_username': '10/min',
+    'register_ip': '10/hour',
+    'anon': '600/min',
+    'user': '1200/min',
+}
+RATE_LIMIT_STORE = 'local'
+# Load tests sending everything from one address run with RATE_LIMITS_ENABLED=0
+RATE_LIMITS_ENABLED = os.environ.get('RATE_LIMITS_ENABLED', '1') != '0'
+
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'core.throttling.ThrottledBasicAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -145,8 +213,23 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # orjson-backed JSON, falling back to the stdlib when it is not installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 20
+    'PAGE_SIZE': 20,
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.AnonBucketThrottle',
+        'core.throttling.UserBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': RATE_LIMITS if RATE_LIMITS_ENABLED else dict.fromkeys(RATE_LIMITS),
 }
 
 # CORS Configuration
@@ -191,10 +274,56 @@ CSRF_TRUSTED_ORIGINS = [
 ]
 
 # Session settings for authentication
+# SESSION_MODE picks the session store: 'db' reads django_session on every
+# request; 'cache' reads sessions from the cache and writes them through to
+# the database; 'cookie' keeps them in signed cookies with no server-side
+# state, so a logged out cookie stays valid if it was copied.
+SESSION_MODE = os.environ.get('SESSION_MODE', 'db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cached_db',
+    'cookie': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_MODE]
 SESSION_COOKIE_SAMESITE = 'Lax'
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_AGE = 1209600  # 2 weeks in seconds
 
 # For development - you might want to set these differently in production
 SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
-CSRF_COOKIE_SECURE = False     # Set to True in production with HTTPS
\ No newline at end of file
+CSRF_COOKIE_SECURE = False     # Set to True in production with HTTPS
+
+# Adding a book to a cart reserves its units for this long; checkout converts
+# the reservation, and `manage.py sweep_reservations` deletes expired ones.
+STOCK_RESERVATION_TTL = 15 * 60  # seconds
+
+# Most lines POST /api/cart-items/bulk/ accepts in one request
+CART_BULK_MAX_LINES = 100
+
+# POST /api/batch/ (core.batch): most sub-requests per batch, and threads
+# serving runs of GET sub-requests concurrently (1 runs them in order)
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = 4
+
+# Google Books API used by the search endpoint. Load tests point it at the
+# local stub in core/tests/google_books_stub.py through the environment.
+GOOGLE_BOOKS_API_URL = os.environ.get('GOOGLE_BOOKS_API_URL', 'https://www.googleapis.com/books/v1/volumes')
+GOOGLE_BOOKS_TIMEOUT = 10  # seconds
+# Upstream calls in flight at once from the async search view, per process
+GOOGLE_BOOKS_MAX_CONCURRENCY = 100
+
+# Responses are cached per normalized query. Entries older than the TTL are
+# still served for the stale TTL while a background refresh runs.
+GOOGLE_BOOKS_CACHE_TTL = 300  # seconds
+GOOGLE_BOOKS_CACHE_STALE_TTL = 3600  # seconds
+GOOGLE_BOOKS_CACHE_MAX_ENTRIES = 1024
+
+# Search history is written behind: entries queue in memory and a background
+# thread inserts them in bulk every FLUSH_INTERVAL seconds or FLUSH_SIZE
+# entries. Past BUFFER_SIZE queued entries, searches insert synchronously.
+SEARCH_HISTORY_WRITE_BEHIND = True
+SEARCH_HISTORY_BUFFER_SIZE = 10000
+SEARCH_HISTORY_FLUSH_SIZE = 500
+SEARCH_HISTORY_FLUSH_INTERVAL = 1.0  # seconds
+
+# Refresh price and description of already known books from search results
+GOOGLE_BOOKS_UPDATE_EXISTING = False
@@ -1,10 +1,33 @@
 from django.contrib import admin
+from .inventory import stock_edited
 from .models import Book,Cart,CartItem,Order,OrderItem,SearchHistory,UserProfile
+from .replicas import pinned_to_primary, replica_reads
 
-admin.site.register(Book)
+
+class SearchHistoryAdmin(admin.ModelAdmin):
+    list_display = ['query', 'user', 'search_date']
+    list_select_related = ['user']
+
+    def changelist_view(self, request, extra_context=None):
+        # History is append-only and large, so browsing it is served from a replica
+        if request.method != 'GET' or pinned_to_primary(request):
+            return super().changelist_view(request, extra_context)
+        with replica_reads():
+            return super().changelist_view(request, extra_context).render()
+
+
+class BookAdmin(admin.ModelAdmin):
+    readonly_fields = ['stock_shards']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        stock_edited(obj, form.changed_data)
+
+
+admin.site.register(Book, BookAdmin)
 admin.site.register(Cart)
 admin.site.register(CartItem)
 admin.site.register(Order)
 admin.site.register(OrderItem)
-admin.site.register(SearchHistory)
+admin.site.register(SearchHistory, SearchHistoryAdmin)
 admin.site.register(UserProfile)
@@ -0,0 +1,37 @@
+"""
+Authentication backend that caches the users it loads for sessions.
+
+With ModelBackend every request with a session cookie reads its user from
+auth_user. CachedModelBackend keeps each user in the default cache for
+AUTH_USER_CACHE_TTL seconds. Saving or deleting a user, which includes
+password changes and the last_login update at login, and logging out drop
+the entry (see the receivers in core.models). Changes made with
+queryset.update() or from another process sharing no cache are picked up
+when the entry expires, hence the short TTL.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def forget_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        ttl = settings.AUTH_USER_CACHE_TTL
+        if not ttl:
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # None for unknown and inactive users, which are not cached
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, ttl)
+        return user
@@ -0,0 +1,152 @@
+"""
+In-process execution of batched API sub-requests, for POST /api/batch/.
+
+Each sub-request is built from the batch request, dispatched straight to
+the view its path resolves to, without going through the middleware again,
+and shares the batch request's session and authenticated user, so those
+are loaded once per batch. Runs of consecutive GET sub-requests are served
+concurrently from a thread pool, each thread with its own database
+connection; any other method waits for what came before it and runs on the
+request's thread. Inside a transaction (ATOMIC_REQUESTS, tests) everything
+runs on the request's thread, so sub-requests see its uncommitted writes.
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.exception import response_for_exception
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections, connection
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+
+SAFE_METHODS = ('GET', 'HEAD')
+# Views that replace the session or the user, which sub-requests share
+EXCLUDED_VIEWS = {'login', 'logout', 'register', 'batch'}
+# Headers that describe the batch request itself rather than its sub-requests
+BATCH_HEADERS = {'CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_ACCEPT', 'HTTP_ACCEPT_ENCODING',
+                 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE'}
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def thread_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        # Threads do not survive a fork; start a new pool in the child
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=settings.BATCH_MAX_WORKERS, thread_name_prefix='batch')
+            _pool_pid = os.getpid()
+    return _pool
+
+
+def build_request(request, user, spec):
+    """A WSGIRequest for `spec` that reuses `request`'s session, user and headers"""
+    body = b'' if spec.get('body') is None else json.dumps(spec['body']).encode()
+    environ = {key: value for key, value in request.META.items()
+               if isinstance(value, str) and key not in BATCH_HEADERS}
+    environ.update({
+        'REQUEST_METHOD': spec['method'],
+        'PATH_INFO': spec['path'],
+        'QUERY_STRING': urlencode(spec.get('params', {}), doseq=True),
+        'HTTP_ACCEPT': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': BytesIO(body),
+        'wsgi.url_scheme': request.scheme,
+    })
+    if body:
+        environ['CONTENT_TYPE'] = 'application/json'
+    sub_request = WSGIRequest(environ)
+    sub_request.session = request.session
+    sub_request.user = user
+
+    async def auser():
+        return user
+    # What AuthenticationMiddleware gives async views
+    sub_request.auser = auser
+    # The batch request itself passed the CSRF check
+    sub_request._dont_enforce_csrf_checks = True
+    return sub_request
+
+
+def dispatch(request, user, spec):
+    """Run one sub-request through its view and return the rendered response"""
+    try:
+        match = resolve(spec['path'])
+    except Resolver404:
+        return HttpResponse(b'{"detail":"Not found."}', status=404, content_type='application/json')
+    if match.url_name in EXCLUDED_VIEWS:
+        return HttpResponse(json.dumps({'detail': f'{spec["path"]} cannot be batched.'}),
+                            status=400, content_type='application/json')
+
+    sub_request = build_request(request, user, spec)
+    sub_request.resolver_match = match
+    view = async_to_sync(match.func) if iscoroutinefunction(match.func) else match.func
+    try:
+        response = view(sub_request, *match.args, **match.kwargs)
+        if callable(getattr(response, 'render', None)):
+            response = response.render()
+    except Exception as exc:
+        response = response_for_exception(sub_request, exc)
+    return response
+
+
+def _dispatch_in_thread(request, user, spec):
+    try:
+        return dispatch(request, user, spec)
+    finally:
+        # What the request_finished signal does for a normal request
+        close_old_connections()
+
+
+def encode(response):
+    """One envelope entry; JSON bodies are embedded as they are, without re-parsing"""
+    content = b''.join(response.streaming_content) if response.streaming else response.content
+    if not content:
+        body = b'null'
+    elif response.get('Content-Type', '').startswith('application/json'):
+        body = content
+    else:
+        body = json.dumps(content.decode(response.charset, 'replace')).encode()
+    headers = {name: value for name, value in response.items() if name != 'Content-Length'}
+    return b'{"status":%d,"headers":%s,"body":%s}' % (response.status_code, json.dumps(headers).encode(), body)
+
+
+def run_batch(request, user, specs):
+    """
+    Run the sub-requests in `specs` ({method, path, params, body}) for
+    `request` and its authenticated `user`; returns the JSON envelope
+    {"responses": [{status, headers, body}, ...]} in the same order.
+    """
+    responses = [None] * len(specs)
+    concurrent = settings.BATCH_MAX_WORKERS > 1 and not connection.in_atomic_block
+    reads = []
+
+    def run_reads():
+        if concurrent and len(reads) > 1:
+            futures = [(index, thread_pool().submit(_dispatch_in_thread, request, user, specs[index]))
+                       for index in reads]
+            for index, future in futures:
+                responses[index] = future.result()
+        else:
+            for index in reads:
+                responses[index] = dispatch(request, user, specs[index])
+        reads.clear()
+
+    for index, spec in enumerate(specs):
+        if spec['method'] in SAFE_METHODS:
+            reads.append(index)
+            continue
+        run_reads()
+        responses[index] = dispatch(request, user, spec)
+    run_reads()
+
+    return HttpResponse(b'{"responses":[' + b','.join(encode(response) for response in responses) + b']}',
+                        content_type='application/json')
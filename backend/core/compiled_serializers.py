@@ -0,0 +1,152 @@
+import decimal
+from operator import methodcaller
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from rest_framework import fields as drf_fields
+from rest_framework import serializers
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+def _identity(value):
+    return value
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output:
+        return field.to_representation
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+    return convert
+
+
+def _date_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+    if output_format is None or output_format.lower() != drf_fields.ISO_8601:
+        return field.to_representation
+    return methodcaller('isoformat')
+
+
+def converter_for(field, model_field):
+    """
+    A function turning a database value into exactly what `field` would
+    render, skipping DRF's per-value checks where they cannot change the result.
+    """
+    field_type = type(field)
+    if field_type is drf_fields.IntegerField and isinstance(model_field, models.IntegerField):
+        return _identity
+    if field_type is drf_fields.CharField and isinstance(model_field, (models.CharField, models.TextField)):
+        return _identity
+    if field_type is drf_fields.DecimalField:
+        return _decimal_converter(field)
+    if field_type is drf_fields.DateField:
+        return _date_converter(field)
+    return field.to_representation
+
+
+class CompiledSerializer:
+    """
+    Read-only renderer for the flat fields of a ModelSerializer.
+
+    The serializer's field tree is inspected once; rows then come straight
+    from queryset.values() and go through one precomputed converter per
+    field, without instantiating fields or model objects per row. The output
+    is identical to `serializer_class(instances, many=True).data`.
+    Nested serializers and non-model fields are not supported. `sources`
+    maps field names to the annotations they read instead of their column.
+    """
+
+    def __init__(self, serializer_class, sources=None):
+        self.serializer_class = serializer_class
+        self.source_overrides = sources or {}
+        self._compiled = None
+
+    def compile(self):
+        if self._compiled is None:
+            serializer = self.serializer_class()
+            model = serializer.Meta.model
+            compiled = []
+            for name, field in serializer.fields.items():
+                if field.write_only:
+                    continue
+                if isinstance(field, (serializers.BaseSerializer, serializers.RelatedField)) or \
+                        field.source == '*' or '.' in field.source:
+                    raise ImproperlyConfigured(
+                        f'{self.serializer_class.__name__}.{name} is not a flat model field'
+                    )
+                model_field = model._meta.get_field(field.source)
+                source = self.source_overrides.get(name, model_field.attname)
+                compiled.append((name, source, converter_for(field, model_field)))
+            self._compiled = compiled
+        return self._compiled
+
+    def subset(self, names):
+        """A CompiledSerializer rendering only the fields in `names`"""
+        subset = CompiledSerializer(self.serializer_class, self.source_overrides)
+        subset._compiled = [entry for entry in self.compile() if entry[0] in names]
+        return subset
+
+    @property
+    def sources(self):
+        return [source for _, source, _ in self.compile()]
+
+    def values(self, queryset, extra=()):
+        """queryset.values() with the columns render() needs, plus `extra` ones"""
+        sources = self.sources
+        return queryset.values(*sources, *(name for name in extra if name not in sources))
+
+    def to_representation(self, row):
+        return {
+            name: None if row[source] is None else convert(row[source])
+            for name, source, convert in self.compile()
+        }
+
+    def render(self, rows):
+        compiled = self.compile()
+        return [
+            {name: None if row[source] is None else convert(row[source]) for name, source, convert in compiled}
+            for row in rows
+        ]
+
+
+class CompiledReadMixin:
+    """
+    list and retrieve rendered through the view's `read_serializer`, a
+    CompiledSerializer, instead of serializer_class.
+    """
+    read_serializer = None
+
+    def get_read_serializer(self):
+        return self.read_serializer
+
+    def list(self, request, *args, **kwargs):
+        read_serializer = self.get_read_serializer()
+        queryset = self.filter_queryset(self.get_queryset())
+        extra = ()
+        if hasattr(self.paginator, 'get_ordering_names'):
+            extra = self.paginator.get_ordering_names(queryset)
+        rows = read_serializer.values(queryset, extra=extra)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(read_serializer.render(page))
+        return Response(read_serializer.render(rows))
+
+    def retrieve(self, request, *args, **kwargs):
+        read_serializer = self.get_read_serializer()
+        queryset = read_serializer.values(self.filter_queryset(self.get_queryset()))
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(queryset, **{self.lookup_field: kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        return Response(read_serializer.to_representation(row))
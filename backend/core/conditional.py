@@ -0,0 +1,91 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import Book, CatalogVersion, StockShard
+
+
+def latest(*timestamps):
+    timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+    return max(timestamps) if timestamps else None
+
+
+def catalog_version():
+    """(counter, time) of the last book deletion"""
+    return CatalogVersion.objects.filter(pk=1).values_list('version', 'updated_at').first() or (0, None)
+
+
+def catalog_state():
+    """
+    Validators for the whole catalog, from three index lookups. Sharded
+    stock changes touch only StockShard.updated_at, hence the third.
+    """
+    version, deleted_at = catalog_version()
+    last_book_change = Book.objects.aggregate(latest=Max('updated_at'))['latest']
+    last_stock_change = StockShard.objects.aggregate(latest=Max('updated_at'))['latest']
+    return (version, last_book_change, last_stock_change), latest(deleted_at, last_book_change, last_stock_change)
+
+
+def owner_state(queryset, items):
+    """
+    Validators for a user's carts or orders: how many there are, their latest
+    updated_at and the latest updated_at of the books in them and of their
+    stock shards. `items` is the related name of the lines holding the books.
+    Deleted books take their lines with them, so the catalog deletion counter
+    is included.
+    """
+    state = queryset.aggregate(
+        count=Count('id', distinct=True),
+        latest=Max('updated_at'),
+        books=Max(f'{items}__book__updated_at'),
+        stock=Max(f'{items}__book__shards__updated_at'),
+    )
+    version, deleted_at = catalog_version()
+    key = (state['count'], state['latest'], state['books'], state['stock'], version)
+    return key, latest(state['latest'], state['books'], state['stock'], deleted_at)
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified support for the list and retrieve actions.
+
+    Views implement get_validators() to describe their current state with
+    cheap queries, returning (key, last_modified) or None to skip. The ETag
+    hashes that key with the request path, query string, user and renderer,
+    so a matching If-None-Match or If-Modified-Since gets a 304 before
+    anything is serialized.
+    """
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def make_etag(self, request, key):
+        renderer = getattr(request, 'accepted_renderer', None)
+        seed = repr((key, request.get_full_path(), request.user.pk, renderer and renderer.format))
+        return '"%s"' % hashlib.md5(seed.encode(), usedforsecurity=False).hexdigest()
+
+    def conditional(self, handler, request, *args, **kwargs):
+        validators = self.get_validators()
+        if validators is None:
+            return handler(request, *args, **kwargs)
+
+        key, last_modified = validators
+        etag = self.make_etag(request, key)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,148 @@
+"""
+Sparse fieldsets: ?fields= and ?omit= on list and retrieve.
+
+Both take comma-separated field names, dotted to reach into nested
+serializers: `?fields=id,title,price` renders only those fields of a book,
+`?fields=total_items` only a cart's item count, `?omit=items.book.description`
+a cart without its books' descriptions. A nested name without a dot keeps or
+drops the whole nested object. The querysets behind the response are
+narrowed to match, so the columns that are not rendered are not fetched.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def parse_fieldset(value):
+    """'id,items.book.title' -> {'id': {}, 'items': {'book': {'title': {}}}}"""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def _fields_of(serializer):
+    return getattr(serializer, 'child', serializer).fields
+
+
+def prune(serializer, tree, keep, param, prefix=''):
+    """
+    Drop fields from `serializer` and its nested serializers: those not in
+    `tree` when `keep`, those in it otherwise. Unknown names are a 400.
+    """
+    fields = _fields_of(serializer)
+    for name, subtree in tree.items():
+        path = prefix + name
+        if name not in fields:
+            raise serializers.ValidationError({param: f'Unknown field "{path}".'})
+        if subtree and not isinstance(fields[name], serializers.BaseSerializer):
+            raise serializers.ValidationError({param: f'"{path}" has no nested fields.'})
+    for name in list(fields):
+        if name not in tree:
+            if keep:
+                del fields[name]
+        elif tree[name]:
+            prune(fields[name], tree[name], keep, param, f'{prefix}{name}.')
+        elif not keep:
+            del fields[name]
+
+
+def columns(serializer, prefix=''):
+    """
+    The field paths, for QuerySet.only(), of the columns `serializer`
+    renders, following nested serializers of forward relations. None when a
+    field may read anything on the instance. Nested lists are left to the
+    caller, which prefetches them.
+    """
+    serializer = getattr(serializer, 'child', serializer)
+    opts = serializer.Meta.model._meta
+    paths = [prefix + opts.pk.name]
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*' or '.' in field.source:
+            return None
+        try:
+            model_field = opts.get_field(field.source)
+        except FieldDoesNotExist:
+            # A property backed by an annotation
+            continue
+        if not model_field.concrete:
+            continue
+        paths.append(prefix + field.source)
+        if isinstance(field, serializers.BaseSerializer):
+            nested = columns(field, f'{prefix}{field.source}__')
+            if nested is None:
+                return None
+            paths.extend(nested)
+    return paths
+
+
+def _related_lookups(tree, prefix=''):
+    for name, subtree in tree.items():
+        yield prefix + name
+        yield from _related_lookups(subtree, f'{prefix}{name}__')
+
+
+class SparseFieldsetMixin:
+    """
+    ?fields= and ?omit= for the list and retrieve actions of a viewset.
+    The serializers from get_serializer() are pruned; get_queryset()
+    narrows its querysets with sparse_queryset().
+    """
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+    sparse_actions = ('list', 'retrieve')
+
+    def get_fieldset(self):
+        """(fields tree or None, omit tree or None), or None when neither is asked for"""
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = None
+            if self.action in self.sparse_actions:
+                params = self.request.query_params
+                fields = parse_fieldset(params.get(self.fields_query_param, ''))
+                omit = parse_fieldset(params.get(self.omit_query_param, ''))
+                if fields or omit:
+                    self._fieldset = fields or None, omit or None
+        return self._fieldset
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            fields, omit = fieldset
+            if fields:
+                prune(serializer, fields, True, self.fields_query_param)
+            if omit:
+                prune(serializer, omit, False, self.omit_query_param)
+        return serializer
+
+    def sparse_queryset(self, queryset, *path, keep=()):
+        """
+        `queryset` loading only the columns rendered by the serializer, or
+        by the nested one at `path`, plus the `keep` ones (e.g. the foreign
+        key a prefetch joins on). None when that nested field is not
+        rendered at all. Unchanged without a fieldset.
+        """
+        if self.get_fieldset() is None:
+            return queryset
+        if not hasattr(self, '_sparse_serializer'):
+            self._sparse_serializer = self.get_serializer()
+        serializer = self._sparse_serializer
+        for name in path:
+            serializer = _fields_of(serializer).get(name)
+            if serializer is None:
+                return None
+        paths = columns(serializer)
+        if paths is None:
+            return queryset
+        related = queryset.query.select_related
+        if isinstance(related, dict):
+            # A relation cannot be both deferred and followed
+            lookups = [lookup for lookup in _related_lookups(related) if lookup in paths]
+            queryset = queryset.select_related(None)
+            if lookups:
+                # select_related() without lookups follows every foreign key
+                queryset = queryset.select_related(*lookups)
+        return queryset.only(*paths, *keep)
@@ -0,0 +1,93 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+# Name of the SQLite FTS5 table mirroring core_book (see migration 0005)
+SQLITE_FTS_TABLE = 'core_book_fts'
+
+# Must stay identical to the expression indexed in migration 0005,
+# otherwise Postgres will not use the GIN index.
+POSTGRES_BOOK_VECTOR = (
+    "to_tsvector('english', coalesce(title, '') || ' ' || "
+    "coalesce(author, '') || ' ' || coalesce(description, ''))"
+)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_tokens(search_terms):
+    """Reduce raw search terms to plain word tokens safe for MATCH / to_tsquery"""
+    tokens = []
+    for term in search_terms:
+        tokens.extend(TOKEN_RE.findall(term.lower()))
+    return tokens
+
+
+def sqlite_match_query(tokens):
+    # Every token must match, each one as a prefix ("pyth" finds "python")
+    return ' AND '.join(f'"{token}"*' for token in tokens)
+
+
+def postgres_tsquery(tokens):
+    return ' & '.join(f'{token}:*' for token in tokens)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter backed by the full-text index on Book.
+
+    Matches go through FTS5 on SQLite and a tsvector GIN index on Postgres,
+    ranked by relevance unless the client asks for an explicit ordering.
+    Other database vendors fall back to the icontains scan of SearchFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+
+        vendor = connection.vendor
+        if vendor not in ('sqlite', 'postgresql'):
+            return super().filter_queryset(request, queryset, view)
+
+        tokens = search_tokens(search_terms)
+        if not tokens:
+            return queryset.none()
+
+        if vendor == 'sqlite':
+            queryset = self.filter_sqlite(queryset, tokens)
+        else:
+            queryset = self.filter_postgres(queryset, tokens)
+
+        if not request.query_params.get(filters.OrderingFilter.ordering_param):
+            queryset = queryset.order_by('-search_rank', 'id')
+        return queryset
+
+    def filter_sqlite(self, queryset, tokens):
+        match = sqlite_match_query(tokens)
+        table = queryset.model._meta.db_table
+        matches = RawSQL(
+            f'SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s',
+            (match,),
+        )
+        # bm25() is lower for better matches, so negate it to rank descending
+        rank = RawSQL(
+            f'SELECT -bm25({SQLITE_FTS_TABLE}, 10.0, 5.0, 1.0) FROM {SQLITE_FTS_TABLE} '
+            f'WHERE {SQLITE_FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            (match,),
+            output_field=FloatField(),
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+    def filter_postgres(self, queryset, tokens):
+        tsquery = postgres_tsquery(tokens)
+        table = queryset.model._meta.db_table
+        vector = POSTGRES_BOOK_VECTOR.replace('coalesce(', f'coalesce({table}.')
+        matches = RawSQL(
+            f"{vector} @@ to_tsquery('english', %s)", (tsquery,), output_field=BooleanField()
+        )
+        rank = RawSQL(f"ts_rank({vector}, to_tsquery('english', %s))", (tsquery,), output_field=FloatField())
+        return queryset.filter(matches).annotate(search_rank=rank)
@@ -0,0 +1,272 @@
+import asyncio
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import httpx
+import requests
+from django.conf import settings
+
+
+def normalize_query(query):
+    """Case and whitespace insensitive cache key for a search query"""
+    return ' '.join(query.lower().split())
+
+
+class _CacheEntry:
+    __slots__ = ('value', 'fresh_until', 'stale_until')
+
+    def __init__(self, value, fresh_until, stale_until):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class _Flight:
+    """A fetch in progress that other callers for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._waiters = []  # (loop, future) of coroutines waiting
+
+    def finish(self):
+        with self._lock:
+            self.done.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    async def wait(self):
+        """done.wait() for coroutines, without tying up a thread"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self.done.is_set():
+                return
+            self._waiters.append((loop, future))
+        await future
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with a TTL, single-flight loading and
+    stale-while-revalidate.
+
+    Entries are fresh for `ttl` seconds. For a further `stale_ttl` seconds
+    the old value is still returned while one background thread refreshes
+    it. Concurrent misses on the same key share a single call to the loader.
+    Only values accepted by `cacheable` are stored.
+
+    aget() is the same for coroutines and async loaders; sync and async
+    callers share entries and in-flight loads.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300, stale_ttl=3600,
+                 cacheable=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cacheable = cacheable or (lambda value: True)
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _lookup(self, key, refresh):
+        """
+        Return (hit, value, flight, leader). On a stale hit, call
+        refresh(flight) to start a background reload unless one is running.
+        """
+        with self._lock:
+            now = self.clock()
+            entry = self._entries.get(key)
+            if entry is not None and now < entry.stale_until:
+                self._entries.move_to_end(key)
+                if now >= entry.fresh_until and key not in self._flights:
+                    refresh(self._flights.setdefault(key, _Flight()))
+                return True, entry.value, None, False
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            return False, None, flight, leader
+
+    def get(self, key, loader):
+        hit, value, flight, leader = self._lookup(key, lambda flight: threading.Thread(
+            target=self._load, args=(key, loader, flight), daemon=True).start())
+        if hit:
+            return value
+
+        if leader:
+            self._load(key, loader, flight)
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    async def aget(self, key, loader):
+        hit, value, flight, leader = self._lookup(key, lambda flight: self._spawn(self._aload(key, loader, flight)))
+        if hit:
+            return value
+
+        if leader:
+            await self._aload(key, loader, flight)
+        else:
+            await flight.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _spawn(self, coroutine):
+        # The event loop only keeps weak references to tasks
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _load(self, key, loader, flight):
+        try:
+            flight.value = loader()
+        except Exception as exc:
+            flight.error = exc
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            self._land(key, flight)
+
+    async def _aload(self, key, loader, flight):
+        try:
+            flight.value = await loader()
+        except Exception as exc:
+            flight.error = exc
+        except BaseException as exc:
+            # The request was cancelled, e.g. its client went away: the
+            # waiters get the cancellation, and later lookups load afresh
+            flight.error = exc
+            raise
+        finally:
+            self._land(key, flight)
+
+    def _land(self, key, flight):
+        with self._lock:
+            if flight.error is None and self.cacheable(flight.value):
+                self._store(key, flight.value)
+            del self._flights[key]
+        flight.finish()
+
+    def _store(self, key, value):
+        now = self.clock()
+        self._entries[key] = _CacheEntry(value, now + self.ttl, now + self.ttl + self.stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def volume_books(data):
+    """Book rows, as dicts with the Book field names, from a volumes API response"""
+    books = []
+    for item in data.get('items', []):
+        volume = item.get('volumeInfo', {})
+        books.append({
+            'title': volume.get('title', 'Unknown'),
+            'author': ', '.join(volume.get('authors', [])) if 'authors' in volume else 'Unknown',
+            'description': volume.get('description', ''),
+            'published_date': volume.get('publishedDate', ''),
+            'isbn': volume.get('industryIdentifiers', [{}])[0].get('identifier', ''),
+            'price': volume.get('retailPrice', {}).get('amount', 0)
+        })
+    return books
+
+
+def fetch_volumes_uncached(query):
+    """Call the Google Books volumes API, returning (status_code, json or None)"""
+    response = requests.get(
+        settings.GOOGLE_BOOKS_API_URL,
+        params={'q': query},
+        timeout=settings.GOOGLE_BOOKS_TIMEOUT,
+    )
+    if response.status_code != 200:
+        return response.status_code, None
+    return response.status_code, response.json()
+
+
+volume_cache = QueryCache(
+    max_entries=settings.GOOGLE_BOOKS_CACHE_MAX_ENTRIES,
+    ttl=settings.GOOGLE_BOOKS_CACHE_TTL,
+    stale_ttl=settings.GOOGLE_BOOKS_CACHE_STALE_TTL,
+    cacheable=lambda result: result[0] == 200,
+)
+
+
+def fetch_volumes(query):
+    """Cached fetch_volumes_uncached, keyed on the normalized query"""
+    key = normalize_query(query)
+    return volume_cache.get(key, lambda: fetch_volumes_uncached(key))
+
+
+# One pooled client and concurrency cap per event loop: both are bound to
+# the loop they are first used on. Under ASGI there is a single loop.
+_async_state = weakref.WeakKeyDictionary()
+
+
+def _client_and_semaphore():
+    loop = asyncio.get_running_loop()
+    state = _async_state.get(loop)
+    if state is None:
+        limit = settings.GOOGLE_BOOKS_MAX_CONCURRENCY
+        client = httpx.AsyncClient(
+            timeout=settings.GOOGLE_BOOKS_TIMEOUT,
+            limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit),
+        )
+        state = _async_state[loop] = (client, asyncio.Semaphore(limit))
+    return state
+
+
+async def aclose_client():
+    """Close the pooled client of the running event loop"""
+    state = _async_state.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state[0].aclose()
+
+
+async def afetch_volumes_uncached(query):
+    """
+    fetch_volumes_uncached() on the shared async client. At most
+    GOOGLE_BOOKS_MAX_CONCURRENCY calls run at once; the rest queue, and
+    queueing counts towards GOOGLE_BOOKS_TIMEOUT, after which TimeoutError
+    is raised.
+    """
+    client, semaphore = _client_and_semaphore()
+    async with asyncio.timeout(settings.GOOGLE_BOOKS_TIMEOUT):
+        async with semaphore:
+            response = await client.get(settings.GOOGLE_BOOKS_API_URL, params={'q': query})
+    if response.status_code != 200:
+        return response.status_code, None
+    return response.status_code, response.json()
+
+
+async def afetch_volumes(query):
+    """Cached afetch_volumes_uncached, sharing the cache with fetch_volumes"""
+    key = normalize_query(query)
+    return await volume_cache.aget(key, lambda: afetch_volumes_uncached(key))
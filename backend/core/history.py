@@ -0,0 +1,207 @@
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .google_books import normalize_query
+from .models import SearchHistory, SearchQueryDaily, UserSearchDaily
+
+logger = logging.getLogger(__name__)
+
+QUERY_MAX_LENGTH = SearchQueryDaily._meta.get_field('query').max_length
+
+
+def rollup_counts(entries):
+    """Searches per (day, normalized query) and per (user id, day) among `entries`"""
+    queries, users = Counter(), Counter()
+    for entry in entries:
+        day = timezone.localdate(entry.search_date)
+        queries[day, normalize_query(entry.query)[:QUERY_MAX_LENGTH]] += 1
+        users[entry.user_id, day] += 1
+    return queries, users
+
+
+def increment_counts(model, key_fields, counts):
+    """
+    Add `counts` ({key values: n}) to the `count` of the `model` rows keyed
+    on `key_fields`, creating the missing rows. One upsert statement on
+    SQLite and Postgres; rows are written in key order so concurrent
+    writers lock them in the same order.
+    """
+    if not counts:
+        return
+    fields = [model._meta.get_field(name) for name in key_fields]
+    rows = [
+        (*(field.get_db_prep_value(value, connection) for field, value in zip(fields, key)), n)
+        for key, n in sorted(counts.items())
+    ]
+    if connection.vendor in ('sqlite', 'postgresql'):
+        qn = connection.ops.quote_name
+        table, keys = qn(model._meta.db_table), ', '.join(qn(field.column) for field in fields)
+        placeholders = ', '.join(['%s'] * (len(fields) + 1))
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {table} ({keys}, count) VALUES ({placeholders}) '
+                f'ON CONFLICT ({keys}) DO UPDATE SET count = {table}.count + excluded.count',
+                rows,
+            )
+        return
+    for key, n in sorted(counts.items()):
+        lookup = dict(zip(key_fields, key))
+        if not model.objects.filter(**lookup).update(count=F('count') + n):
+            model.objects.create(**lookup, count=n)
+
+
+def add_to_rollups(entries):
+    queries, users = rollup_counts(entries)
+    increment_counts(SearchQueryDaily, ('day', 'query'), queries)
+    increment_counts(UserSearchDaily, ('user', 'day'), users)
+
+
+def save_history(entries, batch_size=None):
+    """Insert SearchHistory entries and count them in the daily rollups, in one transaction"""
+    with transaction.atomic():
+        SearchHistory.objects.bulk_create(entries, batch_size=batch_size)
+        add_to_rollups(entries)
+
+
+class HistoryBuffer:
+    """
+    Write-behind buffer for SearchHistory (and its rollups).
+
+    record() queues an entry in memory and returns. A background thread
+    inserts the queue with one bulk_create when `flush_size` entries are
+    waiting or `flush_interval` seconds after the last flush, whichever
+    comes first, and once more at interpreter exit. When `max_size` entries
+    are already waiting, record() inserts synchronously instead of growing
+    the queue. Entries still queued when the process is killed are lost.
+
+    A batch that fails to insert, e.g. while SQLite is locked, goes back to
+    the front of the queue, up to `max_size` entries, and is tried again at
+    the next flush. After `max_attempts` failures its entries are inserted
+    one by one, so only those that cannot be saved are dropped.
+    """
+
+    def __init__(self, max_size=10000, flush_size=500, flush_interval=1.0, max_attempts=3):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self._reset()
+        atexit.register(self.close)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._entries = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._failures = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def record(self, user, query):
+        entry = SearchHistory(user=user, query=query, search_date=timezone.now())
+        # Inside a transaction, commit or roll back with the caller
+        if connection.in_atomic_block or not self._offer(entry):
+            save_history([entry])
+
+    def _offer(self, entry):
+        """Queue `entry`, returning False when the buffer is full or closed"""
+        if self._pid != os.getpid():
+            # Forked: the parent's thread and queue are not ours
+            self._reset()
+        with self._lock:
+            if self._closed or len(self._entries) >= self.max_size:
+                return False
+            self._entries.append(entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='search-history-flush', daemon=True)
+                self._thread.start()
+            if len(self._entries) >= self.flush_size:
+                self._wake.set()
+        return True
+
+    def flush(self):
+        """Insert everything queued so far; returns how many entries were written"""
+        with self._lock:
+            batch, self._entries = self._entries, []
+        if not batch:
+            return 0
+        try:
+            save_history(batch, batch_size=self.flush_size)
+        except Exception:
+            self._failures += 1
+            # Once closed there is no later flush to retry in
+            if self._failures < self.max_attempts and not self._closed:
+                logger.warning('Requeued %d search history entries', len(batch), exc_info=True)
+                self._requeue(batch)
+                return 0
+            self._failures = 0
+            return self._save_each(batch)
+        self._failures = 0
+        return len(batch)
+
+    def _requeue(self, batch):
+        """Put `batch` back in front of the entries queued since, keeping at most max_size"""
+        with self._lock:
+            self._entries = batch + self._entries
+            dropped = len(self._entries) - self.max_size
+            if dropped > 0:
+                del self._entries[self.max_size:]
+        if dropped > 0:
+            logger.error('Dropped %d search history entries, the buffer is full', dropped)
+
+    def _save_each(self, batch):
+        """Insert the entries of `batch` one at a time; returns how many were written"""
+        saved, error = 0, None
+        for entry in batch:
+            try:
+                save_history([entry])
+            except Exception as exc:
+                error = exc
+            else:
+                saved += 1
+        if error is not None:
+            logger.error('Dropped %d search history entries', len(batch) - saved, exc_info=error)
+        return saved
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            close_old_connections()
+
+    def close(self):
+        """Stop the flush thread and write what is left"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        self._wake.set()
+        if thread is not None and self._pid == os.getpid():
+            thread.join()
+        self.flush()
+
+
+history_buffer = HistoryBuffer(
+    max_size=settings.SEARCH_HISTORY_BUFFER_SIZE,
+    flush_size=settings.SEARCH_HISTORY_FLUSH_SIZE,
+    flush_interval=settings.SEARCH_HISTORY_FLUSH_INTERVAL,
+)
+
+
+def record_search(user, query):
+    """Save a search to the history, through the write-behind buffer unless it is disabled"""
+    if settings.SEARCH_HISTORY_WRITE_BEHIND:
+        history_buffer.record(user, query)
+    else:
+        save_history([SearchHistory(user=user, query=query)])
@@ -0,0 +1,263 @@
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+
+from .inventory import set_stock
+from .models import Book
+
+ISBN_MAX_LENGTH = Book._meta.get_field('isbn').max_length
+TITLE_MAX_LENGTH = Book._meta.get_field('title').max_length
+AUTHOR_MAX_LENGTH = Book._meta.get_field('author').max_length
+PRICE_MAX_DIGITS = Book._meta.get_field('price').max_digits
+PRICE_DECIMAL_PLACES = Book._meta.get_field('price').decimal_places
+
+# Book fields an ingested row may set besides isbn
+BOOK_FIELDS = ('title', 'author', 'description', 'price', 'stock', 'published_date')
+
+
+@dataclass
+class IngestResult:
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+    def __iadd__(self, other):
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.skipped += other.skipped
+        return self
+
+
+def parse_published_date(value):
+    """Google Books dates may be 'YYYY-MM-DD', 'YYYY-MM' or 'YYYY'; only the first is kept"""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def parse_price(value):
+    try:
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        return Decimal('0.00')
+
+
+def parse_stock(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def clean_book_row(row):
+    """
+    Strictly validate one raw row (strings, as read from CSV or JSON) and
+    return it with typed values. Raises ValueError describing the problem.
+    Unlike the lenient parse_* helpers, malformed values are rejected.
+    """
+    isbn = str(row.get('isbn') or '').strip()
+    if not isbn:
+        raise ValueError('isbn is required')
+    if len(isbn) > ISBN_MAX_LENGTH:
+        raise ValueError(f'isbn {isbn!r} is longer than {ISBN_MAX_LENGTH} characters')
+
+    title = str(row.get('title') or '').strip()
+    if not title:
+        raise ValueError('title is required')
+    if len(title) > TITLE_MAX_LENGTH:
+        raise ValueError(f'title is longer than {TITLE_MAX_LENGTH} characters')
+
+    author = str(row.get('author') or '').strip()
+    if len(author) > AUTHOR_MAX_LENGTH:
+        raise ValueError(f'author is longer than {AUTHOR_MAX_LENGTH} characters')
+
+    cleaned = {'isbn': isbn, 'title': title, 'author': author,
+               'description': str(row.get('description') or '')}
+
+    price = row.get('price')
+    if price not in (None, ''):
+        try:
+            value = Decimal(str(price).strip())
+        except InvalidOperation:
+            raise ValueError(f'invalid price {price!r}')
+        # NaN and Infinity parse, but cannot be compared or stored
+        if not value.is_finite():
+            raise ValueError(f'invalid price {price!r}')
+        if value < 0:
+            raise ValueError(f'negative price {price!r}')
+        if value.normalize().as_tuple().exponent < -PRICE_DECIMAL_PLACES:
+            raise ValueError(f'price {price!r} has more than {PRICE_DECIMAL_PLACES} decimal places')
+        if value.adjusted() >= PRICE_MAX_DIGITS - PRICE_DECIMAL_PLACES:
+            raise ValueError(f'price {price!r} has more than {PRICE_MAX_DIGITS} digits')
+        cleaned['price'] = value.quantize(Decimal(1).scaleb(-PRICE_DECIMAL_PLACES))
+
+    stock = row.get('stock')
+    if stock not in (None, ''):
+        try:
+            cleaned['stock'] = int(stock)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f'invalid stock {stock!r}')
+        # int() truncates numbers from JSON, e.g. 2.5
+        if not isinstance(stock, str) and cleaned['stock'] != stock:
+            raise ValueError(f'stock {stock!r} is not a whole number')
+        if cleaned['stock'] < 0:
+            raise ValueError(f'negative stock {stock!r}')
+
+    published_date = row.get('published_date')
+    if published_date not in (None, ''):
+        try:
+            cleaned['published_date'] = datetime.strptime(str(published_date), '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError(f'invalid published_date {published_date!r}, expected YYYY-MM-DD')
+
+    return cleaned
+
+
+def build_book(isbn, row):
+    return Book(
+        title=row.get('title') or '',
+        author=row.get('author') or '',
+        description=row.get('description') or '',
+        price=parse_price(row.get('price', 0)),
+        stock=parse_stock(row.get('stock', 0)),
+        published_date=parse_published_date(row.get('published_date')),
+        isbn=isbn,
+    )
+
+
+def _candidates(books, result):
+    """Books to upsert keyed on isbn; counts unusable and duplicate rows as skipped"""
+    candidates = {}
+    for book in books:
+        isbn = str(book.get('isbn') or '').strip()
+        if not isbn or len(isbn) > ISBN_MAX_LENGTH or isbn in candidates:
+            result.skipped += 1
+            continue
+        candidates[isbn] = book
+    return candidates
+
+
+def _plan(candidates, existing, update_fields, result):
+    """Split `candidates` into (books to insert, stored books with changes)"""
+    new_books = [build_book(isbn, book) for isbn, book in candidates.items() if isbn not in existing]
+
+    changed = []
+    for isbn, current in existing.items():
+        row = candidates[isbn]
+        incoming = build_book(isbn, row)
+        dirty = False
+        for field in update_fields:
+            if row.get(field) in (None, ''):
+                continue
+            value = getattr(incoming, field)
+            if getattr(current, field) != value:
+                setattr(current, field, value)
+                dirty = True
+        if dirty:
+            changed.append(current)
+    # bulk_update() skips auto_now, so bump updated_at explicitly
+    now = timezone.now()
+    for book in changed:
+        book.updated_at = now
+    result.updated = len(changed)
+    result.skipped += len(existing) - len(changed)
+    return new_books, changed
+
+
+def _count_inserted(result, new_books, present, after):
+    """
+    Count as inserted the books of `new_books` that went from `present` to
+    `after` rows in the catalog; the rest were inserted by someone else first
+    and were ignored, so they are skipped
+    """
+    result.inserted = after - present
+    result.skipped += len(new_books) - result.inserted
+
+
+def _existing_fields(update_fields):
+    # Sharded books need their stock replaced in the shards as well
+    return ['id', 'isbn', *update_fields, *(['stock_shards'] if 'stock' in update_fields else [])]
+
+
+def _restocked(candidates, changed, update_fields):
+    """{book id: new stock} for the changed sharded books whose row sets the stock"""
+    if 'stock' not in update_fields:
+        return {}
+    return {
+        book.id: book.stock for book in changed
+        if book.stock_shards and candidates[book.isbn].get('stock') not in (None, '')
+    }
+
+
+def upsert_books(books, update_fields=()):
+    """
+    Insert books that are not in the catalog yet, matched on isbn.
+
+    `books` is an iterable of dicts with the Book field names. Rows without a
+    usable isbn and duplicates within the batch are skipped. Books already in
+    the catalog are skipped too, unless some of `update_fields` are given in
+    the row and differ from the stored values, in which case those are
+    updated. Empty values never overwrite stored ones.
+
+    Costs one lookup query, one insert between two counts of the new isbns
+    and at most one update, however many books are passed in.
+    """
+    result = IngestResult()
+    candidates = _candidates(books, result)
+    if not candidates:
+        return result
+
+    update_fields = list(update_fields)
+    with transaction.atomic():
+        existing = Book.objects.filter(isbn__in=candidates).only(*_existing_fields(update_fields))
+        new_books, changed = _plan(candidates, {book.isbn: book for book in existing}, update_fields, result)
+        if new_books:
+            # ignore_conflicts covers books inserted concurrently by another
+            # request, so what was inserted is counted rather than assumed
+            inserting = Book.objects.filter(isbn__in=[book.isbn for book in new_books])
+            present = inserting.count()
+            Book.objects.bulk_create(new_books, ignore_conflicts=True)
+            _count_inserted(result, new_books, present, inserting.count())
+        if changed:
+            Book.objects.bulk_update(changed, [*update_fields, 'updated_at'])
+            set_stock(_restocked(candidates, changed, update_fields))
+    return result
+
+
+async def aupsert_books(books, update_fields=()):
+    """
+    upsert_books() with the async ORM. The async ORM has no transactions, so
+    the lookup, insert and update are separate statements; each is safe to
+    race with another upsert of the same books.
+    """
+    result = IngestResult()
+    candidates = _candidates(books, result)
+    if not candidates:
+        return result
+
+    update_fields = list(update_fields)
+    existing = {
+        book.isbn: book
+        async for book in Book.objects.filter(isbn__in=candidates).only(*_existing_fields(update_fields))
+    }
+    new_books, changed = _plan(candidates, existing, update_fields, result)
+    if new_books:
+        inserting = Book.objects.filter(isbn__in=[book.isbn for book in new_books])
+        present = await inserting.acount()
+        await Book.objects.abulk_create(new_books, ignore_conflicts=True)
+        _count_inserted(result, new_books, present, await inserting.acount())
+    if changed:
+        await Book.objects.abulk_update(changed, [*update_fields, 'updated_at'])
+        restocked = _restocked(candidates, changed, update_fields)
+        if restocked:
+            await sync_to_async(set_stock)(restocked)
+    return result
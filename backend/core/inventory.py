@@ -0,0 +1,293 @@
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, When
+from django.utils import timezone
+
+from .models import Book, StockReservation, StockShard
+
+
+class OutOfStock(Exception):
+    """
+    Raised when a guarded stock decrement or a reservation could not be
+    applied to every book. Books from reserve_stock() carry `available`.
+    """
+
+    def __init__(self, books=()):
+        self.books = list(books)
+        titles = ', '.join(book.title for book in self.books)
+        super().__init__(f'Not enough stock for {titles}' if titles else 'Not enough stock')
+
+
+def lock_books(book_ids):
+    """
+    SELECT ... FOR UPDATE the given books and return them keyed by id.
+
+    Rows are always locked in id order so that concurrent checkouts touching
+    overlapping books cannot deadlock. Must run inside transaction.atomic().
+    """
+    books = Book.objects.select_for_update().filter(id__in=book_ids).order_by('id')
+    return {book.id: book for book in books}
+
+
+def split_evenly(total, shards):
+    """`total` units over `shards` counters, differing by at most one"""
+    base, extra = divmod(max(total, 0), shards)
+    return [base + 1 if i < extra else base for i in range(shards)]
+
+
+def shard_counts(book_ids):
+    """{book_id: number of shards} for the sharded books among `book_ids`"""
+    return dict(Book.objects.filter(id__in=book_ids, stock_shards__gt=0).values_list('id', 'stock_shards'))
+
+
+def shard_totals(book_ids):
+    """{book_id: units across its shards}"""
+    shards = StockShard.objects.filter(book_id__in=book_ids).order_by()
+    return dict(shards.values_list('book_id').annotate(units=Sum('stock')))
+
+
+def stock_levels(books):
+    """{book id: units in stock}, summing the shards of sharded books"""
+    levels = {book.id: book.stock for book in books}
+    sharded = [book.id for book in books if book.stock_shards]
+    if sharded:
+        levels.update(dict.fromkeys(sharded, 0))
+        levels.update(shard_totals(sharded))
+    return levels
+
+
+def _spread(book_id, total, take=0):
+    """
+    Lock a sharded book's shards, take `take` units and spread what is left
+    evenly over them, recording it in Book.stock. Returns False, changing
+    nothing, if the shards hold fewer than `take` units. Must run inside
+    transaction.atomic().
+    """
+    shards = list(StockShard.objects.select_for_update().filter(book_id=book_id).order_by('shard'))
+    if not shards:
+        return False
+    if total is None:
+        total = sum(shard.stock for shard in shards)
+    if total < take:
+        return False
+    now = timezone.now()
+    for shard, units in zip(shards, split_evenly(total - take, len(shards))):
+        shard.stock, shard.updated_at = units, now
+    StockShard.objects.bulk_update(shards, ['stock', 'updated_at'])
+    Book.objects.filter(pk=book_id).update(stock=total - take, updated_at=now)
+    return True
+
+
+def take_from_shards(book_id, quantity, shards):
+    """
+    Take `quantity` units of a book from one of its `shards` counters,
+    picked at random so that concurrent checkouts of the book mostly update
+    different rows. Returns False if the book does not have enough stock.
+
+    If the picked shard is short the others with enough units are tried;
+    if no single shard has enough, the book is rebalanced and the units
+    taken across its shards.
+    """
+    available = StockShard.objects.filter(book_id=book_id, stock__gte=quantity)
+    changes = {'stock': F('stock') - quantity, 'updated_at': timezone.now()}
+    if available.filter(shard=random.randrange(shards)).update(**changes):
+        return True
+    candidates = list(available.values_list('shard', flat=True))
+    random.shuffle(candidates)
+    for shard in candidates:
+        if available.filter(shard=shard).update(**changes):
+            return True
+    return _spread(book_id, None, take=quantity)
+
+
+def decrement_stock(quantities, shards=None):
+    """
+    Take `quantities` ({book_id: quantity}) out of stock.
+
+    Single-counter books are updated in a single UPDATE in which each row is
+    only touched if it still has enough stock, so it can never oversell even
+    without row locks. Sharded books, given as {book_id: number of shards}
+    in `shards` or looked up, are taken from their shards. If any book
+    falls short every update is rolled back and OutOfStock is raised.
+    """
+    if not quantities:
+        return
+    if shards is None:
+        shards = shard_counts(quantities)
+    shards = {book_id: count for book_id, count in shards.items() if book_id in quantities}
+    single = {book_id: quantity for book_id, quantity in quantities.items() if book_id not in shards}
+
+    condition = Q()
+    whens = []
+    for book_id, quantity in sorted(single.items()):
+        # A book converted to shards meanwhile falls short instead of overselling
+        condition |= Q(id=book_id, stock__gte=quantity, stock_shards=0)
+        whens.append(When(id=book_id, then=F('stock') - quantity))
+    with transaction.atomic():
+        taken = not single or Book.objects.filter(condition).update(
+            stock=Case(*whens, output_field=IntegerField()), updated_at=timezone.now(),
+        ) == len(single)
+        for book_id, count in sorted(shards.items()):
+            taken = taken and take_from_shards(book_id, quantities[book_id], count)
+        if not taken:
+            transaction.set_rollback(True)
+    if not taken:
+        books = list(Book.objects.filter(id__in=quantities).only('id', 'title', 'stock', 'stock_shards'))
+        levels = stock_levels(books)
+        raise OutOfStock(book for book in books if levels[book.id] < quantities[book.id])
+
+
+def increment_stock(quantities, shards=None):
+    """
+    Put `quantities` ({book_id: quantity}) back into stock, in a single
+    UPDATE for single-counter books and into a random shard for sharded ones
+    """
+    if not quantities:
+        return
+    if shards is None:
+        shards = shard_counts(quantities)
+    single = {book_id: quantity for book_id, quantity in quantities.items() if book_id not in shards}
+    for book_id, count in sorted(shards.items()):
+        if book_id in quantities and not StockShard.objects.filter(book_id=book_id, shard=random.randrange(count)).update(
+                stock=F('stock') + quantities[book_id], updated_at=timezone.now()):
+            # Converted back to a single counter meanwhile
+            single[book_id] = quantities[book_id]
+    if not single:
+        return
+    whens = [When(id=book_id, then=F('stock') + quantity)
+             for book_id, quantity in sorted(single.items())]
+    Book.objects.filter(id__in=single).update(
+        stock=Case(*whens, output_field=IntegerField()), updated_at=timezone.now(),
+    )
+
+
+def shard_stock(book_id, shards):
+    """
+    Convert a book to `shards` stock counters, or back to Book.stock alone
+    with shards=0, keeping its units. Locks the book and its shards, so it
+    waits for checkouts in progress; checkouts that read the old mode fall
+    short and can be retried. Raises Book.DoesNotExist.
+    """
+    with transaction.atomic():
+        book = lock_books([book_id]).get(book_id)
+        if book is None:
+            raise Book.DoesNotExist(f'Book {book_id} does not exist')
+        current = list(StockShard.objects.select_for_update().filter(book=book))
+        total = sum(shard.stock for shard in current) if book.stock_shards else book.stock
+        StockShard.objects.filter(book=book).delete()
+        if shards:
+            StockShard.objects.bulk_create(
+                StockShard(book=book, shard=shard, stock=units)
+                for shard, units in enumerate(split_evenly(total, shards))
+            )
+        Book.objects.filter(pk=book.pk).update(stock=total, stock_shards=shards, updated_at=timezone.now())
+    return total
+
+
+def set_stock(totals):
+    """
+    Set books' stock ({book_id: units}), replacing what the shards of sharded
+    books hold, e.g. after an admin or an import set it directly
+    """
+    if not totals:
+        return
+    shards = shard_counts(totals)
+    with transaction.atomic():
+        for book_id, total in sorted(totals.items()):
+            if book_id not in shards or not _spread(book_id, total):
+                Book.objects.filter(pk=book_id).update(stock=total, updated_at=timezone.now())
+
+
+def stock_edited(book, fields):
+    """
+    Follow up a save of `book` that changed `fields`. A sharded book's stock
+    is what its shards hold, so a new Book.stock replaces that too.
+    """
+    if book.stock_shards and 'stock' in fields:
+        set_stock({book.pk: book.stock})
+
+
+def rebalance_stock(book_ids=None):
+    """
+    Spread the units of sharded books evenly over their shards again and
+    record the totals in Book.stock. Each book is rebalanced in its own short
+    transaction. Returns how many were.
+    """
+    books = Book.objects.filter(stock_shards__gt=0)
+    if book_ids is not None:
+        books = books.filter(id__in=book_ids)
+    rebalanced = 0
+    for book_id in books.order_by('id').values_list('id', flat=True):
+        with transaction.atomic():
+            rebalanced += _spread(book_id, None)
+    return rebalanced
+
+
+def reserved_quantities(book_ids, exclude_items=()):
+    """{book_id: units held by active reservations}, from the (book, expires_at) index"""
+    reservations = StockReservation.objects.filter(book_id__in=book_ids, expires_at__gt=timezone.now())
+    if exclude_items:
+        reservations = reservations.exclude(cart_item_id__in=exclude_items)
+    return dict(reservations.order_by().values_list('book_id').annotate(units=Sum('quantity')))
+
+
+def available_stock(book_ids, exclude_items=()):
+    """
+    Lock the books and return them keyed by id, with `available` set to the
+    stock not held by active reservations, other than those of the cart
+    items in `exclude_items`. Must run inside transaction.atomic().
+    """
+    books = lock_books(book_ids)
+    levels = stock_levels(books.values())
+    reserved = reserved_quantities(books, exclude_items=exclude_items)
+    for book_id, book in books.items():
+        book.available = max(levels[book_id] - reserved.get(book_id, 0), 0)
+    return books
+
+
+def hold_stock(cart_items):
+    """
+    Reserve each cart item's quantity for STOCK_RESERVATION_TTL seconds,
+    replacing its earlier reservation, without checking the stock
+    """
+    expires_at = timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    StockReservation.objects.bulk_create(
+        [StockReservation(cart_item=item, book_id=item.book_id, quantity=item.quantity, expires_at=expires_at)
+         for item in cart_items],
+        update_conflicts=True, unique_fields=['cart_item'], update_fields=['book', 'quantity', 'expires_at'],
+    )
+
+
+def reserve_stock(cart_items, hold=True):
+    """
+    Hold each cart item's quantity of its book for STOCK_RESERVATION_TTL
+    seconds, replacing the items' earlier reservations. The items must be saved.
+
+    The books are locked while their available stock is checked, so two
+    carts can never reserve the same unit. Raises OutOfStock, with
+    `available` set on the books that fall short, and reserves nothing
+    if any item does not fit. With hold=False the books are only locked
+    and checked, for callers that take the units in the same transaction.
+    """
+    quantities = {}
+    for item in cart_items:
+        quantities[item.book_id] = quantities.get(item.book_id, 0) + item.quantity
+    if not quantities:
+        return
+
+    with transaction.atomic():
+        books = available_stock(quantities, exclude_items=[item.pk for item in cart_items])
+        short = [books[book_id] for book_id, quantity in quantities.items() if quantity > books[book_id].available]
+        if short:
+            raise OutOfStock(short)
+        if hold:
+            hold_stock(cart_items)
+
+
+def release_expired_reservations():
+    """Delete every expired reservation in one statement; returns how many there were"""
+    deleted, _ = StockReservation.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
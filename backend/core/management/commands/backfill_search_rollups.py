@@ -0,0 +1,56 @@
+import time
+from datetime import date, datetime, time as day_start
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.history import add_to_rollups
+from core.models import SearchHistory, SearchQueryDaily, UserSearchDaily
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the daily search rollups (SearchQueryDaily, UserSearchDaily) from SearchHistory. '
+            'Searches recorded while it runs are counted once.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat,
+                            help='Only rebuild days from this date (YYYY-MM-DD) on; default: all history')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='History rows read and counted per transaction (default: 5000)')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        since = options['since']
+
+        history = SearchHistory.objects.all()
+        query_rollups, user_rollups = SearchQueryDaily.objects.all(), UserSearchDaily.objects.all()
+        if since:
+            start = timezone.make_aware(datetime.combine(since, day_start.min))
+            history = history.filter(search_date__gte=start)
+            query_rollups, user_rollups = query_rollups.filter(day__gte=since), user_rollups.filter(day__gte=since)
+
+        # Rows written after this point add themselves to the fresh rollups,
+        # so only count the ones that already existed.
+        with transaction.atomic():
+            query_rollups.delete()
+            user_rollups.delete()
+            last_id = history.aggregate(last=Max('id'))['last']
+        if last_id is None:
+            self.stdout.write(self.style.SUCCESS('No search history to count'))
+            return
+
+        history = history.filter(id__lte=last_id).only('id', 'user_id', 'query', 'search_date').order_by('id')
+        counted, after, started = 0, 0, time.monotonic()
+        while chunk := list(history.filter(id__gt=after)[:chunk_size]):
+            with transaction.atomic():
+                add_to_rollups(chunk)
+            counted += len(chunk)
+            after = chunk[-1].id
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{counted} searches counted ({counted / elapsed if elapsed else 0:.0f} rows/s)')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search rollups from {counted} searches'))
@@ -0,0 +1,145 @@
+import csv
+import gzip
+import io
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ingestion import BOOK_FIELDS, IngestResult, clean_book_row, upsert_books
+
+FORMATS = ('csv', 'jsonl')
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def open_text(path):
+    """Open `path` for streaming text reads, transparently un-gzipping it"""
+    with open(path, 'rb') as probe:
+        compressed = probe.read(2) == GZIP_MAGIC
+    raw = gzip.open(path, 'rb') if compressed else open(path, 'rb')
+    return io.TextIOWrapper(raw, encoding='utf-8', newline='')
+
+
+def detect_format(path):
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise CommandError(f'Cannot tell the format of {path}, pass --format')
+
+
+def read_records(stream, fmt):
+    """
+    Yield raw records one at a time: dicts for CSV (the csv module handles
+    quoted multi-line fields, so it has to run in this process), undecoded
+    lines for JSONL so decoding can happen in the workers.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield line
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def prepare_chunk(records):
+    """Decode and validate a chunk of records; returns (rows, errors). Runs in worker processes."""
+    rows, errors = [], []
+    for record in records:
+        try:
+            if isinstance(record, str):
+                record = json.loads(record)
+                if not isinstance(record, dict):
+                    raise ValueError('expected a JSON object')
+            rows.append(clean_book_row(record))
+        except ValueError as exc:
+            errors.append(str(exc))
+    return rows, errors
+
+
+def prepared_chunks(chunks, workers):
+    """prepare_chunk over `chunks`, in order, keeping at most 2 chunks per worker in flight"""
+    if workers <= 1:
+        yield from map(prepare_chunk, chunks)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(prepare_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class Command(BaseCommand):
+    help = 'Stream books from a CSV or JSONL file (optionally gzipped) into the catalog, upserting on isbn'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file, plain or gzipped')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Input format; guessed from the file extension by default')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Rows validated and written per batch (default: 1000)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes used to parse and validate rows (default: 1, in process)')
+        parser.add_argument('--update', dest='update_fields', default='',
+                            help='Comma separated fields to update on books that already exist, '
+                                 f'e.g. "price,stock". Allowed: {", ".join(BOOK_FIELDS)}')
+        parser.add_argument('--max-errors', type=int, default=10,
+                            help='Invalid rows to print before only counting them (default: 10)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        update_fields = [field.strip() for field in options['update_fields'].split(',') if field.strip()]
+        unknown = set(update_fields) - set(BOOK_FIELDS)
+        if unknown:
+            raise CommandError(f'Cannot update {", ".join(sorted(unknown))}')
+
+        try:
+            stream = open_text(path)
+        except OSError as exc:
+            raise CommandError(f'Cannot open {path}: {exc}')
+
+        total = IngestResult()
+        rows_seen = invalid = 0
+        started = time.monotonic()
+        with stream:
+            chunks = chunked(read_records(stream, fmt), chunk_size)
+            for rows, errors in prepared_chunks(chunks, options['workers']):
+                for error in errors:
+                    if invalid < options['max_errors']:
+                        self.stderr.write(f'Invalid row: {error}')
+                    invalid += 1
+                total += upsert_books(rows, update_fields=update_fields)
+                rows_seen += len(rows) + len(errors)
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{rows_seen} rows: {total.inserted} inserted, {total.updated} updated, '
+                    f'{total.skipped} skipped, {invalid} invalid '
+                    f'({rows_seen / elapsed if elapsed else 0:.0f} rows/s)'
+                )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {path} in {elapsed:.1f}s: {total.inserted} inserted, {total.updated} updated, '
+            f'{total.skipped} skipped, {invalid} invalid'
+        ))
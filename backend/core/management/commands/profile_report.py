@@ -0,0 +1,69 @@
+import math
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import load_profiles
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = 'Summarize the request profiles saved by ProfilingMiddleware, per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None,
+                            help='Directory holding the profiles (default: settings.PROFILE_DIR)')
+        parser.add_argument('--endpoint', default=None,
+                            help='Only report this endpoint, e.g. "book-list"')
+        parser.add_argument('--top', type=int, default=10,
+                            help='Hottest functions to list per endpoint (default: 10)')
+        parser.add_argument('--merge-to', default=None,
+                            help='Also write one merged <endpoint>.folded file per endpoint to this '
+                                 'directory, ready for flamegraph.pl or speedscope')
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir'] or settings.PROFILE_DIR)
+        if not directory.is_dir():
+            raise CommandError(f'No profiles in {directory}')
+
+        durations = defaultdict(list)
+        stacks = defaultdict(Counter)
+        for meta, profile in load_profiles(directory):
+            endpoint = meta['endpoint']
+            if options['endpoint'] and endpoint != options['endpoint']:
+                continue
+            durations[endpoint].append(meta['duration_ms'])
+            stacks[endpoint].update(profile)
+
+        if not durations:
+            raise CommandError(f'No profiles in {directory}')
+
+        for endpoint in sorted(durations, key=lambda name: -sum(durations[name])):
+            times = durations[endpoint]
+            samples = sum(stacks[endpoint].values())
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{endpoint}: {len(times)} requests, mean {sum(times) / len(times):.1f}ms, '
+                f'p95 {percentile(times, 0.95):.1f}ms, max {max(times):.1f}ms, {samples} samples'
+            ))
+
+            # Self time: samples whose innermost frame is the function.
+            leaves = Counter()
+            for stack, count in stacks[endpoint].items():
+                leaves[stack.rsplit(';', 1)[-1]] += count
+            for function, count in leaves.most_common(options['top']):
+                self.stdout.write(f'  {count / samples:6.1%}  {function}')
+
+        if options['merge_to']:
+            target = Path(options['merge_to'])
+            target.mkdir(parents=True, exist_ok=True)
+            for endpoint, counter in stacks.items():
+                (target / f'{endpoint}.folded').write_text(
+                    ''.join(f'{stack} {count}\n' for stack, count in counter.most_common())
+                )
+            self.stdout.write(self.style.SUCCESS(f'Wrote {len(stacks)} merged profiles to {target}'))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from core.inventory import rebalance_stock
+
+
+class Command(BaseCommand):
+    help = ('Spread the stock of sharded books evenly over their shards and refresh the totals '
+            'the catalog shows, once or every --interval seconds')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Keep running and rebalance every this many seconds (default: once)')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if interval is not None and interval <= 0:
+            raise CommandError('--interval must be positive')
+
+        while True:
+            rebalanced = rebalance_stock()
+            self.stdout.write(f'Rebalanced {rebalanced} sharded books')
+            if interval is None:
+                return
+            close_old_connections()
+            time.sleep(interval)
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from core.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Delete expired stock reservations, once or every --interval seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Keep running and sweep every this many seconds (default: sweep once)')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if interval is not None and interval <= 0:
+            raise CommandError('--interval must be positive')
+
+        while True:
+            released = release_expired_reservations()
+            self.stdout.write(f'Released {released} expired reservations')
+            if interval is None:
+                return
+            close_old_connections()
+            time.sleep(interval)
@@ -0,0 +1,256 @@
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+from .profiling import StackSampler, save_profile
+from .replicas import replica_aliases
+
+
+class QueryMetrics:
+    """execute_wrapper that counts queries and sums their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class QueryMetricsMiddleware:
+    """
+    Report the number of SQL queries and the time spent in them per request,
+    as X-Query-Count and Server-Timing response headers.
+
+    Enabled with the QUERY_METRICS setting; when it is off the middleware
+    removes itself at startup and costs nothing.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_METRICS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def wrap_connections(stack, metrics):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = QueryMetrics()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            self.wrap_connections(stack, metrics)
+            response = self.get_response(request)
+        return self.report(response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = QueryMetrics()
+        start = time.perf_counter()
+        # The async ORM runs queries on the request's thread-sensitive
+        # thread, whose connections are not this thread's: wrap those.
+        stack = ExitStack()
+        await sync_to_async(self.wrap_connections)(stack, metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.report(response, metrics, start)
+
+    def report(self, response, metrics, start):
+        total = time.perf_counter() - start
+        response['X-Query-Count'] = str(metrics.count)
+        response['Server-Timing'] = (
+            f'db;dur={metrics.duration * 1000:.2f};desc="{metrics.count} queries", '
+            f'total;dur={total * 1000:.2f}'
+        )
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Sample-profile a request and save its collapsed stacks under PROFILE_DIR.
+
+    A request is profiled when a staff user sends the PROFILE_HEADER header,
+    or at random with probability PROFILE_SAMPLE_RATE. With the rate at 0
+    and the header disabled the middleware removes itself at startup.
+    Must come after AuthenticationMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+        self.header = getattr(settings, 'PROFILE_HEADER', None)
+        if not self.sample_rate and not self.header:
+            raise MiddlewareNotUsed
+        self.meta_key = 'HTTP_' + self.header.upper().replace('-', '_') if self.header else None
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def requested(self, request):
+        return bool(self.meta_key and request.META.get(self.meta_key))
+
+    def sampled(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def should_profile(self, request):
+        if self.requested(request) and request.user.is_staff:
+            return True
+        return self.sampled()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with StackSampler(threading.get_ident(), settings.PROFILE_INTERVAL) as sampler:
+            response = self.get_response(request)
+        return self.save(request, response, sampler, start)
+
+    async def __acall__(self, request):
+        staff = self.requested(request) and (await request.auser()).is_staff
+        if not (staff or self.sampled()):
+            return await self.get_response(request)
+
+        # Samples the event loop thread, which runs the async view
+        start = time.perf_counter()
+        with StackSampler(threading.get_ident(), settings.PROFILE_INTERVAL) as sampler:
+            response = await self.get_response(request)
+        return self.save(request, response, sampler, start)
+
+    def save(self, request, response, sampler, start):
+        duration = time.perf_counter() - start
+        response['X-Profile-Id'] = save_profile(settings.PROFILE_DIR, request, response, sampler.stacks, duration)
+        return response
+
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """
+    Read-your-writes for replica reads: after a request that may have
+    written (any unsafe method), set a cookie that keeps the client's reads
+    on the primary for REPLICA_PIN_SECONDS, longer than the replicas lag.
+    Views can override the guess by setting `request.pin_to_primary`.
+    Removes itself when DATABASE_REPLICAS is empty.
+    """
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_response(self, request, response):
+        wrote = request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+        if getattr(request, 'pin_to_primary', wrote):
+            seconds = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(settings.REPLICA_PIN_COOKIE, f'{time.time() + seconds:.3f}',
+                                max_age=seconds, httponly=True, samesite='Lax')
+        return response
+
+
+def accepted_encoding(header, codings):
+    """
+    The coding among `codings`, in order of preference, that an
+    Accept-Encoding `header` gives the highest q-value, or None
+    """
+    qualities = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for coding in codings:
+        q = qualities.get(coding, qualities.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses of COMPRESSION_MIN_SIZE bytes or more with brotli or
+    gzip, whichever the client's Accept-Encoding prefers; brotli wins ties
+    when the brotli package is installed. Streaming responses are gzipped
+    only. gzip output gets Django's random-length padding against BREACH.
+    Removes itself when COMPRESSION_MIN_SIZE is None.
+    """
+    max_random_bytes = 100
+
+    def __init__(self, get_response):
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', None)
+        if self.min_size is None:
+            raise MiddlewareNotUsed
+        self.codings = ('br', 'gzip') if brotli else ('gzip',)
+        super().__init__(get_response)
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if response.streaming:
+            if response.is_async or accepted_encoding(accept, ('gzip',)) is None:
+                return response
+            coding = 'gzip'
+            response.streaming_content = compress_sequence(
+                response.streaming_content, max_random_bytes=self.max_random_bytes,
+            )
+            del response.headers['Content-Length']
+        else:
+            coding = accepted_encoding(accept, self.codings)
+            if coding is None:
+                return response
+            if coding == 'br':
+                compressed = brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+            else:
+                compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # The encoded body differs byte for byte, so a strong ETag becomes weak
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = coding
+        return response
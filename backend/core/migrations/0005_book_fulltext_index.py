@@ -0,0 +1,85 @@
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS core_book_fts USING fts5(
+        title, author, description,
+        content='core_book', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_book_fts_ai AFTER INSERT ON core_book BEGIN
+        INSERT INTO core_book_fts(rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_book_fts_ad AFTER DELETE ON core_book BEGIN
+        INSERT INTO core_book_fts(core_book_fts, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_book_fts_au AFTER UPDATE ON core_book BEGIN
+        INSERT INTO core_book_fts(core_book_fts, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+        INSERT INTO core_book_fts(rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+    END
+    """,
+    "INSERT INTO core_book_fts(core_book_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS core_book_fts_au',
+    'DROP TRIGGER IF EXISTS core_book_fts_ad',
+    'DROP TRIGGER IF EXISTS core_book_fts_ai',
+    'DROP TABLE IF EXISTS core_book_fts',
+]
+
+# Keep in sync with core.filters.POSTGRES_BOOK_VECTOR
+POSTGRES_FORWARD = [
+    """
+    CREATE INDEX IF NOT EXISTS core_book_search_idx ON core_book USING GIN (
+        to_tsvector('english', coalesce(title, '') || ' ' ||
+        coalesce(author, '') || ' ' || coalesce(description, ''))
+    )
+    """,
+]
+
+POSTGRES_REVERSE = [
+    'DROP INDEX IF EXISTS core_book_search_idx',
+]
+
+
+def run_statements(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        run_statements(schema_editor, SQLITE_FORWARD)
+    elif vendor == 'postgresql':
+        run_statements(schema_editor, POSTGRES_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        run_statements(schema_editor, SQLITE_REVERSE)
+    elif vendor == 'postgresql':
+        run_statements(schema_editor, POSTGRES_REVERSE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_book_stock'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def recreate_update_trigger(of_columns):
+    def forwards(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        schema_editor.execute('DROP TRIGGER IF EXISTS core_book_fts_au')
+        schema_editor.execute(f"""
+            CREATE TRIGGER core_book_fts_au AFTER UPDATE {of_columns} ON core_book BEGIN
+                INSERT INTO core_book_fts(core_book_fts, rowid, title, author, description)
+                VALUES ('delete', old.id, old.title, old.author, old.description);
+                INSERT INTO core_book_fts(rowid, title, author, description)
+                VALUES (new.id, new.title, new.author, new.description);
+            END
+        """)
+    return forwards
+
+
+class Migration(migrations.Migration):
+    """Stock updates at checkout should not rewrite the full-text index"""
+
+    dependencies = [
+        ('core', '0005_book_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            recreate_update_trigger('OF title, author, description'),
+            recreate_update_trigger(''),
+        ),
+    ]
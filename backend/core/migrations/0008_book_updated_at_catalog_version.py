@@ -0,0 +1,34 @@
+# Generated by Django 5.0.2 on 2026-10-18 06:16
+
+from django.db import migrations, models
+
+from core.migrations._book_fts import restore_book_fts_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_book_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['updated_at'], name='core_book_updated_at_idx'),
+        ),
+        # Adding updated_at rebuilt core_book on SQLite, dropping its triggers
+        migrations.RunPython(restore_book_fts_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-18 06:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_book_updated_at_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='searchhistory',
+            name='search_date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.2 on 2026-10-18 06:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_searchhistory_search_date_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchQueryDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('query', models.CharField(max_length=255)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', '-count'], name='core_searchquerydaily_top_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchquerydaily',
+            constraint=models.UniqueConstraint(fields=('day', 'query'), name='core_searchquerydaily_day_query_uniq'),
+        ),
+        migrations.AddField(
+            model_name='usersearchdaily',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_days', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='usersearchdaily',
+            index=models.Index(fields=['day', '-count'], name='core_usersearchdaily_top_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='usersearchdaily',
+            constraint=models.UniqueConstraint(fields=('user', 'day'), name='core_usersearchdaily_user_day_uniq'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.2 on 2026-10-18 06:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_search_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='core.book')),
+                ('cart_item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reservation', to='core.cartitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['book', 'expires_at'], name='core_reservation_book_idx'), models.Index(fields=['expires_at'], name='core_reservation_expiry_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.2 on 2026-10-18 06:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from core.migrations._book_fts import restore_book_fts_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='stock_shards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('stock', models.IntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='core.book')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='stockshard',
+            constraint=models.UniqueConstraint(fields=('book', 'shard'), name='core_stockshard_book_shard_uniq'),
+        ),
+        # Adding stock_shards rebuilt core_book on SQLite, dropping its triggers
+        migrations.RunPython(restore_book_fts_triggers, migrations.RunPython.noop),
+    ]
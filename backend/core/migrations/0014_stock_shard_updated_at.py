@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 07:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_order_user_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockshard',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='stockshard',
+            index=models.Index(fields=['updated_at'], name='core_stockshard_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+"""
+SQLite full-text index triggers on core_book, shared by migrations.
+
+SQLite rebuilds core_book (and drops its triggers) for most schema changes,
+such as adding a NOT NULL column. Any migration that alters the book table
+must call restore_book_fts_triggers afterwards. Not loaded as a migration
+because of the leading underscore.
+"""
+
+TRIGGERS = {
+    'core_book_fts_ai': """
+        CREATE TRIGGER core_book_fts_ai AFTER INSERT ON core_book BEGIN
+            INSERT INTO core_book_fts(rowid, title, author, description)
+            VALUES (new.id, new.title, new.author, new.description);
+        END
+    """,
+    'core_book_fts_ad': """
+        CREATE TRIGGER core_book_fts_ad AFTER DELETE ON core_book BEGIN
+            INSERT INTO core_book_fts(core_book_fts, rowid, title, author, description)
+            VALUES ('delete', old.id, old.title, old.author, old.description);
+        END
+    """,
+    'core_book_fts_au': """
+        CREATE TRIGGER core_book_fts_au AFTER UPDATE OF title, author, description ON core_book BEGIN
+            INSERT INTO core_book_fts(core_book_fts, rowid, title, author, description)
+            VALUES ('delete', old.id, old.title, old.author, old.description);
+            INSERT INTO core_book_fts(rowid, title, author, description)
+            VALUES (new.id, new.title, new.author, new.description);
+        END
+    """,
+}
+
+
+def restore_book_fts_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, sql in TRIGGERS.items():
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        schema_editor.execute(sql)
+    schema_editor.execute("INSERT INTO core_book_fts(core_book_fts) VALUES ('rebuild')")
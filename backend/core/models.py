@@ -1,8 +1,16 @@
 from datetime import datetime
-from django.db import models
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import (Case, DecimalField, Exists, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum,
+                              Value, When)
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
+
+from .auth import forget_user
 
 
 class UserProfile(models.Model):
@@ -14,33 +22,177 @@ class UserProfile(models.Model):
         return self.user.username
 
 
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+    # Again once committed, in case a request cached the old row in between
+    transaction.on_commit(lambda: forget_user(instance.pk))
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, user, **kwargs):
+    if user is not None:
+        forget_user(user.pk)
+
+
+def current_stock_expression(prefix=''):
+    """
+    Book.stock, or for sharded books what their shards hold now, since
+    Book.stock is only their last rebalanced total. `prefix` leads to the book.
+    """
+    units = (StockShard.objects.filter(book=OuterRef(f'{prefix}pk')).order_by()
+             .values('book').annotate(units=Sum('stock')).values('units'))
+    return Case(
+        When(**{f'{prefix}stock_shards': 0}, then=F(f'{prefix}stock')),
+        default=Coalesce(Subquery(units), Value(0)),
+    )
+
+
+class BookQuerySet(models.QuerySet):
+    def with_current_stock(self):
+        """Annotate `current_stock`, the units in stock; see current_stock_expression()"""
+        return self.annotate(current_stock=current_stock_expression())
+
+    def in_stock(self):
+        """Books with units left, in Book.stock or in any of their shards"""
+        return self.filter(
+            Q(stock_shards=0, stock__gt=0)
+            | Q(Exists(StockShard.objects.filter(book=OuterRef('pk'), stock__gt=0)), stock_shards__gt=0)
+        )
+
+
 class Book(models.Model):
     title = models.CharField(max_length=200)
     author = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     stock = models.IntegerField(default=0)
+    # 0: `stock` is the counter. Otherwise the units live in this many
+    # StockShard rows and `stock` is their total as of the last rebalance.
+    stock_shards = models.PositiveSmallIntegerField(default=0)
     isbn = models.CharField(max_length=13, unique=True)
     published_date = models.DateField(null=True, blank=True)
+    # Also set by bulk_update() and queryset update() callers; drives catalog ETags
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['price', 'id'], name='core_book_price_id_idx'),
+            models.Index(fields=['title', 'id'], name='core_book_title_id_idx'),
+            models.Index(fields=['updated_at'], name='core_book_updated_at_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class StockShard(models.Model):
+    """
+    One of the counters a hot book's stock is split across, so concurrent
+    checkouts decrement different rows (see core.inventory).
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="shards")
+    shard = models.PositiveSmallIntegerField()
+    stock = models.IntegerField(default=0)
+    # Set by every stock change, which skips Book.updated_at; drives catalog ETags
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'shard'], name='core_stockshard_book_shard_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['updated_at'], name='core_stockshard_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id}#{self.shard}: {self.stock}"
+
+
+class CatalogVersion(models.Model):
+    """
+    Single-row counter bumped whenever books are deleted.
+
+    Inserts and updates show up in Book.updated_at, but a deleted book leaves
+    nothing behind, so catalog validators combine both.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(pk=1).update(version=F('version') + 1, updated_at=timezone.now()):
+            cls.objects.get_or_create(pk=1, defaults={'version': 1})
+
+
+@receiver(post_delete, sender=Book)
+def bump_catalog_version(sender, **kwargs):
+    CatalogVersion.bump()
+
+
+def line_total_expression(prefix=''):
+    """quantity * book price, as an expression usable in annotations and aggregates"""
+    return F(f'{prefix}quantity') * F(f'{prefix}book__price')
+
+
+MONEY = DecimalField(max_digits=10, decimal_places=2)
+
+
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate carts with their total price and item count computed by the database"""
+        return self.annotate(
+            annotated_total_price=Coalesce(
+                Sum(line_total_expression('cart_items__'), output_field=MONEY),
+                Value(Decimal('0')), output_field=MONEY,
+            ),
+            annotated_total_items=Coalesce(Sum('cart_items__quantity'), Value(0)),
+        )
+
+
+class BookLineQuerySet(models.QuerySet):
+    """Cart and order lines"""
+
+    def with_book_stock(self):
+        """Annotate `book_stock`, the current stock of each line's book, for BookStockMixin serializers"""
+        return self.annotate(book_stock=current_stock_expression('book__'))
+
+
+class CartItemQuerySet(BookLineQuerySet):
+    def with_line_totals(self):
+        return self.annotate(
+            annotated_total_price=ExpressionWrapper(line_total_expression(), output_field=MONEY),
+        )
+
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="carts")
     created_at = models.DateTimeField(default=datetime.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
     def __str__(self):
         return f"Cart for {self.user.username}"
 
+    def touch(self):
+        """Bump updated_at without a full save, e.g. after its items changed"""
+        self.updated_at = timezone.now()
+        Cart.objects.filter(pk=self.pk).update(updated_at=self.updated_at)
+
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.cart_items.all())
+        if hasattr(self, 'annotated_total_price'):
+            return self.annotated_total_price
+        return sum((item.total_price for item in self.cart_items.all()), Decimal('0'))
 
     @property
     def total_items(self):
+        if hasattr(self, 'annotated_total_items'):
+            return self.annotated_total_items
         return sum(item.quantity for item in self.cart_items.all())
 
 
@@ -49,12 +201,42 @@ class CartItem(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    objects = CartItemQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.book.title} (x{self.quantity})"
 
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.cart_items.all())
+        if hasattr(self, 'annotated_total_price'):
+            return self.annotated_total_price
+        return self.book.price * self.quantity
+
+
+class StockReservation(models.Model):
+    """
+    Units of a book held for a cart item until `expires_at`. Available stock
+    is Book.stock minus the active reservations (see core.inventory).
+    """
+    cart_item = models.OneToOneField(CartItem, on_delete=models.CASCADE, related_name="reservation")
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="reservations")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Active reservations per book, for available stock
+            models.Index(fields=['book', 'expires_at'], name='core_reservation_book_idx'),
+            # Expired reservations, for the sweeper
+            models.Index(fields=['expires_at'], name='core_reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.book_id} until {self.expires_at}"
+
+    @property
+    def active(self):
+        return self.expires_at > timezone.now()
 
 
 class Order(models.Model):
@@ -73,6 +255,12 @@ class Order(models.Model):
     created_at = models.DateTimeField(default=datetime.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # A user's order history, newest first, read straight off the index
+            models.Index(fields=['user', 'created_at', 'id'], name='core_order_user_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
 
@@ -83,13 +271,51 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    objects = BookLineQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.book.title} (x{self.quantity})"
 
 class SearchHistory(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="search_history")
     query = models.CharField(max_length=255)
-    search_date = models.DateTimeField(auto_now_add=True)
+    # Set by the caller rather than auto_now_add: buffered entries are inserted after the search
+    search_date = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.query + " by " + self.user.username + " on " + str(self.search_date)
+
+class SearchQueryDaily(models.Model):
+    """Searches per normalized query per day, kept up to date by core.history"""
+    day = models.DateField()
+    query = models.CharField(max_length=255)
+    count = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'query'], name='core_searchquerydaily_day_query_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['day', '-count'], name='core_searchquerydaily_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.query} on {self.day}: {self.count}"
+
+
+class UserSearchDaily(models.Model):
+    """Searches per user per day, kept up to date by core.history"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="search_days")
+    day = models.DateField()
+    count = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='core_usersearchdaily_user_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['day', '-count'], name='core_usersearchdaily_top_idx'),
+        ]
 
     def __str__(self):
-        return self.query + " by " + self.user.username + " on " + str(self.search_date)
\ No newline at end of file
+        return f"{self.user_id} on {self.day}: {self.count}"
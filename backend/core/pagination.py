@@ -0,0 +1,193 @@
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on (ordering fields..., id).
+
+    Unlike PageNumberPagination there is no OFFSET and no COUNT(*): each page
+    is a WHERE on the last row of the previous page, which an index on the
+    same columns answers directly however deep the client pages. The
+    queryset ordering (e.g. from OrderingFilter) is respected and `id` is
+    appended as a unique tiebreaker.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    tiebreaker = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        cursor = self.decode_cursor(request, queryset)
+
+        queryset = queryset.order_by(*self.ordering)
+        self.reverse = bool(cursor and cursor['r'])
+        if self.reverse:
+            queryset = queryset.reverse()
+        if cursor:
+            queryset = queryset.filter(self.seek_condition(cursor['v']))
+
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if self.reverse:
+            results.reverse()
+
+        # Coming back from a later page there is always a next page; going
+        # forward there is a previous page whenever we started from a cursor.
+        if self.reverse:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, cursor is not None
+        self.next_position = results[-1] if results and has_next else None
+        self.previous_position = results[0] if results and has_previous else None
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, queryset):
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)]
+        names = [field.lstrip('-') for field in ordering]
+        if self.tiebreaker in names:
+            return ordering[:names.index(self.tiebreaker) + 1]
+        descending = bool(ordering) and ordering[0].startswith('-')
+        return ordering + [('-' if descending else '') + self.tiebreaker]
+
+    def seek_condition(self, values):
+        """(a, b, id) > (va, vb, vid) expanded into OR-ed prefixes, honouring each direction"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            ascending = not field.startswith('-')
+            if self.reverse:
+                ascending = not ascending
+            condition |= equal & Q(**{f'{name}__{"gt" if ascending else "lt"}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def position(self, obj):
+        # Rows may be model instances or dicts from queryset.values()
+        get = obj.__getitem__ if isinstance(obj, dict) else obj.__getattribute__
+        return [encode_value(get(field.lstrip('-'))) for field in self.ordering]
+
+    def get_ordering_names(self, queryset):
+        """Names whose values rows must carry for the cursor to be built"""
+        return [field.lstrip('-') for field in self.get_ordering(queryset)]
+
+    def encode_cursor(self, obj, reverse):
+        payload = json.dumps({'v': self.position(obj), 'r': int(reverse)}, separators=(',', ':'))
+        token = urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    @staticmethod
+    def ordering_field(queryset, name):
+        """The model field or annotation output field rows are ordered on"""
+        try:
+            return queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return queryset.query.annotations[name].output_field
+
+    def decode_cursor(self, request, queryset):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(token.encode()))
+            values, reverse = cursor['v'], cursor['r']
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # Values of the wrong type would fail in the seek condition's lookups
+        try:
+            values = [
+                self.ordering_field(queryset, field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in values:
+            raise NotFound(self.invalid_cursor_message)
+        return {'v': values, 'r': bool(reverse)}
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class PageNumberOrKeysetMixin:
+    """
+    Serve keyset pages by default and fall back to PageNumberPagination for
+    clients that send `?page=` or `?pagination=page`.
+    """
+    keyset_pagination_class = KeysetPagination
+    page_number_pagination_class = PageNumberPagination
+
+    def uses_page_numbers(self):
+        params = self.request.query_params
+        return 'page' in params or params.get('pagination') == 'page'
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.uses_page_numbers():
+                self._paginator = self.page_number_pagination_class()
+            else:
+                self._paginator = self.keyset_pagination_class()
+        return self._paginator
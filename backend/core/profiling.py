@@ -0,0 +1,92 @@
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f'{frame.f_globals.get("__name__", "?")}:{code.co_qualname}'
+
+
+def fold(frame):
+    """The stack above `frame` as a root-first, ';' separated collapsed-stack line"""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """
+    Sample the stack of one thread every `interval` seconds from a helper thread.
+
+    Produces collapsed stacks ({'a;b;c': samples}), the input format of
+    flamegraph.pl and speedscope, at a cost bounded by the interval rather
+    than by how many functions the profiled code calls.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[fold(frame)] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    name = match.view_name if match and match.view_name else 'unresolved'
+    return re.sub(r'[^\w.-]+', '_', name)
+
+
+def save_profile(directory, request, response, stacks, duration):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    endpoint = endpoint_name(request)
+    stem = f'{endpoint}.{time.time_ns() // 1_000_000}.{int(duration * 1000)}ms'
+    (directory / f'{stem}.folded').write_text(
+        ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+    )
+    (directory / f'{stem}.json').write_text(json.dumps({
+        'endpoint': endpoint,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 3),
+        'samples': sum(stacks.values()),
+        'folded': f'{stem}.folded',
+    }))
+    return stem
+
+
+def load_profiles(directory):
+    """Yield (metadata, stacks) for every profile saved in `directory`, oldest first"""
+    for meta_path in sorted(Path(directory).glob('*.json')):
+        meta = json.loads(meta_path.read_text())
+        stacks = Counter()
+        folded = meta_path.with_name(meta['folded'])
+        if folded.exists():
+            for line in folded.read_text().splitlines():
+                stack, _, count = line.rpartition(' ')
+                if stack:
+                    stacks[stack] += int(count)
+        yield meta, stacks
@@ -0,0 +1,64 @@
+"""
+JSON renderer and parser backed by orjson, when it is installed.
+
+With the compact, unicode and strict settings the API runs with, the
+renderer produces the same bytes as DRF's JSONRenderer for strings,
+integers, booleans, None, lists and dicts, and for DRF's encoding of
+Decimal, datetimes, lazy strings and querysets. Floats keep their value but
+not always their spelling: orjson writes exponents without a sign or
+padding (1e16, 1e-7 where json writes 1e+16, 1e-07), and NaN and infinities
+render as null instead of raising. Anything else (indented
+output for the browsable API, ASCII-only or non-strict settings, integers
+beyond 64 bits) goes through the stdlib implementation, as does everything
+when orjson is missing.
+"""
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Types orjson does not encode itself, or encodes differently, go through DRF's encoder
+_default = JSONEncoder().default
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+_LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact or not self.strict or \
+                self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like JSONRenderer does, so the output stays a JavaScript subset
+        for raw, escaped in _LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        # orjson only reads UTF-8, and always rejects NaN and infinities
+        if orjson is None or not self.strict or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,71 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+# Alias reads are sent to, or None for the primary
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+@contextmanager
+def replica_reads():
+    """
+    Serve the reads in the block from one replica, picked at random once so
+    the block sees a single consistent snapshot. A no-op without replicas.
+    """
+    aliases = replica_aliases()
+    token = _read_alias.set(random.choice(aliases) if aliases else None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def pinned_to_primary(request):
+    """Whether the client wrote recently enough that a replica may not have its changes yet"""
+    try:
+        return float(request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes always go to the primary. Reads go to a replica only inside
+    replica_reads(), and never while a transaction is open on the primary,
+    so checkout and other atomic blocks read what they are about to write.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+class ReplicaReadMixin:
+    """
+    Serve safe requests from a read replica, unless the client is pinned to
+    the primary because it wrote in the last REPLICA_PIN_SECONDS.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or pinned_to_primary(request):
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads():
+            return super().dispatch(request, *args, **kwargs)
@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.utils import timezone
 from .models import UserProfile, Book, Cart, CartItem, Order, OrderItem
 
 class UserSerializer(serializers.ModelSerializer):
@@ -17,9 +19,24 @@ class UserProfileSerializer(serializers.ModelSerializer):
 class BookSerializer(serializers.ModelSerializer):
     class Meta:
         model = Book
-        fields = '__all__'
+        # Sharding is an inventory detail, changed with manage.py shard_stock
+        exclude = ['stock_shards']
 
-class CartItemSerializer(serializers.ModelSerializer):
+class BookStockMixin:
+    """
+    For lines of a queryset annotated by with_book_stock(): the book's stock
+    is rendered from `book_stock`, what sharded books' shards hold now,
+    rather than from Book.stock
+    """
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        book = data.get('book')
+        if book and 'stock' in book and hasattr(instance, 'book_stock'):
+            book['stock'] = instance.book_stock
+        return data
+
+class CartItemSerializer(BookStockMixin, serializers.ModelSerializer):
     book = BookSerializer(read_only=True)
     book_id = serializers.PrimaryKeyRelatedField(
         queryset=Book.objects.all(),
@@ -39,24 +56,68 @@ class CartItemSerializer(serializers.ModelSerializer):
         validated_data['cart'] = cart
         return super().create(validated_data)
 
+class CartItemLineSerializer(serializers.Serializer):
+    """One line of a bulk add to cart"""
+    book_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
 class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, source='cartitem_set', read_only=True)
+    items = CartItemSerializer(many=True, source='cart_items', read_only=True)
     total_price = serializers.ReadOnlyField()
     total_items = serializers.ReadOnlyField()
     class Meta:
         model = Cart
         fields = ['id', 'user', 'items', 'total_price', 'total_items']
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(BookStockMixin, serializers.ModelSerializer):
     book = BookSerializer(read_only=True)
 
     class Meta:
         model = OrderItem
-        fields = ['order', 'book', 'quantity', 'price']
+        fields = ['id', 'order', 'book', 'quantity', 'price']
 
 class OrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True, source='orderitem_set', read_only=True)
+    items = OrderItemSerializer(many=True, source='order_items', read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'user', 'cart', 'items', 'total_price', 'status', 'created_at', 'updated_at']
+        read_only_fields = ['user', 'cart', 'total_price']
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """An order without its lines, for ?summary=1; the counts are annotated by the view"""
+    item_count = serializers.IntegerField(read_only=True)
+    total_quantity = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Order
-        fields = ['id', 'user', 'cart', 'items', 'status', 'created_at', 'updated_at']
+        fields = ['id', 'item_count', 'total_quantity', 'total_price', 'status', 'created_at', 'updated_at']
+
+class SearchAnalyticsQuerySerializer(serializers.Serializer):
+    """Query parameters of the search analytics endpoints; days default to today"""
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    user = serializers.IntegerField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+    def validate(self, attrs):
+        attrs.setdefault('until', timezone.localdate())
+        attrs.setdefault('since', attrs['until'])
+        if attrs['since'] > attrs['until']:
+            raise serializers.ValidationError({'since': 'Must not be after until.'})
+        return attrs
+
+class BatchRequestSerializer(serializers.Serializer):
+    """One sub-request of POST /api/batch/"""
+    method = serializers.ChoiceField(choices=['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE'], default='GET')
+    path = serializers.RegexField(r'^/api/', max_length=2000)
+    params = serializers.DictField(required=False)
+    body = serializers.JSONField(required=False)
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchRequestSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(f'At most {settings.BATCH_MAX_REQUESTS} requests per batch.')
+        return value
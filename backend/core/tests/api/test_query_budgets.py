@@ -0,0 +1,71 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from rest_framework.test import APIClient, APITestCase
+
+from core.models import Book, Cart, CartItem, Order, OrderItem
+from core.tests.query_budget import query_budget
+
+
+def grow_books(size):
+    """Top the catalog up to `size` books and return them"""
+    missing = size - Book.objects.count()
+    Book.objects.bulk_create(
+        Book(title=f'Book {i}', author='Author', price=Decimal('3.00'), stock=100, isbn=str(1000000000000 + i))
+        for i in range(Book.objects.count(), Book.objects.count() + max(missing, 0))
+    )
+    return list(Book.objects.order_by('id')[:size])
+
+
+class BudgetTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='budget', password='password')
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+
+
+class BookQueryBudgets(BudgetTestCase):
+    def populate(self, size):
+        self.book = grow_books(size)[0]
+
+    test_list = query_budget('/api/books/', 4)
+    test_list_page_numbers = query_budget('/api/books/?page=1', 5)
+    test_search = query_budget('/api/books/?search=book', 4)
+    test_detail = query_budget('/api/books/{self.book.pk}/', 2)
+
+
+class CartQueryBudgets(BudgetTestCase):
+    def populate(self, size):
+        for book in grow_books(size):
+            CartItem.objects.get_or_create(cart=self.cart, book=book)
+
+    test_cart_list = query_budget('/api/carts/', 5)
+    test_cart_detail = query_budget('/api/carts/{self.cart.pk}/', 5)
+    test_cart_items = query_budget('/api/cart-items/', 3)
+
+
+class OrderQueryBudgets(BudgetTestCase):
+    def populate(self, size):
+        books = grow_books(size)
+        for _ in range(size - Order.objects.count()):
+            order = Order.objects.create(user=self.user, cart=self.cart)
+            OrderItem.objects.bulk_create(OrderItem(order=order, book=book, price=book.price) for book in books[:3])
+
+    test_order_list = query_budget('/api/orders/', 5)
+    test_order_summaries = query_budget('/api/orders/?summary=1', 4)
+
+
+class QueryMetricsMiddlewareTests(APITestCase):
+    @override_settings(QUERY_METRICS=True)
+    def test_headers_report_queries(self):
+        grow_books(3)
+        response = APIClient().get('/api/books/')
+        self.assertEqual(response['X-Query-Count'], '4')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="4 queries"', response['Server-Timing'])
+
+    @override_settings(QUERY_METRICS=False)
+    def test_disabled_by_setting(self):
+        response = APIClient().get('/api/books/')
+        self.assertNotIn('X-Query-Count', response)
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import SearchQueryDaily, UserSearchDaily
+
+class SearchAnalyticsTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='analyst', password='password', is_staff=True)
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.bob = User.objects.create_user(username='bob', password='password')
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+        SearchQueryDaily.objects.bulk_create([
+            SearchQueryDaily(day=self.today, query='django', count=5),
+            SearchQueryDaily(day=self.today, query='rust', count=2),
+            SearchQueryDaily(day=self.yesterday, query='rust', count=4),
+        ])
+        UserSearchDaily.objects.bulk_create([
+            UserSearchDaily(user=self.alice, day=self.today, count=6),
+            UserSearchDaily(user=self.bob, day=self.today, count=1),
+            UserSearchDaily(user=self.alice, day=self.yesterday, count=4),
+        ])
+        self.client.force_authenticate(self.staff)
+
+    def test_top_queries_today(self):
+        response = self.client.get('/api/analytics/searches/top-queries/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 7)
+        self.assertEqual(response.data['results'], [{'query': 'django', 'count': 5}, {'query': 'rust', 'count': 2}])
+
+    def test_top_queries_over_days(self):
+        response = self.client.get('/api/analytics/searches/top-queries/',
+                                   {'since': self.yesterday, 'until': self.today, 'limit': 1})
+        self.assertEqual(response.data['total'], 11)
+        self.assertEqual(response.data['results'], [{'query': 'rust', 'count': 6}])
+
+    def test_searches_per_user_per_day(self):
+        response = self.client.get('/api/analytics/searches/users/', {'since': self.yesterday})
+        self.assertEqual([(row['day'], row['username'], row['count']) for row in response.data['results']], [
+            (self.today, 'alice', 6), (self.today, 'bob', 1), (self.yesterday, 'alice', 4),
+        ])
+
+        response = self.client.get('/api/analytics/searches/users/', {'since': self.yesterday, 'user': self.bob.pk})
+        self.assertEqual([row['count'] for row in response.data['results']], [1])
+
+    def test_reads_only_rollups(self):
+        with self.assertNumQueries(2):
+            self.client.get('/api/analytics/searches/top-queries/')
+
+    def test_invalid_range(self):
+        response = self.client.get('/api/analytics/searches/top-queries/', {'since': self.today, 'until': self.yesterday})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.get('/api/analytics/searches/top-queries/').status_code, status.HTTP_403_FORBIDDEN)
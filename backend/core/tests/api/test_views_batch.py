@@ -0,0 +1,136 @@
+import threading
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from core import batch, google_books
+from core.models import Book, Cart, CartItem, Order, SearchHistory
+from core.tests.google_books_stub import GoogleBooksStub
+
+
+class BatchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', password='password')
+        self.client.force_login(self.user)
+        self.book = Book.objects.create(title='Dune', author='Frank Herbert', price=Decimal('9.99'),
+                                        stock=5, isbn='1000000000001')
+
+    def run_batch(self, *requests):
+        response = self.client.post('/api/batch/', {'requests': list(requests)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()['responses']
+
+    def test_responses_in_request_order(self):
+        current_user, carts, books, orders = self.run_batch(
+            {'path': '/api/auth/current-user/'},
+            {'path': '/api/carts/'},
+            {'path': f'/api/books/{self.book.pk}/'},
+            {'path': '/api/orders/'},
+        )
+        self.assertEqual(current_user['status'], 200)
+        self.assertEqual(current_user['body']['user']['username'], 'shopper')
+        self.assertEqual(carts['body']['results'], [])
+        self.assertEqual(books['body']['title'], 'Dune')
+        self.assertEqual(books['headers']['Content-Type'], 'application/json')
+        self.assertEqual(orders['body']['count'], 0)
+
+    def test_params_become_the_query_string(self):
+        Book.objects.create(title='Emma', author='Jane Austen', price=Decimal('5.00'),
+                            stock=5, isbn='1000000000002')
+        (books,) = self.run_batch({'path': '/api/books/', 'params': {'ordering': '-title', 'page_size': 1}})
+        self.assertEqual([book['title'] for book in books['body']['results']], ['Emma'])
+
+    def test_sub_request_errors_stay_in_their_entry(self):
+        missing, excluded, forbidden = self.run_batch(
+            {'path': '/api/nowhere/'},
+            {'method': 'POST', 'path': '/api/auth/logout/'},
+            {'path': '/api/analytics/searches/top-queries/'},
+        )
+        self.assertEqual(missing['status'], 404)
+        self.assertEqual(excluded['status'], 400)
+        self.assertEqual(forbidden['status'], 403)
+
+    def test_writes_are_seen_by_later_sub_requests(self):
+        added, cart = self.run_batch(
+            {'method': 'POST', 'path': '/api/cart-items/', 'body': {'book_id': self.book.pk, 'quantity': 2}},
+            {'path': '/api/carts/'},
+        )
+        self.assertEqual(added['status'], 201)
+        self.assertEqual(cart['body']['results'][0]['total_items'], 2)
+
+    def test_session_and_user_are_loaded_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.run_batch(*[{'path': '/api/carts/'}] * 3, {'path': '/api/auth/current-user/'})
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual(len([q for q in sql if 'django_session' in q]), 1)
+        self.assertEqual(len([q for q in sql if 'FROM "auth_user"' in q]), 1)
+
+    def test_async_views_get_the_batch_user(self):
+        stub = GoogleBooksStub().start()
+        self.addCleanup(stub.stop)
+        google_books.volume_cache.clear()
+        self.addCleanup(google_books.volume_cache.clear)
+        with override_settings(GOOGLE_BOOKS_API_URL=stub.url):
+            (search,) = self.run_batch({'path': '/api/search/async/', 'params': {'q': 'rust'}})
+        async_to_sync(google_books.aclose_client)()
+        self.assertEqual(search['status'], 200)
+        self.assertEqual(len(search['body']), 3)
+        self.assertTrue(SearchHistory.objects.filter(user=self.user, query='rust').exists())
+
+    def test_anonymous_sub_requests_get_their_views_permissions(self):
+        self.client.logout()
+        books, carts = self.run_batch({'path': '/api/books/'}, {'path': '/api/carts/'})
+        self.assertEqual(books['status'], 200)
+        self.assertEqual(carts['status'], 403)
+
+    def test_validation(self):
+        response = self.client.post('/api/batch/', {'requests': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/batch/', {'requests': [{'path': '/admin/'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.settings(BATCH_MAX_REQUESTS=2):
+            response = self.client.post('/api/batch/', {'requests': [{'path': '/api/books/'}] * 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(BATCH_MAX_WORKERS=4)
+class ConcurrentBatchTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', password='password')
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        book = Book.objects.create(title='Dune', author='Frank Herbert', price=Decimal('9.99'),
+                                   stock=5, isbn='1000000000001')
+        CartItem.objects.create(cart=Cart.objects.create(user=self.user), book=book, quantity=1)
+
+    def test_runs_of_reads_share_the_thread_pool(self):
+        threads = []
+        dispatch = batch.dispatch
+
+        def recording_dispatch(*args):
+            threads.append((args[2]['method'], threading.current_thread().name))
+            return dispatch(*args)
+
+        with mock.patch.object(batch, 'dispatch', recording_dispatch):
+            response = self.client.post('/api/batch/', {'requests': [
+                {'path': '/api/books/'},
+                {'path': '/api/carts/'},
+                {'method': 'POST', 'path': '/api/orders/'},
+                {'path': '/api/orders/'},
+            ]}, format='json')
+
+        books, carts, checkout, orders = response.json()['responses']
+        self.assertEqual([books['status'], carts['status'], checkout['status']], [200, 200, 201])
+        self.assertEqual(orders['body']['count'], 1)
+        self.assertEqual(Order.objects.count(), 1)
+        # Two reads on the pool, then the write and the read after it in order
+        self.assertTrue(all(name.startswith('batch') for _, name in threads[:2]))
+        self.assertEqual(threads[2], ('POST', threading.current_thread().name))
+        self.assertEqual(threads[3][1], threading.current_thread().name)
@@ -0,0 +1,122 @@
+from decimal import Decimal
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from core.models import Book, Cart, CartItem, StockReservation
+
+class CartTotalsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', password='password')
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+
+    def add_books(self, count, start=0):
+        for i in range(start, start + count):
+            book = Book.objects.create(title=f'Book {i}', author='Author', price=Decimal('2.50'),
+                                       stock=10, isbn=str(1000000000000 + i))
+            CartItem.objects.create(cart=self.cart, book=book, quantity=2)
+
+    def test_cart_item_total_price(self):
+        self.add_books(1)
+        item = CartItem.objects.get()
+        self.assertEqual(item.total_price, Decimal('5.00'))
+        self.assertEqual(CartItem.objects.with_line_totals().get().total_price, Decimal('5.00'))
+
+    def test_annotated_totals_match_python_totals(self):
+        self.add_books(3)
+        annotated = Cart.objects.with_totals().get(pk=self.cart.pk)
+        self.assertEqual(annotated.total_price, self.cart.total_price)
+        self.assertEqual(annotated.total_items, self.cart.total_items)
+        self.assertEqual((annotated.total_price, annotated.total_items), (Decimal('15.00'), 6))
+
+    def test_empty_cart_totals(self):
+        cart = Cart.objects.with_totals().get(pk=self.cart.pk)
+        self.assertEqual((cart.total_price, cart.total_items), (Decimal('0'), 0))
+
+    def test_retrieve_cart(self):
+        self.add_books(2)
+        response = self.client.get(f'/api/carts/{self.cart.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_items'], 4)
+        self.assertEqual(response.data['total_price'], Decimal('10.00'))
+        self.assertEqual(len(response.data['items']), 2)
+        self.assertEqual(response.data['items'][0]['total_price'], Decimal('5.00'))
+
+    def test_cart_query_count_is_constant(self):
+        self.add_books(1)
+        with self.assertNumQueries(5):
+            self.client.get('/api/carts/')
+        self.add_books(20, start=1)
+        # 2 for the ETag validators, then count, carts with totals, prefetched items with books
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/carts/')
+        self.assertEqual(len(response.data['results'][0]['items']), 21)
+
+
+class CartItemBulkTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reorderer', password='password')
+        self.client.force_authenticate(self.user)
+        self.books = [
+            Book.objects.create(title=f'Book {i}', author='Author', price=Decimal('2.50'),
+                                stock=3, isbn=str(1000000000000 + i))
+            for i in range(12)
+        ]
+
+    def bulk(self, lines):
+        return self.client.post('/api/cart-items/bulk/', lines, format='json')
+
+    def test_adds_all_lines_with_per_line_results(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, book=self.books[0], quantity=1)
+        response = self.bulk([
+            {'book_id': self.books[0].id, 'quantity': 2},
+            {'book_id': self.books[1].id},
+            {'book_id': self.books[2].id, 'quantity': 4},
+            {'book_id': 999999, 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['updated', 'created', 'error', 'error'])
+        self.assertEqual(results[0]['item']['quantity'], 3)
+        self.assertEqual(results[1]['item']['book']['title'], 'Book 1')
+        self.assertEqual(results[2]['error'], 'Only 3 items available in stock')
+        self.assertEqual(results[3]['error'], 'Book not found')
+
+        quantities = dict(cart.cart_items.values_list('book_id', 'quantity'))
+        self.assertEqual(quantities, {self.books[0].id: 3, self.books[1].id: 1})
+        reserved = dict(StockReservation.objects.values_list('book_id', 'quantity'))
+        self.assertEqual(reserved, quantities)
+
+    def test_repeated_books_add_up(self):
+        book = self.books[0]
+        response = self.bulk([{'book_id': book.id, 'quantity': 2}] * 2)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'error'])
+        self.assertEqual(results[1]['error'], 'Cannot add more than 3 items')
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+
+    def test_other_carts_reservations_count(self):
+        other = User.objects.create_user(username='other', password='password')
+        self.client.force_authenticate(other)
+        self.bulk([{'book_id': self.books[0].id, 'quantity': 3}])
+        self.client.force_authenticate(self.user)
+        result = self.bulk([{'book_id': self.books[0].id, 'quantity': 1}]).data['results'][0]
+        self.assertEqual(result['error'], 'Only 0 items available in stock')
+
+    def test_rejects_invalid_payloads(self):
+        for payload in ([], [{'quantity': 1}], [{'book_id': self.books[0].id, 'quantity': 0}], {'book_id': 1}):
+            self.assertEqual(self.bulk(payload).status_code, status.HTTP_400_BAD_REQUEST, payload)
+        with self.settings(CART_BULK_MAX_LINES=2):
+            self.assertEqual(self.bulk([{'book_id': book.id} for book in self.books[:3]]).status_code,
+                             status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, book=self.books[0], quantity=1)
+        # cart, savepoint, cart items, locked books, reservations, insert, update, reserve, release, touch
+        with self.assertNumQueries(10):
+            self.bulk([{'book_id': book.id} for book in self.books[:2]])
+        with self.assertNumQueries(10):
+            self.bulk([{'book_id': book.id} for book in self.books])
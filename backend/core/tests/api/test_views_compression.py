@@ -0,0 +1,68 @@
+import gzip
+from decimal import Decimal
+
+import brotli
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.middleware import accepted_encoding
+from core.models import Book
+
+
+class AcceptedEncodingTests(APITestCase):
+    def test_picks_the_highest_q_value(self):
+        codings = ('br', 'gzip')
+        self.assertEqual(accepted_encoding('gzip, deflate, br', codings), 'br')
+        self.assertEqual(accepted_encoding('gzip;q=1.0, br;q=0.5', codings), 'gzip')
+        self.assertEqual(accepted_encoding('br;q=0, gzip', codings), 'gzip')
+        self.assertEqual(accepted_encoding('*', codings), 'br')
+        self.assertEqual(accepted_encoding('*;q=0.5, br;q=0', codings), 'gzip')
+        self.assertIsNone(accepted_encoding('identity', codings))
+        self.assertIsNone(accepted_encoding('', codings))
+
+
+class CompressionTests(APITestCase):
+    def setUp(self):
+        Book.objects.bulk_create(
+            Book(title=f'Book {i}', author='Author', description='A long description. ' * 10,
+                 price=Decimal('9.99'), stock=5, isbn=str(1000000000000 + i))
+            for i in range(20)
+        )
+        self.plain = self.client.get('/api/books/').content
+
+    def test_brotli_when_preferred(self):
+        response = self.client.get('/api/books/', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.plain)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertLess(len(response.content), len(self.plain) / 4)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_gzip(self):
+        response = self.client.get('/api/books/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.plain)
+
+    def test_uncompressed_without_an_accepted_coding(self):
+        response = self.client.get('/api/books/', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, self.plain)
+
+    def test_small_responses_are_not_compressed(self):
+        book = Book.objects.first()
+        response = self.client.get(f'/api/books/{book.pk}/', HTTP_ACCEPT_ENCODING='br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(COMPRESSION_MIN_SIZE=10)
+    def test_threshold_is_a_setting(self):
+        book = Book.objects.first()
+        # A new client loads the middleware with the overridden setting
+        response = self.client_class().get(f'/api/books/{book.pk}/', HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+    def test_compressed_etag_is_weak_and_revalidates(self):
+        response = self.client.get('/api/books/', HTTP_ACCEPT_ENCODING='br')
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        repeat = self.client.get('/api/books/', HTTP_ACCEPT_ENCODING='br', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -0,0 +1,125 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.inventory import decrement_stock, shard_stock
+from core.models import Book, Cart, CartItem, Order
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='poller', password='password')
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(title='Cached', author='Author', price=Decimal('5.00'),
+                                        stock=10, isbn='1000000000001')
+        self.other = Book.objects.create(title='Other', author='Author', price=Decimal('7.00'),
+                                         stock=10, isbn='1000000000002')
+
+    def assert_revalidates(self, url, change):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        etag = first['ETag']
+
+        repeat = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repeat.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(repeat['ETag'], etag)
+        self.assertEqual(repeat.content, b'')
+
+        change()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_book_list_changes_on_update(self):
+        def change():
+            self.book.price = Decimal('6.00')
+            self.book.save()
+        self.assert_revalidates('/api/books/', change)
+
+    def test_book_list_changes_on_delete(self):
+        self.assert_revalidates('/api/books/', self.other.delete)
+
+    def test_book_list_etag_depends_on_query(self):
+        self.assertNotEqual(self.client.get('/api/books/')['ETag'],
+                            self.client.get('/api/books/', {'ordering': 'price'})['ETag'])
+
+    def test_book_detail_changes_on_checkout(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, book=self.book, quantity=1)
+        self.assert_revalidates(f'/api/books/{self.book.pk}/', lambda: self.client.post('/api/orders/'))
+
+    def test_book_list_and_detail_change_on_sharded_checkout(self):
+        shard_stock(self.book.id, 1)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, book=self.book, quantity=1)
+        checkout = lambda: self.client.post('/api/orders/')
+        self.assert_revalidates(f'/api/books/{self.book.pk}/', checkout)
+        CartItem.objects.create(cart=cart, book=self.book, quantity=1)
+        self.assert_revalidates('/api/books/', checkout)
+
+    def test_if_modified_since(self):
+        response = self.client.get(f'/api/books/{self.book.pk}/')
+        self.assertEqual(response['Last-Modified'], http_date(int(self.book.updated_at.timestamp())))
+
+        later = http_date((timezone.now() + timedelta(seconds=5)).timestamp())
+        response = self.client.get(f'/api/books/{self.book.pk}/', HTTP_IF_MODIFIED_SINCE=later)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_book_is_not_found(self):
+        self.assertEqual(self.client.get('/api/books/999/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cart_changes_when_items_change(self):
+        self.client.post('/api/cart-items/', {'book_id': self.book.pk, 'quantity': 1})
+        self.assert_revalidates(
+            '/api/carts/',
+            lambda: self.client.post('/api/cart-items/', {'book_id': self.other.pk, 'quantity': 1}),
+        )
+        item = CartItem.objects.get(book=self.other)
+        self.assert_revalidates('/api/carts/', lambda: self.client.delete(f'/api/cart-items/{item.pk}/'))
+
+    def test_cart_changes_when_book_changes(self):
+        self.client.post('/api/cart-items/', {'book_id': self.book.pk, 'quantity': 1})
+
+        def change():
+            self.book.title = 'Renamed'
+            self.book.save()
+        self.assert_revalidates('/api/carts/', change)
+
+    def test_carts_and_orders_follow_sharded_stock(self):
+        shard_stock(self.book.id, 1)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, book=self.book, quantity=1)
+        self.client.post('/api/orders/')
+        self.client.post('/api/cart-items/', {'book_id': self.book.pk, 'quantity': 1})
+        # Another buyer's checkout only changes the shards
+        sale = lambda: decrement_stock({self.book.id: 2}, shards={self.book.id: 1})
+        self.assert_revalidates('/api/carts/', sale)
+        self.assert_revalidates('/api/orders/', sale)
+
+        stock = self.client.get('/api/carts/', {'fields': 'items.book.stock'}).data['results'][0]['items']
+        self.assertEqual(stock, [{'book': {'stock': 5}}])
+        self.assertEqual(self.client.get('/api/orders/').data['results'][0]['items'][0]['book']['stock'], 5)
+
+    def test_orders_change_on_cancel(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, book=self.book, quantity=1)
+        self.client.post('/api/orders/')
+        order = Order.objects.get()
+        self.assert_revalidates('/api/orders/', lambda: self.client.post(f'/api/orders/{order.pk}/cancel_order/'))
+
+    def test_not_modified_skips_serialization(self):
+        etag = self.client.get('/api/orders/')['ETag']
+        # orders aggregate, catalog version
+        with self.assertNumQueries(2):
+            self.client.get('/api/orders/', HTTP_IF_NONE_MATCH=etag)
+
+    def test_cart_detail_revalidates(self):
+        cart = Cart.objects.create(user=self.user)
+        self.assert_revalidates(
+            f'/api/carts/{cart.pk}/',
+            lambda: self.client.post('/api/cart-items/', {'book_id': self.book.pk, 'quantity': 1}),
+        )
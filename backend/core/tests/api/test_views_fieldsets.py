@@ -0,0 +1,124 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.fieldsets import parse_fieldset
+from core.models import Book, Cart, CartItem, Order
+
+
+def selected_sql(queries, table):
+    """The SELECTs loading rows of `table`"""
+    return [query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(f'SELECT "{table}"."id"') and f'FROM "{table}"' in query['sql']]
+
+
+class ParseFieldsetTests(APITestCase):
+    def test_nested_paths(self):
+        self.assertEqual(parse_fieldset('id, items.book.title,items.quantity,,'),
+                         {'id': {}, 'items': {'book': {'title': {}}, 'quantity': {}}})
+        self.assertEqual(parse_fieldset(''), {})
+
+
+class BookFieldsetTests(APITestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title='Dune', author='Frank Herbert', description='A long description',
+                                        price=Decimal('9.99'), stock=5, isbn='1000000000001')
+
+    def test_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/books/', {'fields': 'id,title,price'})
+        self.assertEqual(response.data['results'], [{'id': self.book.pk, 'title': 'Dune', 'price': '9.99'}])
+        (sql,) = selected_sql(queries, 'core_book')
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('"author"', sql)
+
+    def test_omit(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/books/{self.book.pk}/', {'omit': 'description'})
+        self.assertNotIn('description', response.data)
+        self.assertEqual(response.data['author'], 'Frank Herbert')
+        (sql,) = selected_sql(queries, 'core_book')
+        self.assertNotIn('"description"', sql)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/api/books/', {'fields': 'title,colour'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('colour', str(response.data['fields']))
+        response = self.client.get('/api/books/', {'omit': 'title.length'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_fieldsets_get_their_own_etag(self):
+        full = self.client.get('/api/books/')
+        sparse = self.client.get('/api/books/', {'fields': 'title'})
+        self.assertNotEqual(full['ETag'], sparse['ETag'])
+
+
+class CartFieldsetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', password='password')
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+        for i in range(3):
+            book = Book.objects.create(title=f'Book {i}', author='Author', description='A long description',
+                                       price=Decimal('2.50'), stock=10, isbn=str(1000000000000 + i))
+            CartItem.objects.create(cart=self.cart, book=book, quantity=2)
+
+    def test_badge_skips_the_lines(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/carts/', {'fields': 'total_items'})
+        self.assertEqual(response.data['results'], [{'total_items': 6}])
+        self.assertEqual(selected_sql(queries, 'core_cartitem'), [])
+        self.assertNotIn('"created_at"', selected_sql(queries, 'core_cart')[-1])
+
+    def test_nested_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/carts/{self.cart.pk}/',
+                                       {'fields': 'total_price,items.quantity,items.book.title'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_price'], Decimal('15.00'))
+        self.assertEqual(response.data['items'][0], {'quantity': 2, 'book': {'title': 'Book 0'}})
+        (sql,) = selected_sql(queries, 'core_cartitem')
+        self.assertIn('"core_book"."title"', sql)
+        self.assertNotIn('"description"', sql)
+
+    def test_omit_nested(self):
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/carts/', {'omit': 'items.book.description,user'})
+        cart = response.data['results'][0]
+        self.assertNotIn('user', cart)
+        self.assertNotIn('description', cart['items'][0]['book'])
+        self.assertEqual(cart['items'][0]['book']['title'], 'Book 0')
+        self.assertEqual(cart['items'][0]['total_price'], Decimal('5.00'))
+
+    def test_omit_the_books(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/carts/', {'omit': 'items.book'})
+        item = response.data['results'][0]['items'][0]
+        self.assertEqual(set(item), {'id', 'quantity', 'total_price'})
+        (sql,) = selected_sql(queries, 'core_cartitem')
+        self.assertNotIn('"core_book"."title"', sql)
+
+    def test_writes_ignore_fieldsets(self):
+        book = Book.objects.create(title='Dune', author='Frank Herbert', price=Decimal('9.99'),
+                                   stock=5, isbn='1000000000099')
+        response = self.client.post('/api/cart-items/?fields=id', {'book_id': book.pk, 'quantity': 1})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+class OrderFieldsetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', password='password')
+        self.client.force_authenticate(self.user)
+        cart = Cart.objects.create(user=self.user)
+        self.order = Order.objects.create(user=self.user, cart=cart, total_price=Decimal('5.00'))
+
+    def test_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/orders/', {'fields': 'id,status'})
+        self.assertEqual(response.data['results'], [{'id': self.order.pk, 'status': 'pending'}])
+        sql = selected_sql(queries, 'core_order')[-1]
+        self.assertNotIn('"updated_at"', sql.split(' FROM ')[0])
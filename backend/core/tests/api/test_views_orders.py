@@ -0,0 +1,226 @@
+import random
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from core.inventory import rebalance_stock, shard_stock
+from core.models import Book, Cart, CartItem, Order, OrderItem, StockReservation
+
+
+def make_book(isbn, stock=10, price='4.00'):
+    return Book.objects.create(title=f'Book {isbn}', author='Author', price=Decimal(price),
+                               stock=stock, isbn=isbn)
+
+
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='password')
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+        self.first = make_book('1000000000001', stock=5)
+        self.second = make_book('1000000000002', stock=2, price='10.00')
+
+    def fill_cart(self, first_quantity=2, second_quantity=1):
+        CartItem.objects.create(cart=self.cart, book=self.first, quantity=first_quantity)
+        CartItem.objects.create(cart=self.cart, book=self.second, quantity=second_quantity)
+
+    def test_checkout_creates_order_and_decrements_stock(self):
+        self.fill_cart()
+        response = self.client.post('/api/orders/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        order = Order.objects.get()
+        self.assertEqual(order.cart, self.cart)
+        self.assertEqual(order.total_price, Decimal('18.00'))
+        self.assertEqual(OrderItem.objects.filter(order=order).count(), 2)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.stock, self.second.stock), (3, 1))
+        self.assertFalse(self.cart.cart_items.exists())
+        stock = {item['book']['id']: item['book']['stock'] for item in response.data['items']}
+        self.assertEqual(stock, {self.first.id: 3, self.second.id: 1})
+
+    def test_checkout_rejects_empty_cart(self):
+        response = self.client.post('/api/orders/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_checkout_rejects_insufficient_stock_without_side_effects(self):
+        self.fill_cart(second_quantity=3)
+        response = self.client.post('/api/orders/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(self.second.title, response.data['error'])
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.stock, 5)
+        self.assertFalse(Order.objects.exists())
+
+    def test_checkout_query_count_does_not_grow_with_cart_size(self):
+        self.fill_cart()
+        with self.assertNumQueries(18):
+            self.client.post('/api/orders/')
+
+        for i in range(10):
+            CartItem.objects.create(cart=self.cart, book=make_book(str(2000000000000 + i)))
+        with self.assertNumQueries(18):
+            self.client.post('/api/orders/')
+
+    def test_checkout_of_reserved_cart_skips_the_stock_check(self):
+        for book in (self.first, self.second):
+            self.client.post('/api/cart-items/', {'book_id': book.id, 'quantity': 1})
+        # No book lock, no reservation sum
+        with self.assertNumQueries(14):
+            response = self.client.post('/api/orders/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.stock, 4)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_cancel_order_restores_stock_once(self):
+        self.fill_cart()
+        self.client.post('/api/orders/')
+        order = Order.objects.get()
+
+        response = self.client.post(f'/api/orders/{order.pk}/cancel_order/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(f'/api/orders/{order.pk}/cancel_order/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.stock, self.second.stock), (5, 2))
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+
+    def test_sharded_checkout_shows_in_the_catalog(self):
+        shard_stock(self.first.id, 1)
+        shard_stock(self.second.id, 1)
+        self.fill_cart(second_quantity=2)
+        self.assertEqual(self.client.post('/api/orders/').status_code, status.HTTP_201_CREATED)
+
+        listed = self.client.get('/api/books/').data['results']
+        self.assertEqual({book['id']: book['stock'] for book in listed}, {self.first.id: 3, self.second.id: 0})
+        self.assertEqual(self.client.get(f'/api/books/{self.first.id}/').data['stock'], 3)
+        in_stock = self.client.get('/api/books/', {'in_stock_only': 1}).data['results']
+        self.assertEqual([book['id'] for book in in_stock], [self.first.id])
+
+
+class OrderHistoryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='password')
+        self.client.force_authenticate(self.user)
+        self.cart = Cart.objects.create(user=self.user)
+        self.books = [make_book(str(1000000000001 + i)) for i in range(3)]
+
+    def place_order(self, *quantities):
+        order = Order.objects.create(user=self.user, cart=self.cart, total_price=Decimal('4.00') * sum(quantities))
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, book=book, quantity=quantity, price=book.price)
+            for book, quantity in zip(self.books, quantities)
+        )
+        return order
+
+    def test_items_and_books_are_rendered(self):
+        order = self.place_order(1, 2)
+        response = self.client.get(f'/api/orders/{order.pk}/')
+        self.assertEqual(response.data['total_price'], '12.00')
+        self.assertEqual([(item['book']['title'], item['quantity']) for item in response.data['items']],
+                         [('Book 1000000000001', 1), ('Book 1000000000002', 2)])
+
+    def test_newest_first(self):
+        older, newer = self.place_order(1), self.place_order(1)
+        Order.objects.filter(pk=older.pk).update(created_at=timezone.now() - timedelta(days=1))
+        response = self.client.get('/api/orders/')
+        self.assertEqual([order['id'] for order in response.data['results']], [newer.pk, older.pk])
+
+    def test_summary(self):
+        order = self.place_order(1, 2, 3)
+        self.place_order(1)
+        response = self.client.get('/api/orders/', {'summary': '1'})
+        summary = response.data['results'][1]
+        self.assertEqual(summary['id'], order.pk)
+        self.assertEqual((summary['item_count'], summary['total_quantity']), (3, 6))
+        self.assertEqual(summary['total_price'], '24.00')
+        self.assertNotIn('items', summary)
+
+        response = self.client.get(f'/api/orders/{order.pk}/', {'summary': 'true'})
+        self.assertEqual(response.data['item_count'], 3)
+
+    def test_history_query_count_is_constant(self):
+        for _ in range(25):
+            self.place_order(1, 1, 1)
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(len(response.data['results'][0]['items']), 3)
+
+    def test_checkout_response_renders_the_new_lines(self):
+        CartItem.objects.create(cart=self.cart, book=self.books[0], quantity=2)
+        response = self.client.post('/api/orders/')
+        self.assertEqual(response.data['total_price'], '8.00')
+        self.assertEqual([item['quantity'] for item in response.data['items']], [2])
+        self.assertEqual(response.data['items'][0]['book']['title'], 'Book 1000000000001')
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    buyers = 20
+    stock = 5
+    attempts = 50
+
+    def make_hot_book(self):
+        return make_book('9000000000001', stock=self.stock)
+
+    def test_hot_book_never_oversells(self):
+        book = self.make_hot_book()
+        users = []
+        for i in range(self.buyers):
+            user = User.objects.create_user(username=f'buyer{i}')
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, book=book, quantity=1)
+            users.append(user)
+
+        start = threading.Barrier(self.buyers)
+        results = []
+
+        def checkout(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            start.wait()
+            try:
+                for _ in range(self.attempts):
+                    try:
+                        results.append(client.post('/api/orders/').status_code)
+                        return
+                    except OperationalError:
+                        # The in-memory test database refuses concurrent
+                        # writers outright instead of waiting; retry like a client would
+                        time.sleep(random.uniform(0.001, 0.02))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        rebalance_stock()
+        book.refresh_from_db()
+        sold = sum(OrderItem.objects.filter(book=book).values_list('quantity', flat=True))
+        self.assertEqual(book.stock, 0)
+        self.assertEqual(sold, self.stock)
+        self.assertEqual(Order.objects.count(), self.stock)
+        self.assertLessEqual(results.count(status.HTTP_201_CREATED), self.stock)
+
+
+class ShardedConcurrentCheckoutTests(ConcurrentCheckoutTests):
+    def make_hot_book(self):
+        book = super().make_hot_book()
+        shard_stock(book.id, 3)
+        return book
@@ -0,0 +1,72 @@
+from base64 import urlsafe_b64encode
+from decimal import Decimal
+
+from rest_framework.test import APITestCase
+from rest_framework import status
+from core.models import Book
+
+class BookKeysetPaginationTests(APITestCase):
+    def setUp(self):
+        # Only five distinct prices so the id tiebreaker matters
+        for i in range(23):
+            Book.objects.create(title=f'Title {i % 7:02d}',
+                                author='Author',
+                                description='keyset',
+                                price=Decimal(10 + i % 5),
+                                isbn=str(1000000000000 + i))
+
+    def walk(self, params, direction='next'):
+        response = self.client.get('/api/books/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        pages = [response.data]
+        while response.data[direction]:
+            response = self.client.get(response.data[direction])
+            pages.append(response.data)
+        return pages
+
+    def ids(self, pages):
+        return [book['id'] for page in pages for book in page['results']]
+
+    def assert_walk_matches(self, ordering, expected):
+        pages = self.walk({'ordering': ordering, 'page_size': 4})
+        self.assertEqual(self.ids(pages), [book.id for book in expected])
+        self.assertNotIn('count', pages[0])
+
+        # Walking back from the last page yields the same pages in reverse
+        previous = [pages[-1]]
+        while previous[-1]['previous']:
+            previous.append(self.client.get(previous[-1]['previous']).data)
+        self.assertEqual(self.ids(reversed(previous)), [book.id for book in expected])
+
+    def test_default_ordering_is_by_id(self):
+        self.assert_walk_matches('', Book.objects.order_by('id'))
+
+    def test_every_ordering_field(self):
+        for ordering in ['price', '-price', 'title', '-title']:
+            with self.subTest(ordering=ordering):
+                tiebreaker = '-id' if ordering.startswith('-') else 'id'
+                self.assert_walk_matches(ordering, Book.objects.order_by(ordering, tiebreaker))
+
+    def test_search_results_page_by_rank(self):
+        pages = self.walk({'search': 'keyset', 'page_size': 5})
+        self.assertEqual(len(set(self.ids(pages))), 23)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/books/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_values_of_the_wrong_type(self):
+        for ordering, payload in [('price', '{"v":["abc",1],"r":0}'), ('', '{"v":["x"],"r":0}'),
+                                  ('', '{"v":[null],"r":0}'), ('title', '{"v":[{},[1]],"r":0}')]:
+            with self.subTest(ordering=ordering, payload=payload):
+                cursor = urlsafe_b64encode(payload.encode()).decode()
+                response = self.client.get('/api/books/', {'ordering': ordering, 'cursor': cursor})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_number_mode_for_older_clients(self):
+        response = self.client.get('/api/books/', {'page': 2})
+        self.assertEqual(response.data['count'], 23)
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = self.client.get('/api/books/', {'pagination': 'page'})
+        self.assertEqual(response.data['count'], 23)
@@ -0,0 +1,86 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APITransactionTestCase
+
+from core.models import Book, Cart, CartItem, Order
+from core.replicas import PrimaryReplicaRouter, replica_reads
+
+
+def make_book(isbn, using='default', **fields):
+    return Book.objects.using(using).create(title=f'Book {isbn}', author='Author', price=Decimal('4.00'),
+                                            stock=10, isbn=isbn, **fields)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(APITransactionTestCase):
+    """
+    The test databases for 'default' and 'replica' are two separate SQLite
+    databases with no replication between them, so which one served a read
+    shows in the response. TransactionTestCase, since TestCase would wrap
+    every request in a transaction, which the router keeps on the primary.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='password')
+        User.objects.using('replica').create(pk=self.user.pk, username='reader')
+        self.client.force_authenticate(self.user)
+
+    def test_catalog_reads_use_replica(self):
+        primary_only = make_book('1000000000001')
+        replicated = make_book('1000000000002', using='replica', pk=primary_only.pk + 1)
+
+        response = self.client.get('/api/books/')
+        self.assertEqual([book['id'] for book in response.data['results']], [replicated.pk])
+        self.assertEqual(self.client.get(f'/api/books/{primary_only.pk}/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_writes_use_primary(self):
+        response = self.client.post('/api/books/', {
+            'title': 'New', 'author': 'Author', 'price': '3.00', 'stock': 1, 'isbn': '1000000000003',
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Book.objects.using('default').filter(isbn='1000000000003').exists())
+        self.assertFalse(Book.objects.using('replica').filter(isbn='1000000000003').exists())
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        book = make_book('1000000000001')
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, book=book, quantity=1)
+
+        # Checkout runs, and reads, on the primary
+        response = self.client.post('/api/orders/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('primary_until', response.cookies)
+
+        order = Order.objects.get()
+        self.assertEqual([row['id'] for row in self.client.get('/api/orders/').data['results']], [order.pk])
+
+        # Once the pin expires the replica, which has not caught up, serves reads again
+        del self.client.cookies['primary_until']
+        self.assertEqual(self.client.get('/api/orders/').data['results'], [])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class PrimaryReplicaRouterTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def test_reads_default_to_primary(self):
+        self.assertEqual(PrimaryReplicaRouter().db_for_read(Book), 'default')
+
+    def test_replica_reads(self):
+        router = PrimaryReplicaRouter()
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Book), 'replica')
+            self.assertEqual(router.db_for_write(Book), 'default')
+            self.assertEqual(Book.objects.all().db, 'replica')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Book), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        with replica_reads():
+            self.assertEqual(PrimaryReplicaRouter().db_for_read(Book), 'default')
@@ -0,0 +1,80 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from core.models import Book, CartItem, StockReservation
+
+
+class ReservationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='first', password='password')
+        self.client.force_authenticate(self.user)
+        self.other = APIClient()
+        self.other.force_authenticate(User.objects.create_user(username='second', password='password'))
+        self.book = Book.objects.create(title='Hot Book', author='Author', price=Decimal('5.00'),
+                                        stock=3, isbn='1000000000001')
+
+    def add(self, client, quantity):
+        return client.post('/api/cart-items/', {'book_id': self.book.id, 'quantity': quantity})
+
+    def test_adding_to_cart_reserves_stock(self):
+        self.assertEqual(self.add(self.client, 2).status_code, status.HTTP_201_CREATED)
+        reservation = StockReservation.objects.get()
+        self.assertEqual((reservation.book, reservation.quantity), (self.book, 2))
+        self.assertTrue(reservation.active)
+
+        response = self.add(self.other, 2)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(str(response.data['error']), 'Only 1 items available in stock')
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_adding_again_extends_the_reservation(self):
+        self.add(self.client, 1)
+        self.add(self.client, 2)
+        self.assertEqual(StockReservation.objects.get().quantity, 3)
+
+        response = self.add(self.client, 1)
+        self.assertEqual(str(response.data['error']), 'Cannot add more than 3 items')
+        self.assertEqual(CartItem.objects.get().quantity, 3)
+
+    def test_updating_quantity_updates_the_reservation(self):
+        self.add(self.client, 1)
+        item = CartItem.objects.get()
+        response = self.client.patch(f'/api/cart-items/{item.pk}/', {'quantity': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(StockReservation.objects.get().quantity, 3)
+        self.assertEqual(self.add(self.other, 1).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_removing_items_releases_the_reservation(self):
+        self.add(self.client, 3)
+        item = CartItem.objects.get()
+        self.client.delete(f'/api/cart-items/{item.pk}/')
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(self.add(self.other, 3).status_code, status.HTTP_201_CREATED)
+
+    def test_expired_reservations_do_not_hold_stock(self):
+        self.add(self.client, 3)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.add(self.other, 3).status_code, status.HTTP_201_CREATED)
+
+        # The first cart's checkout now has to compete for the stock again
+        response = self.client.post('/api/orders/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.other.post('/api/orders/').status_code, status.HTTP_201_CREATED)
+
+    def test_sweep_deletes_only_expired_reservations(self):
+        self.add(self.client, 1)
+        self.add(self.other, 1)
+        StockReservation.objects.filter(cart_item__cart__user=self.user).update(
+            expires_at=timezone.now() - timedelta(seconds=1))
+
+        out = StringIO()
+        call_command('sweep_reservations', stdout=out)
+        self.assertIn('Released 1 expired reservations', out.getvalue())
+        self.assertEqual(StockReservation.objects.get().cart_item.cart.user.username, 'second')
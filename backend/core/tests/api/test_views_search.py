@@ -0,0 +1,45 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+from core.models import Book
+
+class BookFullTextSearchTests(APITestCase):
+    def setUp(self):
+        self.python = Book.objects.create(title='Learning Python',
+                                          author='Mark Lutz',
+                                          description='A deep tour of the language',
+                                          isbn='1000000000001')
+        self.django = Book.objects.create(title='Two Scoops of Django',
+                                          author='Daniel Feldroy',
+                                          description='Best practices, with some Python along the way',
+                                          isbn='1000000000002')
+        self.other = Book.objects.create(title='Dune',
+                                         author='Frank Herbert',
+                                         description='Desert planet',
+                                         isbn='1000000000003')
+
+    def search(self, query, **params):
+        response = self.client.get('/api/books/', {'search': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book['id'] for book in response.data['results']]
+
+    def test_search_ranks_title_matches_first(self):
+        self.assertEqual(self.search('python'), [self.python.id, self.django.id])
+
+    def test_search_matches_prefixes_and_all_terms(self):
+        self.assertEqual(self.search('pyth'), [self.python.id, self.django.id])
+        self.assertEqual(self.search('python django'), [self.django.id])
+
+    def test_search_respects_explicit_ordering(self):
+        self.assertEqual(self.search('python', ordering='-title'), [self.django.id, self.python.id])
+
+    def test_search_ignores_match_syntax(self):
+        self.assertEqual(self.search('"dune* ('), [self.other.id])
+        self.assertEqual(self.search('*** ---'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.other.title = 'Python Dune'
+        self.other.save()
+        self.assertIn(self.other.id, self.search('python'))
+
+        self.python.delete()
+        self.assertNotIn(self.python.id, self.search('python'))
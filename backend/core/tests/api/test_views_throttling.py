@@ -0,0 +1,152 @@
+import base64
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.throttling import LocalBuckets, local_buckets, refill
+
+RATES = {
+    'login_ip': '5/min',
+    'login_username': '2/min',
+    'register_ip': '2/hour',
+    'anon': '3/min',
+    'user': '4/min',
+}
+
+
+def rates(**overrides):
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK,
+                                             'DEFAULT_THROTTLE_RATES': {**RATES, **overrides}})
+
+
+class TokenBucketTests(APITestCase):
+    def test_refill(self):
+        self.assertEqual(refill(3, 0, capacity=3, period=60), (2, 0.0))
+        # Empty bucket: one token every 20 seconds
+        self.assertEqual(refill(0, 0, capacity=3, period=60), (0, 20.0))
+        self.assertEqual(refill(0, 10, capacity=3, period=60), (0.5, 10.0))
+        self.assertEqual(refill(0, 600, capacity=3, period=60), (2, 0.0))
+        self.assertEqual(refill(3, 0, capacity=3, period=60, spend=False), (3, 0.0))
+        self.assertEqual(refill(0, 10, capacity=3, period=60, spend=False), (0.5, 10.0))
+
+    def test_bursts_then_steady_rate(self):
+        now = [0.0]
+        buckets = LocalBuckets(clock=lambda: now[0])
+        self.assertEqual([buckets.take('key', 3, 60) for _ in range(4)], [0, 0, 0, 20.0])
+        self.assertEqual(buckets.take('other', 3, 60), 0)
+        now[0] = 20.0
+        self.assertEqual(buckets.take('key', 3, 60), 0)
+        self.assertEqual(buckets.take('key', 3, 60), 20.0)
+
+    def test_least_recently_used_buckets_are_dropped(self):
+        buckets = LocalBuckets(max_keys=2, clock=lambda: 0.0)
+        buckets.take('a', 1, 60)
+        buckets.take('b', 1, 60)
+        buckets.take('c', 1, 60)
+        self.assertEqual(buckets.take('a', 1, 60), 0)
+        self.assertEqual(buckets.take('c', 1, 60), 60.0)
+
+
+@rates()
+class PasswordThrottleTests(APITestCase):
+    def setUp(self):
+        local_buckets.clear()
+        cache.clear()
+        # Drained buckets would throttle the tests that come next
+        self.addCleanup(local_buckets.clear)
+        # No refill while passwords are hashed, so Retry-After is exact
+        clock = mock.patch.object(local_buckets, 'clock', return_value=0.0)
+        clock.start()
+        self.addCleanup(clock.stop)
+        User.objects.create_user(username='shopper', password='password')
+
+    def login(self, username, password='wrong', **extra):
+        return self.client.post('/api/auth/login/', {'username': username, 'password': password},
+                                format='json', **extra)
+
+    def test_login_is_limited_per_username_before_hashing(self):
+        self.assertEqual([self.login('shopper').status_code for _ in range(2)], [400, 400])
+        with mock.patch('core.views.authenticate') as authenticate:
+            response = self.login('Shopper ', REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+        authenticate.assert_not_called()
+        self.assertEqual(self.login('someone-else').status_code, 400)
+
+    def test_login_is_limited_per_ip(self):
+        for i in range(5):
+            self.assertEqual(self.login(f'user{i}').status_code, 400)
+        self.assertEqual(self.login('shopper', 'password').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login('shopper', 'password', REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+    def test_register_is_limited_per_ip_before_hashing(self):
+        for i in range(2):
+            response = self.client.post('/api/auth/register/', {'username': f'new{i}', 'password': 'secret'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with mock.patch.object(User.objects, 'create_user') as create_user:
+            response = self.client.post('/api/auth/register/', {'username': 'new2', 'password': 'secret'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '1800')
+        create_user.assert_not_called()
+
+    def test_basic_credentials_share_the_login_buckets(self):
+        credentials = 'Basic ' + base64.b64encode(b'shopper:wrong').decode()
+        for _ in range(2):
+            self.client.get('/api/carts/', HTTP_AUTHORIZATION=credentials)
+        with mock.patch.object(User, 'check_password') as check_password:
+            response = self.client.get('/api/carts/', HTTP_AUTHORIZATION=credentials)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        check_password.assert_not_called()
+
+    def test_correct_basic_credentials_spend_no_login_tokens(self):
+        credentials = 'Basic ' + base64.b64encode(b'shopper:password').decode()
+        statuses = [self.client.get('/api/carts/', HTTP_AUTHORIZATION=credentials).status_code for _ in range(5)]
+        self.assertEqual(statuses, [200] * 4 + [429])
+        self.assertEqual(self.login('shopper').status_code, 400)
+
+    @rates(login_ip=None, login_username=None)
+    def test_rates_can_be_lifted(self):
+        self.assertTrue(all(self.login('shopper').status_code == 400 for _ in range(10)))
+
+
+@rates()
+class ApiThrottleTests(APITestCase):
+    def setUp(self):
+        local_buckets.clear()
+        cache.clear()
+        # Drained buckets would throttle the tests that come next
+        self.addCleanup(local_buckets.clear)
+
+    def test_anonymous_clients_per_ip(self):
+        statuses = [self.client.get('/api/books/').status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+        self.assertEqual(self.client.get('/api/books/', REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+    def test_users_per_user(self):
+        self.client.force_authenticate(User.objects.create_user(username='shopper'))
+        statuses = [self.client.get('/api/carts/').status_code for _ in range(5)]
+        self.assertEqual(statuses, [200] * 4 + [429])
+        self.client.force_authenticate(User.objects.create_user(username='other'))
+        self.assertEqual(self.client.get('/api/carts/').status_code, 200)
+
+    async def test_async_search_spends_the_same_buckets(self):
+        responses = [await self.async_client.get('/api/search/async/', {'q': 'rust'}) for _ in range(4)]
+        self.assertEqual([response.status_code for response in responses], [403, 403, 403, 429])
+        self.assertEqual(responses[-1]['Retry-After'], '20')
+        response = await self.async_client.get('/api/books/')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(RATE_LIMIT_STORE='cache')
+    def test_shared_store(self):
+        statuses = [self.client.get('/api/books/').status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+        local_buckets.clear()
+        self.assertEqual(self.client.get('/api/books/').status_code, 429)
+        cache.clear()
+        self.assertEqual(self.client.get('/api/books/').status_code, 200)
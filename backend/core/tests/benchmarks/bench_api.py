@@ -0,0 +1,90 @@
+"""
+pytest-benchmark microbenchmarks for the serializers and checkout.
+
+    pytest core/tests/benchmarks/bench_*.py --benchmark-autosave
+    pytest core/tests/benchmarks/bench_*.py --benchmark-compare --benchmark-compare-fail=mean:10%
+
+Saved runs go to .benchmarks/ and are compared against the latest one.
+"""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth.models import User
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.compiled_serializers import CompiledSerializer
+from core.models import Book, Cart, CartItem, Order, OrderItem
+from core.serializers import BookSerializer, CartSerializer, OrderSerializer
+from core.views import CartViewSet, OrderViewSet
+
+ROWS = 100
+
+
+def make_books(count):
+    return [
+        Book(id=i, title=f'Book {i}', author='Author', description='Description ' * 20,
+             price=Decimal(f'{i % 100}.99'), stock=i % 7, isbn=str(1000000000000 + i),
+             published_date=date(2000 + i % 20, 1 + i % 12, 1 + i % 28) if i % 3 else None)
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create(username='bench')
+
+
+@pytest.fixture
+def books(db):
+    return Book.objects.bulk_create(make_books(ROWS))
+
+
+def drf_request(user, method='get'):
+    request = Request(getattr(APIRequestFactory(), method)('/'))
+    request.user = user
+    return request
+
+
+def test_book_serializer(benchmark):
+    books = make_books(ROWS)
+    benchmark(lambda: BookSerializer(books, many=True).data)
+
+
+def test_compiled_book_serializer(benchmark):
+    reader = CompiledSerializer(BookSerializer)
+    values = [{source: getattr(book, source) for source in reader.sources} for book in make_books(ROWS)]
+    benchmark(reader.render, values)
+
+
+def test_cart_serializer(benchmark, user, books):
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.bulk_create(CartItem(cart=cart, book=book, quantity=2) for book in books[:20])
+    view = CartViewSet(request=drf_request(user), action='list', format_kwarg=None)
+    carts = list(view.get_queryset())
+    benchmark(lambda: CartSerializer(carts, many=True).data)
+
+
+def test_order_serializer(benchmark, user, books):
+    cart = Cart.objects.create(user=user)
+    for _ in range(20):
+        order = Order.objects.create(user=user, cart=cart, total_price=Decimal('30.00'))
+        OrderItem.objects.bulk_create(OrderItem(order=order, book=book, price=book.price) for book in books[:3])
+    orders = list(Order.objects.filter(user=user))
+    benchmark(lambda: OrderSerializer(orders, many=True).data)
+
+
+def test_order_perform_create(benchmark, user, books):
+    cart = Cart.objects.create(user=user)
+    Book.objects.update(stock=1_000_000)
+    view = OrderViewSet(request=drf_request(user, 'post'), action='create', format_kwarg=None)
+
+    def fill_cart():
+        CartItem.objects.bulk_create(CartItem(cart=cart, book=book, quantity=1) for book in books[:5])
+        serializer = OrderSerializer(data={})
+        serializer.is_valid(raise_exception=True)
+        return (serializer,), {}
+
+    benchmark.pedantic(view.perform_create, setup=fill_cart, rounds=50)
+    assert Order.objects.filter(user=user).exists() and not cart.cart_items.exists()
@@ -0,0 +1,104 @@
+"""
+Checkout throughput on a single hot title, with its stock in Book.stock
+and split across shards (manage.py shard_stock).
+
+    pytest core/tests/benchmarks/bench_inventory.py --benchmark-group-by=func
+
+Each round, THREADS buyers try ORDERS_PER_THREAD single-copy checkouts of
+the same book at once; `extra_info` holds the checkouts per second and how
+many were refused. A refused checkout is not sent again, as it may have
+committed before failing; the test checks instead that every unit taken
+from stock is in an order.
+
+On SQLite this is only a smoke test of sharded checkouts under concurrency:
+SQLite lets one writer in at a time whatever the rows, so both modes run at
+the same speed. The comparison needs DATABASES['default'] pointed at
+PostgreSQL, where the row lock on Book.stock is what sharding removes.
+"""
+import random
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from rest_framework.test import APIClient
+
+from core.inventory import shard_stock, stock_levels
+from core.models import Book, Cart, CartItem, Order, OrderItem
+
+STOCK = 10_000_000
+THREADS = 8
+ORDERS_PER_THREAD = 10
+SHARDS = 8
+ATTEMPTS = 200
+
+
+def retried(operation):
+    """Run `operation`, a single statement, until SQLite lets it write"""
+    for attempt in range(ATTEMPTS):
+        try:
+            return operation()
+        except OperationalError:
+            # SQLite refuses concurrent writers instead of waiting
+            if attempt == ATTEMPTS - 1:
+                raise
+            time.sleep(random.uniform(0.001, 0.005))
+
+
+def checkout_burst(book, buyers, rounds):
+    rounds.append(len(rounds))
+    start = threading.Barrier(len(buyers))
+    errors = []
+
+    def buy(user, cart):
+        client = APIClient()
+        client.force_authenticate(user)
+        start.wait()
+        try:
+            for _ in range(ORDERS_PER_THREAD):
+                # A refused checkout leaves its line in the cart
+                if not retried(cart.cart_items.exists):
+                    retried(lambda: CartItem.objects.create(cart=cart, book=book, quantity=1))
+                try:
+                    client.post('/api/orders/')
+                except OperationalError:
+                    pass
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=buy, args=buyer) for buyer in buyers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('shards', [0, SHARDS], ids=['single', 'sharded'])
+def test_hot_title_checkout(benchmark, shards):
+    book = Book.objects.create(title='Bestseller', author='Author', price=Decimal('9.99'),
+                               stock=STOCK, isbn='9999999999999')
+    if shards:
+        shard_stock(book.id, shards)
+    buyers = []
+    for i in range(THREADS):
+        user = User.objects.create(username=f'buyer{i}')
+        buyers.append((user, Cart.objects.create(user=user)))
+
+    rounds = []
+    benchmark.pedantic(checkout_burst, args=(book, buyers, rounds), rounds=5)
+    orders = Order.objects.count()
+    book.refresh_from_db()
+    assert orders
+    assert OrderItem.objects.aggregate(sold=Sum('quantity'))['sold'] == orders
+    assert stock_levels([book])[book.id] == STOCK - orders
+    if benchmark.stats:
+        benchmark.extra_info['checkouts_per_second'] = round(orders / len(rounds) / benchmark.stats.stats.mean, 1)
+        benchmark.extra_info['refused_checkouts'] = len(rounds) * THREADS * ORDERS_PER_THREAD - orders
@@ -0,0 +1,57 @@
+"""
+Bytes on the wire and render time of book list pages, stdlib JSONRenderer
+against FastJSONRenderer, uncompressed and through CompressionMiddleware's
+gzip and brotli settings.
+
+    pytest core/tests/benchmarks/bench_renderers.py --benchmark-group-by=param:rows
+
+No database is needed; pages are built in memory.
+"""
+import brotli
+import pytest
+from django.conf import settings
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+
+from core.compiled_serializers import CompiledSerializer
+from core.renderers import FastJSONRenderer
+from core.serializers import BookSerializer
+from core.tests.benchmarks.bench_api import make_books
+
+PAGE_SIZES = [20, 1000]
+RENDERERS = {'JSONRenderer': JSONRenderer(), 'FastJSONRenderer': FastJSONRenderer()}
+
+
+def make_page(rows):
+    """A paginated book list as BookViewSet returns it"""
+    reader = CompiledSerializer(BookSerializer)
+    values = [{source: getattr(book, source) for source in reader.sources} for book in make_books(rows)]
+    return {'count': rows * 10, 'next': 'http://testserver/api/books/?page=2', 'previous': None,
+            'results': reader.render(values)}
+
+
+def wire_sizes(body):
+    return {
+        'identity': len(body),
+        'gzip': len(compress_string(body)),
+        'br': len(brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)),
+    }
+
+
+@pytest.mark.parametrize('rows', PAGE_SIZES)
+@pytest.mark.parametrize('renderer', RENDERERS)
+def test_render(benchmark, renderer, rows):
+    page = make_page(rows)
+    body = benchmark(RENDERERS[renderer].render, page)
+    benchmark.extra_info.update(wire_sizes(body))
+
+
+@pytest.mark.parametrize('rows', PAGE_SIZES)
+@pytest.mark.parametrize('coding', ['gzip', 'br'])
+def test_compress(benchmark, coding, rows):
+    body = FastJSONRenderer().render(make_page(rows))
+    if coding == 'br':
+        benchmark(brotli.compress, body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    else:
+        benchmark(compress_string, body)
+
@@ -0,0 +1,47 @@
+"""
+Queries and time per authenticated request for each session store, with
+and without the cached user lookup of core.auth.
+
+    pytest core/tests/benchmarks/bench_sessions.py --benchmark-group-by=param:path
+
+`extra_info` holds the queries each request ran in all, and those that read
+django_session and auth_user. The db store with AUTH_USER_CACHE_TTL=0 is
+the old behaviour; the difference with the other rows is what they save
+per request. The cache is local memory here, as on a single worker.
+"""
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cached_db',
+    'cookie': 'django.contrib.sessions.backends.signed_cookies',
+}
+PATHS = ['/api/auth/current-user/', '/api/books/']
+ROUNDS = 200
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('path', PATHS)
+@pytest.mark.parametrize('user_cache_ttl', [0, 60], ids=['user-uncached', 'user-cached'])
+@pytest.mark.parametrize('mode', ENGINES)
+def test_authenticated_request(benchmark, settings, mode, user_cache_ttl, path):
+    settings.SESSION_ENGINE = ENGINES[mode]
+    settings.AUTH_USER_CACHE_TTL = user_cache_ttl
+    cache.clear()
+    client = APIClient()
+    client.force_login(User.objects.create(username='bench'))
+    assert client.get(path).status_code == 200
+
+    with CaptureQueriesContext(connection) as queries:
+        benchmark.pedantic(client.get, args=(path,), rounds=ROUNDS)
+    per_request = {
+        'queries': len(queries),
+        'session_queries': sum('"django_session"' in query['sql'] for query in queries.captured_queries),
+        'user_queries': sum('FROM "auth_user"' in query['sql'] for query in queries.captured_queries),
+    }
+    benchmark.extra_info.update({name: round(count / ROUNDS, 2) for name, count in per_request.items()})
@@ -0,0 +1,128 @@
+"""
+Save Locust results per commit and compare two runs to flag regressions.
+
+    python -m core.tests.benchmarks.results save results/run_stats.csv [-o benchmarks/<sha>.json]
+    python -m core.tests.benchmarks.results compare benchmarks/<base>.json benchmarks/<head>.json [--tolerance 0.1]
+
+`save` keeps throughput, failures and p50/p95/p99 latency per endpoint from
+the stats CSV written by `locust --csv`. `compare` prints both runs side by
+side and exits with status 1 if any endpoint got slower or less reliable by
+more than the tolerance, so it can gate a release.
+"""
+import argparse
+import csv
+import json
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# (metric, True if higher is better)
+METRICS = [('rps', True), ('p50', False), ('p95', False), ('p99', False), ('failure_rate', False)]
+# Latencies below this many ms are noise and never count as a regression
+MIN_LATENCY_MS = 5
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def read_locust_stats(path):
+    """Per-endpoint numbers from a Locust `*_stats.csv`, including the Aggregated row"""
+    endpoints = {}
+    with open(path, newline='') as handle:
+        for row in csv.DictReader(handle):
+            name = row['Name'] if row['Name'] == 'Aggregated' else f'{row["Type"]} {row["Name"]}'
+            requests = number(row['Request Count'])
+            endpoints[name] = {
+                'requests': int(requests),
+                'rps': round(number(row['Requests/s']), 2),
+                'p50': number(row['50%']),
+                'p95': number(row['95%']),
+                'p99': number(row['99%']),
+                'failure_rate': round(number(row['Failure Count']) / requests, 4) if requests else 0.0,
+            }
+    return endpoints
+
+
+def save(stats_path, output=None):
+    commit = git_commit()
+    output = Path(output or f'benchmarks/{commit}.json')
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        'commit': commit,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'endpoints': read_locust_stats(stats_path),
+    }, indent=2, sort_keys=True) + '\n')
+    return output
+
+
+def regressions(base, head, tolerance):
+    """(endpoint, metric, base value, head value) for every metric worse than `tolerance` allows"""
+    found = []
+    for name, new in head['endpoints'].items():
+        old = base['endpoints'].get(name)
+        if old is None:
+            continue
+        for metric, higher_is_better in METRICS:
+            before, after = old[metric], new[metric]
+            if metric == 'failure_rate':
+                worse = after > before + tolerance / 10
+            elif higher_is_better:
+                worse = after < before * (1 - tolerance)
+            else:
+                worse = after > max(before * (1 + tolerance), MIN_LATENCY_MS)
+            if worse:
+                found.append((name, metric, before, after))
+    return found
+
+
+def compare(base_path, head_path, tolerance=0.1, out=sys.stdout):
+    base = json.loads(Path(base_path).read_text())
+    head = json.loads(Path(head_path).read_text())
+
+    out.write(f'{base["commit"]} -> {head["commit"]}\n')
+    out.write(f'{"endpoint":<45}' + ''.join(f'{metric:>22}' for metric, _ in METRICS) + '\n')
+    for name in sorted(head['endpoints']):
+        new, old = head['endpoints'][name], base['endpoints'].get(name)
+        cells = [f'{old[metric] if old else "-":>10} -> {new[metric]:<8}' for metric, _ in METRICS]
+        out.write(f'{name:<45}' + ''.join(cells) + '\n')
+
+    found = regressions(base, head, tolerance)
+    for name, metric, before, after in found:
+        out.write(f'REGRESSION {name}: {metric} {before} -> {after}\n')
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    save_parser = commands.add_parser('save', help='Store a Locust stats CSV as a results file')
+    save_parser.add_argument('stats', help='The *_stats.csv file written by locust --csv')
+    save_parser.add_argument('-o', '--output', help='Results file (default: benchmarks/<commit>.json)')
+    compare_parser = commands.add_parser('compare', help='Compare two results files')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('head')
+    compare_parser.add_argument('--tolerance', type=float, default=0.1,
+                                help='Allowed relative slowdown before flagging a regression (default: 0.1)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'save':
+        print(f'Saved {save(args.stats, args.output)}')
+        return 0
+    return 1 if compare(args.base, args.head, args.tolerance) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
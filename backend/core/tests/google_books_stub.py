@@ -0,0 +1,120 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_volume(index, query='stub'):
+    return {
+        'volumeInfo': {
+            'title': f'{query.title()} Volume {index}',
+            'authors': ['Stub Author'],
+            'description': f'Stub description {index} for {query}',
+            'publishedDate': '2020-01-01',
+            'industryIdentifiers': [{'identifier': f'{9780000000000 + index}'}],
+        },
+    }
+
+
+class GoogleBooksStub:
+    """
+    Local stand-in for the Google Books volumes API.
+
+    Serves `volumes_per_query` generated volumes for any `q`, optionally after
+    `delay` seconds, and records every query it receives in `queries` and
+    the most requests it was serving at once in `max_in_flight`.
+    Binds a free port unless `port` is given.
+    """
+
+    def __init__(self, volumes_per_query=3, delay=0, status_code=200, port=0):
+        self.volumes_per_query = volumes_per_query
+        self.delay = delay
+        self.status_code = status_code
+        self.queries = []
+        self.in_flight = self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f'http://{host}:{port}/books/v1/volumes'
+
+    @property
+    def hits(self):
+        return len(self.queries)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+                with stub._lock:
+                    stub.queries.append(query)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                if stub.delay:
+                    time.sleep(stub.delay)
+                with stub._lock:
+                    stub.in_flight -= 1
+                body = json.dumps({
+                    'items': [make_volume(i, query) for i in range(stub.volumes_per_query)],
+                }).encode()
+                self.send_response(stub.status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up, e.g. on a timeout
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    """
+    Serve the stub in the foreground for load tests:
+
+        python -m core.tests.google_books_stub --port 8081 --delay 0.15
+        GOOGLE_BOOKS_API_URL=http://127.0.0.1:8081/books/v1/volumes python manage.py runserver
+    """
+    parser = argparse.ArgumentParser(description='Local Google Books volumes API stub')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--volumes', type=int, default=10, help='Volumes returned per query')
+    parser.add_argument('--delay', type=float, default=0.15,
+                        help='Seconds to wait before answering, to mimic the real API latency')
+    args = parser.parse_args()
+
+    stub = GoogleBooksStub(volumes_per_query=args.volumes, delay=args.delay, port=args.port)
+    print(f'Serving {stub.url}')
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
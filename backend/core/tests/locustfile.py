@@ -1,25 +1,124 @@
-from locust import HttpUser, task, between
+"""
+Load test scenarios for the Bookify API.
+
+Start the Google Books stub and a server pointed at it, then run Locust
+headless and save the results for comparison:
+
+    python -m core.tests.google_books_stub --port 8081 &
+    RATE_LIMITS_ENABLED=0 GOOGLE_BOOKS_API_URL=http://127.0.0.1:8081/books/v1/volumes \
+        python manage.py runserver --noreload &
+    locust -f core/tests/locustfile.py --headless -u 50 -r 10 -t 2m --csv results/run
+    python -m core.tests.benchmarks.results save results/run_stats.csv
+    python -m core.tests.benchmarks.results compare benchmarks/<base>.json benchmarks/<head>.json
+
+The catalog needs books in stock, e.g. from `manage.py import_books`. All
+simulated users share one address, hence the rate limits are lifted.
+"""
 import random
+import uuid
+
+from locust import HttpUser, between, task
 
-class BookifyUser(HttpUser):
+SEARCH_TERMS = ['python', 'django', 'history', 'science', 'fiction', 'poetry', 'design', 'cooking']
+
+
+class Visitor(HttpUser):
+    """Anonymous visitor paging through and searching the catalog"""
     host = "http://127.0.0.1:8000"
-    wait_time = between(1, 5)  # time between requests (seconds)
+    wait_time = between(1, 3)
+    weight = 3
+
+    def on_start(self):
+        self.book_ids = []
+
+    def remember_books(self, response):
+        if response.ok:
+            self.book_ids = [book['id'] for book in response.json()['results']] or self.book_ids
+
+    @task(4)
+    def browse(self):
+        response = self.client.get("/api/books/", name="/api/books/")
+        self.remember_books(response)
+        # Follow the keyset cursor for a couple of pages, like infinite scroll
+        for _ in range(random.randint(0, 2)):
+            next_url = response.ok and response.json().get('next')
+            if not next_url:
+                break
+            response = self.client.get(next_url, name="/api/books/?cursor=[cursor]")
+
+    @task(2)
+    def book_detail(self):
+        if self.book_ids:
+            self.client.get(f"/api/books/{random.choice(self.book_ids)}/", name="/api/books/[id]/")
 
     @task(2)
-    def get_books(self):
-        self.client.get("/api/books/")
+    def search_catalog(self):
+        term = random.choice(SEARCH_TERMS)
+        self.remember_books(self.client.get("/api/books/", params={'search': term}, name="/api/books/?search=[term]"))
+
+    @task(1)
+    def sort_by_price(self):
+        self.client.get("/api/books/", params={'ordering': 'price'}, name="/api/books/?ordering=price")
+
+
+class Shopper(HttpUser):
+    """Registered customer who searches, fills a cart, checks out and sometimes cancels"""
+    host = "http://127.0.0.1:8000"
+    wait_time = between(1, 5)
+    weight = 1
+
+    def on_start(self):
+        self.book_ids = []
+        username = f'locust-{uuid.uuid4().hex[:12]}'
+        self.client.post("/api/auth/register/", json={
+            'username': username, 'password': 'locust-password', 'email': f'{username}@example.com',
+        })
+        self.load_books()
+
+    @property
+    def headers(self):
+        # SessionAuthentication enforces CSRF on unsafe methods
+        return {'X-CSRFToken': self.client.cookies.get('csrftoken', '')}
+
+    def load_books(self):
+        response = self.client.get("/api/books/", params={'page_size': 100}, name="/api/books/")
+        if response.ok:
+            self.book_ids = [book['id'] for book in response.json()['results'] if book['stock'] > 0]
+
+    @task(3)
+    def browse(self):
+        self.load_books()
+
+    @task(1)
+    def search_google_books(self):
+        self.client.get("/api/search/", params={'q': random.choice(SEARCH_TERMS)}, name="/api/search/?q=[term]")
+
+    @task(3)
+    def add_to_cart(self):
+        if not self.book_ids:
+            return
+        with self.client.post("/api/cart-items/", headers=self.headers, catch_response=True, json={
+            'book_id': random.choice(self.book_ids), 'quantity': random.randint(1, 2),
+        }) as response:
+            # Running out of stock under load is expected, not a failure
+            if response.status_code == 400:
+                response.success()
+
+    @task(1)
+    def view_cart(self):
+        self.client.get("/api/carts/")
+
+    @task(1)
+    def checkout(self):
+        with self.client.post("/api/orders/", headers=self.headers, catch_response=True) as response:
+            # An empty cart or a sold out book is a normal outcome under load
+            if response.status_code == 400:
+                response.success()
+        if response.status_code == 201 and random.random() < 0.3:
+            order_id = response.json()['id']
+            self.client.post(f"/api/orders/{order_id}/cancel_order/", headers=self.headers,
+                             name="/api/orders/[id]/cancel_order/")
 
     @task(1)
-    def create_book(self):
-        book_data = {
-            "title": f"Test Book {random.randint(1,10000)}",
-            "author": "Locust User",
-            "description": "Performance test book",
-            "price": round(random.uniform(10, 50), 2),
-            "isbn": str(random.randint(1000000000000, 9999999999999))
-        }
-        self.client.post("/api/books/", json=book_data)
-
-    # @task(2)
-    # def search_books(self):
-    #     self.client.get("/api/search/?q=python")
+    def order_history(self):
+        self.client.get("/api/orders/")
@@ -0,0 +1,33 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def query_budget(path, budget, method='get', data=None, sizes=(1, 10, 100)):
+    """
+    Declare a test asserting that `method path` never runs more than `budget`
+    SQL queries, whatever the size of the dataset.
+
+    The test case must define populate(size), which grows its fixture data to
+    `size` items. The request is repeated after each step in `sizes`, so an
+    N+1 shows up as the dataset grows even if it fits the budget at size 1.
+    `path` may use {self.attr} placeholders, formatted against the test case.
+
+        class OrderBudgets(APITestCase):
+            def populate(self, size): ...
+            test_list = query_budget('/api/orders/', 6)
+    """
+
+    def test(self):
+        for size in sizes:
+            self.populate(size)
+            url = path.format(self=self)
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(self.client, method)(url, data)
+            self.assertLess(response.status_code, 400, f'{method.upper()} {url} failed: {response.status_code}')
+            if len(queries) > budget:
+                executed = '\n'.join(f'{i}. {query["sql"]}' for i, query in enumerate(queries.captured_queries, 1))
+                self.fail(f'{method.upper()} {url} ran {len(queries)} queries with {size} items, '
+                          f'over its budget of {budget}:\n{executed}')
+
+    test.__doc__ = f'{method.upper()} {path} stays within {budget} queries for {", ".join(map(str, sizes))} items'
+    return test
@@ -0,0 +1,92 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from core.auth import user_cache_key
+
+
+def table_queries(queries, table):
+    return [query['sql'] for query in queries.captured_queries if f'FROM "{table}"' in query['sql']]
+
+
+class CachedUserTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='shopper', password='password')
+        self.client.force_login(self.user)
+
+    def current_user(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/auth/current-user/')
+        return response, queries
+
+    def test_user_is_read_once(self):
+        response, queries = self.current_user()
+        self.assertEqual(len(table_queries(queries, 'auth_user')), 1)
+        response, queries = self.current_user()
+        self.assertEqual(response.data['user']['username'], 'shopper')
+        self.assertEqual(table_queries(queries, 'auth_user'), [])
+
+    def test_update_is_seen_at_once(self):
+        self.current_user()
+        self.user.email = 'new@example.com'
+        self.user.save()
+        response, _ = self.current_user()
+        self.assertEqual(response.data['user']['email'], 'new@example.com')
+
+    def test_password_change_ends_other_sessions(self):
+        self.current_user()
+        self.user.set_password('changed')
+        self.user.save()
+        response, _ = self.current_user()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_deactivated_and_deleted_users_are_logged_out(self):
+        self.current_user()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.current_user()[0].status_code, status.HTTP_403_FORBIDDEN)
+        self.user.delete()
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+    def test_logout_drops_the_entry(self):
+        self.current_user()
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        self.client.post('/api/auth/logout/')
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+    @override_settings(AUTH_USER_CACHE_TTL=0)
+    def test_disabled_by_setting(self):
+        self.current_user()
+        _, queries = self.current_user()
+        self.assertEqual(len(table_queries(queries, 'auth_user')), 1)
+
+
+class SessionModeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='shopper', password='password')
+
+    def session_queries(self, engine):
+        with self.settings(SESSION_ENGINE=engine):
+            # A new client loads SessionMiddleware with this engine
+            client = APIClient()
+            client.force_login(self.user)
+            client.get('/api/auth/current-user/')
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get('/api/auth/current-user/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return table_queries(queries, 'django_session')
+
+    def test_db_sessions_are_read_every_request(self):
+        self.assertEqual(len(self.session_queries('django.contrib.sessions.backends.db')), 1)
+
+    def test_cached_sessions(self):
+        self.assertEqual(self.session_queries('django.contrib.sessions.backends.cached_db'), [])
+
+    def test_signed_cookie_sessions(self):
+        self.assertEqual(self.session_queries('django.contrib.sessions.backends.signed_cookies'), [])
@@ -0,0 +1,56 @@
+import csv
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.test import SimpleTestCase
+
+from core.tests.benchmarks.results import compare, read_locust_stats
+
+COLUMNS = ['Type', 'Name', 'Request Count', 'Failure Count', 'Requests/s', '50%', '95%', '99%']
+
+
+class BenchmarkResultsTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def write_results(self, name, commit, **endpoints):
+        with open(self.path(name), 'w') as handle:
+            json.dump({'commit': commit, 'endpoints': endpoints}, handle)
+        return self.path(name)
+
+    def test_read_locust_stats(self):
+        with open(self.path('run_stats.csv'), 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(COLUMNS)
+            writer.writerow(['GET', '/api/books/', '200', '2', '12.5', '11', '40', '75'])
+            writer.writerow(['', 'Aggregated', '200', '2', '12.5', '11', '40', '75'])
+
+        stats = read_locust_stats(self.path('run_stats.csv'))
+        self.assertEqual(stats['GET /api/books/'], {
+            'requests': 200, 'rps': 12.5, 'p50': 11.0, 'p95': 40.0, 'p99': 75.0, 'failure_rate': 0.01,
+        })
+        self.assertIn('Aggregated', stats)
+
+    def test_compare_flags_regressions(self):
+        numbers = {'requests': 100, 'rps': 50.0, 'p50': 10.0, 'p95': 40.0, 'p99': 80.0, 'failure_rate': 0.0}
+        base = self.write_results('base.json', 'aaa', books=numbers, orders=numbers)
+        head = self.write_results('head.json', 'bbb', books={**numbers, 'p95': 42.0},
+                                  orders={**numbers, 'p99': 120.0, 'rps': 30.0})
+
+        out = StringIO()
+        found = compare(base, head, tolerance=0.1, out=out)
+        self.assertEqual(sorted((name, metric) for name, metric, _, _ in found),
+                         [('orders', 'p99'), ('orders', 'rps')])
+        self.assertIn('REGRESSION orders: p99 80.0 -> 120.0', out.getvalue())
+
+    def test_small_latencies_are_noise(self):
+        numbers = {'requests': 100, 'rps': 50.0, 'p50': 2.0, 'p95': 3.0, 'p99': 4.0, 'failure_rate': 0.0}
+        base = self.write_results('base.json', 'aaa', books=numbers)
+        head = self.write_results('head.json', 'bbb', books={**numbers, 'p95': 4.0})
+        self.assertEqual(compare(base, head, out=StringIO()), [])
@@ -0,0 +1,44 @@
+from datetime import date
+from decimal import Decimal
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.compiled_serializers import CompiledSerializer
+from core.models import Book
+from core.serializers import BookSerializer, CartSerializer
+
+
+class CompiledSerializerTests(TestCase):
+    def setUp(self):
+        Book.objects.create(title='Priced', author='A', description='Unicode — ✓', price=Decimal('12.5'),
+                            stock=3, isbn='1000000000001', published_date=date(1999, 12, 31))
+        Book.objects.create(title='Free', author='B', price=0, isbn='1000000000002')
+        Book.objects.create(title='Expensive', author='C', price=Decimal('99999999.99'),
+                            stock=-1, isbn='1000000000003', published_date=date(2024, 2, 29))
+        self.reader = CompiledSerializer(BookSerializer)
+
+    def test_output_is_byte_identical_to_book_serializer(self):
+        books = Book.objects.order_by('id')
+        expected = JSONRenderer().render(BookSerializer(books, many=True).data)
+        actual = JSONRenderer().render(self.reader.render(self.reader.values(books)))
+        self.assertEqual(actual, expected)
+
+    def test_list_and_retrieve_responses_match_book_serializer(self):
+        client = APIClient()
+        books = list(Book.objects.order_by('id'))
+
+        response = client.get('/api/books/')
+        self.assertEqual(JSONRenderer().render(response.data['results']),
+                         JSONRenderer().render(BookSerializer(books, many=True).data))
+
+        response = client.get(f'/api/books/{books[0].pk}/')
+        self.assertEqual(JSONRenderer().render(response.data),
+                         JSONRenderer().render(BookSerializer(books[0]).data))
+        self.assertEqual(client.get('/api/books/999999/').status_code, 404)
+
+    def test_nested_serializers_are_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            CompiledSerializer(CartSerializer).compile()
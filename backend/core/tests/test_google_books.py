@@ -0,0 +1,216 @@
+import asyncio
+import threading
+import time
+
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from core import google_books
+from core.google_books import QueryCache, normalize_query
+from core.models import Book, SearchHistory
+from core.tests.google_books_stub import GoogleBooksStub
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class QueryCacheTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = QueryCache(max_entries=2, ttl=10, stale_ttl=20, clock=self.clock)
+        self.calls = 0
+
+    def loader(self, value='v'):
+        def load():
+            self.calls += 1
+            return value
+        return load
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query('  Django   REST '), 'django rest')
+
+    def test_fresh_entries_are_served_from_cache(self):
+        self.assertEqual(self.cache.get('a', self.loader()), 'v')
+        self.assertEqual(self.cache.get('a', self.loader()), 'v')
+        self.assertEqual(self.calls, 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.get('a', self.loader())
+        self.cache.get('b', self.loader())
+        self.cache.get('a', self.loader())
+        self.cache.get('c', self.loader())
+        self.assertEqual(len(self.cache), 2)
+        self.cache.get('a', self.loader())
+        self.assertEqual(self.calls, 3)
+        self.cache.get('b', self.loader())
+        self.assertEqual(self.calls, 4)
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        self.cache.get('a', self.loader('old'))
+        self.clock.now = 15
+        refreshed = threading.Event()
+
+        def refresh():
+            refreshed.set()
+            return 'new'
+
+        self.assertEqual(self.cache.get('a', refresh), 'old')
+        self.assertTrue(refreshed.wait(5))
+        for _ in range(100):
+            if self.cache.get('a', self.loader()) == 'new':
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.cache.get('a', self.loader()), 'new')
+
+    def test_expired_entry_is_reloaded(self):
+        self.cache.get('a', self.loader('old'))
+        self.clock.now = 31
+        self.assertEqual(self.cache.get('a', self.loader('new')), 'new')
+
+    def test_uncacheable_values_are_not_stored(self):
+        cache = QueryCache(cacheable=lambda value: value != 'error')
+        cache.get('a', self.loader('error'))
+        cache.get('a', self.loader('error'))
+        self.assertEqual(self.calls, 2)
+
+    def test_loader_errors_propagate(self):
+        def fail():
+            raise ValueError('boom')
+        with self.assertRaises(ValueError):
+            self.cache.get('a', fail)
+        self.assertEqual(len(self.cache), 0)
+
+    async def test_cancelled_load_does_not_block_later_lookups(self):
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.Event().wait()
+
+        async def load():
+            return 'v'
+
+        leader = asyncio.ensure_future(self.cache.aget('a', hang))
+        await started.wait()
+        leader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        self.assertEqual(await asyncio.wait_for(self.cache.aget('a', load), 5), 'v')
+
+
+class GoogleBooksProxyTests(TestCase):
+    def setUp(self):
+        self.stub = GoogleBooksStub(delay=0.2).start()
+        self.addCleanup(self.stub.stop)
+        settings_override = override_settings(GOOGLE_BOOKS_API_URL=self.stub.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        google_books.volume_cache.clear()
+        self.addCleanup(google_books.volume_cache.clear)
+
+        self.user = User.objects.create_user(username='reader', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_searches_hit_upstream_once(self):
+        first = self.client.get('/api/search/', {'q': 'Django'})
+        second = self.client.get('/api/search/', {'q': ' django '})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(self.stub.queries, ['django'])
+
+    def test_concurrent_identical_queries_share_one_fetch(self):
+        results = []
+
+        def search():
+            results.append(google_books.fetch_volumes('python'))
+
+        threads = [threading.Thread(target=search) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.stub.hits, 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_upstream_errors_are_not_cached(self):
+        self.stub.status_code = 503
+        self.assertEqual(self.client.get('/api/search/', {'q': 'go'}).status_code, 503)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'go'}).status_code, 503)
+        self.assertEqual(self.stub.hits, 2)
+
+    def test_search_results_are_ingested_once(self):
+        first = self.client.get('/api/search/', {'q': 'rust'})
+        second = self.client.get('/api/search/', {'q': 'rust'})
+        self.assertEqual((first['X-Books-Inserted'], first['X-Books-Skipped']), ('3', '0'))
+        self.assertEqual((second['X-Books-Inserted'], second['X-Books-Skipped']), ('0', '3'))
+        self.assertEqual(Book.objects.count(), 3)
+
+
+class AsyncSearchTests(TestCase):
+    def setUp(self):
+        self.stub = GoogleBooksStub(delay=0.2).start()
+        self.addCleanup(self.stub.stop)
+        settings_override = override_settings(GOOGLE_BOOKS_API_URL=self.stub.url, GOOGLE_BOOKS_MAX_CONCURRENCY=4)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        google_books.volume_cache.clear()
+        self.addCleanup(google_books.volume_cache.clear)
+        self.user = User.objects.create_user(username='reader', password='password')
+
+    async def search(self, query):
+        return await self.async_client.get('/api/search/async/', {'q': query})
+
+    @override_settings(QUERY_METRICS=True)
+    async def test_search_ingests_results(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.search('rust')
+        await google_books.aclose_client()
+
+        self.assertEqual(response.status_code, 200)
+        # session, user; history insert and two rollup upserts in a savepoint; book lookup, insert
+        # between two counts
+        self.assertEqual(response['X-Query-Count'], '11')
+        self.assertEqual(len(response.json()), 3)
+        self.assertEqual(response['X-Books-Inserted'], '3')
+        self.assertEqual(await Book.objects.acount(), 3)
+        self.assertTrue(await SearchHistory.objects.filter(user=self.user, query='rust').aexists())
+
+    async def test_requires_login(self):
+        self.assertEqual((await self.search('rust')).status_code, 403)
+        self.assertEqual(self.stub.hits, 0)
+
+    async def test_upstream_concurrency_is_capped(self):
+        await self.async_client.aforce_login(self.user)
+        started = time.monotonic()
+        responses = await asyncio.gather(*(self.search(f'topic {i}') for i in range(12)))
+        elapsed = time.monotonic() - started
+        await google_books.aclose_client()
+
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        self.assertEqual(self.stub.hits, 12)
+        self.assertEqual(self.stub.max_in_flight, 4)
+        # 12 searches of 0.2s, 4 at a time
+        self.assertLess(elapsed, 12 * 0.2)
+
+    async def test_identical_queries_share_one_fetch(self):
+        results = await asyncio.gather(*(google_books.afetch_volumes('Python ') for _ in range(8)))
+        await google_books.aclose_client()
+        self.assertEqual(self.stub.hits, 1)
+        self.assertTrue(all(result == results[0] for result in results))
+
+    @override_settings(GOOGLE_BOOKS_TIMEOUT=0.05)
+    async def test_timeout(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.search('slow')
+        await google_books.aclose_client()
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(await SearchHistory.objects.acount(), 1)
@@ -0,0 +1,179 @@
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core import google_books
+from core.history import HistoryBuffer, history_buffer, save_history
+from core.models import SearchHistory, SearchQueryDaily, UserSearchDaily
+from core.tests.google_books_stub import GoogleBooksStub
+
+
+class HistoryBufferTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='searcher')
+
+    def make_buffer(self, **options):
+        buffer = HistoryBuffer(**{'max_size': 100, 'flush_size': 10, 'flush_interval': 60, **options})
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def wait_for_rows(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while SearchHistory.objects.count() < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return SearchHistory.objects.count()
+
+    def test_entries_are_queued(self):
+        buffer = self.make_buffer()
+        for i in range(5):
+            buffer.record(self.user, f'query {i}')
+        self.assertEqual(len(buffer), 5)
+        self.assertEqual(SearchHistory.objects.count(), 0)
+
+        self.assertEqual(buffer.flush(), 5)
+        self.assertEqual(list(SearchHistory.objects.order_by('id').values_list('query', flat=True)),
+                         [f'query {i}' for i in range(5)])
+
+    def test_flush_when_batch_is_full(self):
+        buffer = self.make_buffer(flush_size=3)
+        for i in range(3):
+            buffer.record(self.user, f'query {i}')
+        self.assertEqual(self.wait_for_rows(3), 3)
+
+    def test_flush_on_interval(self):
+        buffer = self.make_buffer(flush_interval=0.05)
+        buffer.record(self.user, 'slow day')
+        self.assertEqual(self.wait_for_rows(1), 1)
+
+    def test_full_buffer_writes_synchronously(self):
+        buffer = self.make_buffer(max_size=2)
+        for i in range(3):
+            buffer.record(self.user, f'query {i}')
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(list(SearchHistory.objects.values_list('query', flat=True)), ['query 2'])
+
+    def test_close_flushes_and_stops_buffering(self):
+        buffer = self.make_buffer()
+        buffer.record(self.user, 'before')
+        buffer.close()
+        self.assertEqual(SearchHistory.objects.count(), 1)
+
+        buffer.record(self.user, 'after')
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(SearchHistory.objects.count(), 2)
+
+    def test_search_date_is_the_time_of_the_search(self):
+        buffer = self.make_buffer()
+        buffer.record(self.user, 'early')
+        time.sleep(0.05)
+        before_flush = time.time()
+        buffer.flush()
+        self.assertLess(SearchHistory.objects.get().search_date.timestamp(), before_flush)
+
+    def test_failed_flush_is_requeued(self):
+        buffer = self.make_buffer(max_size=3)
+        for i in range(2):
+            buffer.record(self.user, f'query {i}')
+
+        def locked(entries, batch_size=None):
+            # Searches keep coming while the batch is being written
+            for i in range(2, 4):
+                buffer.record(self.user, f'query {i}')
+            raise OperationalError('database is locked')
+
+        with mock.patch('core.history.save_history', side_effect=locked), self.assertLogs('core.history'):
+            self.assertEqual(buffer.flush(), 0)
+        # The batch first, then what fits of the entries queued since
+        self.assertEqual([entry.query for entry in buffer._entries], ['query 0', 'query 1', 'query 2'])
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(SearchHistory.objects.count(), 3)
+
+    def test_entries_are_saved_one_by_one_after_repeated_failures(self):
+        buffer = self.make_buffer(max_attempts=2)
+        buffer.record(self.user, 'kept')
+        buffer.record(User(pk=999, username='deleted'), 'dropped')
+        buffer.record(self.user, 'also kept')
+
+        with self.assertLogs('core.history', 'WARNING'):
+            self.assertEqual(buffer.flush(), 0)
+        with self.assertLogs('core.history', 'ERROR'):
+            self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(sorted(SearchHistory.objects.values_list('query', flat=True)), ['also kept', 'kept'])
+        self.assertEqual(len(buffer), 0)
+
+    def test_writes_inside_transactions_are_synchronous(self):
+        buffer = self.make_buffer()
+        with transaction.atomic():
+            buffer.record(self.user, 'atomic')
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(SearchHistory.objects.count(), 1)
+
+
+class SearchHistoryViewTests(TestCase):
+    def setUp(self):
+        self.stub = GoogleBooksStub().start()
+        self.addCleanup(self.stub.stop)
+        google_books.volume_cache.clear()
+        self.addCleanup(google_books.volume_cache.clear)
+        self.user = User.objects.create_user(username='reader', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_search_records_history(self):
+        with override_settings(GOOGLE_BOOKS_API_URL=self.stub.url, SEARCH_HISTORY_WRITE_BEHIND=False):
+            self.client.get('/api/search/', {'q': 'history'})
+        self.assertEqual(len(history_buffer), 0)
+        self.assertEqual(list(SearchHistory.objects.values_list('query', flat=True)), ['history'])
+
+
+class SearchRollupTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+
+    def entry(self, user, query, day):
+        return SearchHistory(user=user, query=query,
+                             search_date=timezone.make_aware(datetime.combine(day, datetime.min.time())))
+
+    def rollups(self):
+        return (
+            set(SearchQueryDaily.objects.values_list('day', 'query', 'count')),
+            set(UserSearchDaily.objects.values_list('user__username', 'day', 'count')),
+        )
+
+    def test_rollups_follow_history_writes(self):
+        save_history([self.entry(self.alice, 'Django', self.today), self.entry(self.bob, ' django  ', self.today)])
+        save_history([self.entry(self.alice, 'Rust', self.yesterday), self.entry(self.alice, 'DJANGO', self.today)])
+
+        self.assertEqual(self.rollups(), (
+            {(self.today, 'django', 3), (self.yesterday, 'rust', 1)},
+            {('alice', self.today, 2), ('alice', self.yesterday, 1), ('bob', self.today, 1)},
+        ))
+
+    def test_backfill_rebuilds_rollups(self):
+        entries = [self.entry(self.alice, 'Django', self.today), self.entry(self.bob, 'django', self.today),
+                   self.entry(self.alice, 'Rust', self.yesterday)]
+        save_history(entries)
+        expected = self.rollups()
+        SearchQueryDaily.objects.update(count=100)
+        UserSearchDaily.objects.filter(day=self.today).delete()
+
+        call_command('backfill_search_rollups', chunk_size=2, stdout=StringIO())
+        self.assertEqual(self.rollups(), expected)
+
+    def test_backfill_since(self):
+        save_history([self.entry(self.alice, 'Django', self.today), self.entry(self.alice, 'Rust', self.yesterday)])
+        SearchQueryDaily.objects.update(count=100)
+
+        call_command('backfill_search_rollups', since=self.today, stdout=StringIO())
+        self.assertEqual(set(SearchQueryDaily.objects.values_list('query', 'count')), {('django', 1), ('rust', 100)})
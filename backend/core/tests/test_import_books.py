@@ -0,0 +1,115 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.models import Book
+
+
+def book_row(i, **fields):
+    return {
+        'isbn': str(1000000000000 + i),
+        'title': f'Imported {i}',
+        'author': 'Supplier',
+        'description': 'Line one\nline two',
+        'price': '12.50',
+        'stock': '3',
+        'published_date': '2021-02-03',
+        **fields,
+    }
+
+
+class ImportBooksCommandTests(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write_csv(self, name, rows, opener=open):
+        path = os.path.join(self.tmpdir.name, name)
+        with opener(path, 'wt', newline='') as handle:
+            writer = csv.DictWriter(handle, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def write_jsonl(self, name, lines, opener=open):
+        path = os.path.join(self.tmpdir.name, name)
+        with opener(path, 'wt') as handle:
+            for line in lines:
+                handle.write((line if isinstance(line, str) else json.dumps(line)) + '\n')
+        return path
+
+    def run_import(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_books', path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_imports_csv_in_chunks(self):
+        path = self.write_csv('books.csv', [book_row(i) for i in range(25)])
+        out, _ = self.run_import(path, chunk_size=10)
+
+        self.assertEqual(Book.objects.count(), 25)
+        book = Book.objects.get(isbn='1000000000000')
+        self.assertEqual((book.price, book.stock, book.description), (Decimal('12.50'), 3, 'Line one\nline two'))
+        self.assertIn('rows/s', out)
+        self.assertIn('25 inserted', out)
+
+    def test_imports_gzipped_jsonl_with_workers(self):
+        rows = [book_row(i) for i in range(30)]
+        path = self.write_jsonl('books.jsonl.gz', rows, opener=gzip.open)
+        self.run_import(path, chunk_size=7, workers=2)
+        self.assertEqual(Book.objects.count(), 30)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        lines = [book_row(1), book_row(2, price='free'), book_row(3, isbn=''), '{broken', book_row(4, published_date='2021')]
+        path = self.write_jsonl('books.jsonl', lines)
+        out, err = self.run_import(path)
+
+        self.assertEqual(Book.objects.count(), 1)
+        self.assertIn('4 invalid', out)
+        self.assertIn("invalid price 'free'", err)
+
+    def test_prices_that_cannot_be_stored_are_row_errors(self):
+        prices = ['NaN', 'Infinity', '-Infinity', '123456789.00', '1.005']
+        lines = [book_row(1, price='99999999.99')] + [book_row(i, price=price) for i, price in enumerate(prices, 2)]
+        out, err = self.run_import(self.write_jsonl('books.jsonl', lines))
+
+        self.assertEqual(list(Book.objects.values_list('price', flat=True)), [Decimal('99999999.99')])
+        self.assertIn('5 invalid', out)
+        self.assertIn("invalid price 'NaN'", err)
+        self.assertIn("invalid price 'Infinity'", err)
+        self.assertIn("price '123456789.00' has more than 10 digits", err)
+        self.assertIn("price '1.005' has more than 2 decimal places", err)
+
+    def test_fractional_stock_is_a_row_error(self):
+        lines = [book_row(1, stock=4.0), book_row(2, stock=2.5), book_row(3, stock='2.5')]
+        out, err = self.run_import(self.write_jsonl('books.jsonl', lines))
+
+        self.assertEqual(list(Book.objects.values_list('stock', flat=True)), [4])
+        self.assertIn('2 invalid', out)
+        self.assertIn('stock 2.5 is not a whole number', err)
+        self.assertIn("invalid stock '2.5'", err)
+
+    def test_existing_books_are_skipped_or_updated(self):
+        Book.objects.create(title='Old', author='Supplier', price=1, stock=1, isbn='1000000000000')
+        path = self.write_csv('books.csv', [book_row(0, price='9.99', stock='7'), book_row(1)])
+
+        out, _ = self.run_import(path)
+        self.assertIn('1 inserted, 0 updated, 1 skipped', out)
+
+        out, _ = self.run_import(path, update_fields='price,stock')
+        self.assertIn('0 inserted, 1 updated, 1 skipped', out)
+        book = Book.objects.get(isbn='1000000000000')
+        self.assertEqual((book.title, book.price, book.stock), ('Old', Decimal('9.99'), 7))
+
+    def test_rejects_unknown_update_fields(self):
+        path = self.write_csv('books.csv', [book_row(0)])
+        with self.assertRaises(CommandError):
+            self.run_import(path, update_fields='isbn')
@@ -0,0 +1,78 @@
+from datetime import date
+from decimal import Decimal
+
+from unittest import mock
+
+from django.test import TestCase
+
+from core import ingestion
+from core.ingestion import upsert_books
+from core.models import Book
+
+
+def book_row(isbn, **fields):
+    return {
+        'title': f'Book {isbn}',
+        'author': 'Author',
+        'description': 'Description',
+        'published_date': '2020-05-17',
+        'isbn': isbn,
+        'price': 10,
+        **fields,
+    }
+
+
+class UpsertBooksTests(TestCase):
+    def setUp(self):
+        self.existing = Book.objects.create(title='Existing', author='Author',
+                                            description='Old', price=5, isbn='1111111111111')
+
+    def test_inserts_new_and_skips_existing(self):
+        rows = [book_row('1111111111111'), book_row('2222222222222'), book_row('3333333333333')]
+        result = upsert_books(rows)
+
+        self.assertEqual((result.inserted, result.updated, result.skipped), (2, 0, 1))
+        self.assertEqual(Book.objects.count(), 3)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.price, Decimal('5.00'))
+        self.assertEqual(Book.objects.get(isbn='2222222222222').published_date, date(2020, 5, 17))
+
+    def test_skips_unusable_and_duplicate_isbns(self):
+        rows = [book_row(''), book_row('ISSN:0000-00000000'), book_row('4444444444444'), book_row('4444444444444')]
+        result = upsert_books(rows)
+        self.assertEqual((result.inserted, result.skipped), (1, 3))
+
+    def test_books_inserted_concurrently_are_not_counted(self):
+        plan = ingestion._plan
+
+        def plan_then_race(*args):
+            planned = plan(*args)
+            # Another request inserts one of the new books first
+            Book.objects.create(title='Theirs', author='Author', price=1, isbn='2222222222222')
+            return planned
+
+        rows = [book_row('2222222222222'), book_row('3333333333333')]
+        with mock.patch('core.ingestion._plan', side_effect=plan_then_race):
+            result = upsert_books(rows)
+        self.assertEqual((result.inserted, result.updated, result.skipped), (1, 0, 1))
+        self.assertEqual(Book.objects.get(isbn='2222222222222').title, 'Theirs')
+
+    def test_partial_dates_are_stored_empty(self):
+        upsert_books([book_row('5555555555555', published_date='2020')])
+        self.assertIsNone(Book.objects.get(isbn='5555555555555').published_date)
+
+    def test_update_fields_refresh_existing_books(self):
+        rows = [book_row('1111111111111', price='7.5', description='New')]
+        result = upsert_books(rows, update_fields=('price', 'description'))
+
+        self.assertEqual((result.inserted, result.updated, result.skipped), (0, 1, 0))
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.price, self.existing.description), (Decimal('7.50'), 'New'))
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        rows = [book_row(str(6000000000000 + i)) for i in range(50)]
+        rows.append(book_row('1111111111111', price=99))
+        # savepoint, isbn__in lookup, count, bulk insert, count, bulk update, release savepoint
+        with self.assertNumQueries(7):
+            upsert_books(rows, update_fields=('price', 'description'))
+        self.assertEqual(Book.objects.count(), 51)
@@ -0,0 +1,119 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from core.inventory import (OutOfStock, decrement_stock, increment_stock, rebalance_stock, shard_stock,
+                            split_evenly, stock_levels)
+from core.models import Book, StockShard
+
+
+def make_book(isbn='1000000000001', stock=10):
+    return Book.objects.create(title=f'Book {isbn}', author='Author', price=Decimal('4.00'), stock=stock, isbn=isbn)
+
+
+def shard_stocks(book):
+    return list(book.shards.order_by('shard').values_list('stock', flat=True))
+
+
+class ShardedStockTests(TestCase):
+    def setUp(self):
+        self.book = make_book(stock=10)
+        shard_stock(self.book.id, 4)
+        self.book.refresh_from_db()
+
+    def test_split_evenly(self):
+        self.assertEqual(split_evenly(10, 4), [3, 3, 2, 2])
+        self.assertEqual(split_evenly(2, 4), [1, 1, 0, 0])
+        self.assertEqual(split_evenly(-1, 2), [0, 0])
+
+    def test_convert_keeps_the_units(self):
+        self.assertEqual((self.book.stock_shards, self.book.stock), (4, 10))
+        self.assertEqual(shard_stocks(self.book), [3, 3, 2, 2])
+
+        decrement_stock({self.book.id: 3})
+        shard_stock(self.book.id, 0)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.stock_shards, self.book.stock), (0, 7))
+        self.assertFalse(StockShard.objects.exists())
+
+    def test_decrement_takes_from_the_shards(self):
+        decrement_stock({self.book.id: 2})
+        self.book.refresh_from_db()
+        # Book.stock is only refreshed by rebalancing; the shards are exact
+        self.assertEqual(self.book.stock, 10)
+        self.assertEqual(sum(shard_stocks(self.book)), 8)
+        self.assertEqual(stock_levels([self.book]), {self.book.id: 8})
+
+    def test_decrement_spanning_shards_rebalances(self):
+        with self.assertNumQueries(7):
+            decrement_stock({self.book.id: 9}, shards={self.book.id: 4})
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.stock, 1)
+        self.assertEqual(shard_stocks(self.book), [1, 0, 0, 0])
+
+    def test_decrement_never_oversells(self):
+        other = make_book('1000000000002', stock=5)
+        with self.assertRaises(OutOfStock) as raised:
+            decrement_stock({self.book.id: 11, other.id: 1})
+        self.assertEqual(raised.exception.books, [self.book])
+        other.refresh_from_db()
+        self.assertEqual(other.stock, 5)
+        self.assertEqual(shard_stocks(self.book), [3, 3, 2, 2])
+
+    def test_increment_adds_to_a_shard(self):
+        increment_stock({self.book.id: 5})
+        self.assertEqual(sum(shard_stocks(self.book)), 15)
+
+    def test_rebalance_evens_out_shards_and_refreshes_the_total(self):
+        StockShard.objects.filter(book=self.book, shard=0).update(stock=0)
+        self.assertEqual(rebalance_stock(), 1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.stock, 7)
+        self.assertEqual(shard_stocks(self.book), [2, 2, 2, 1])
+
+    def test_setting_stock_through_the_api_replaces_the_shards(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='staff'))
+        response = client.patch(f'/api/books/{self.book.id}/', {'stock': 6})
+        self.assertNotIn('stock_shards', response.data)
+        self.assertEqual(shard_stocks(self.book), [2, 2, 1, 1])
+
+    def test_checkout_and_cancel_use_the_shards(self):
+        user = User.objects.create_user(username='buyer')
+        client = APIClient()
+        client.force_authenticate(user)
+        client.post('/api/cart-items/', {'book_id': self.book.id, 'quantity': 3})
+        order = client.post('/api/orders/').data
+        self.assertEqual(sum(shard_stocks(self.book)), 7)
+
+        # Reservations check the shards, not the stale Book.stock
+        StockShard.objects.filter(book=self.book).update(stock=0)
+        response = client.post('/api/cart-items/', {'book_id': self.book.id, 'quantity': 1})
+        self.assertEqual(str(response.data['error']), 'Only 0 items available in stock')
+
+        client.post(f'/api/orders/{order["id"]}/cancel_order/')
+        self.assertEqual(sum(shard_stocks(self.book)), 3)
+
+
+class StockCommandTests(TestCase):
+    def test_shard_and_rebalance_commands(self):
+        book = make_book(stock=9)
+        out = StringIO()
+        call_command('shard_stock', book.isbn, '--shards', '3', stdout=out)
+        self.assertIn(f'{book.isbn}: 9 in stock across 3 shards', out.getvalue())
+        self.assertEqual(shard_stocks(book), [3, 3, 3])
+
+        call_command('rebalance_stock', stdout=out)
+        self.assertIn('Rebalanced 1 sharded books', out.getvalue())
+
+        call_command('shard_stock', book.isbn, '--shards', '0', stdout=out)
+        self.assertIn(f'{book.isbn}: 9 in stock across a single counter', out.getvalue())
+
+    def test_shard_stock_rejects_unknown_books(self):
+        with self.assertRaisesMessage(CommandError, 'No book with isbn 9999999999999'):
+            call_command('shard_stock', '9999999999999')
@@ -0,0 +1,92 @@
+import json
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.middleware import ProfilingMiddleware
+from core.profiling import StackSampler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class StackSamplerTests(TestCase):
+    def test_collects_collapsed_stacks(self):
+        with StackSampler(threading.get_ident(), 0.001) as sampler:
+            busy(0.05)
+        self.assertTrue(sampler.stacks)
+        self.assertTrue(any('core.tests.test_profiling:busy' in stack for stack in sampler.stacks))
+        stack = next(iter(sampler.stacks))
+        self.assertNotIn(' ', stack.rsplit(';', 1)[-1])
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.dir = Path(tmpdir.name)
+        self.staff = User.objects.create_user(username='staff', password='password', is_staff=True)
+        self.customer = User.objects.create_user(username='customer', password='password')
+
+    def profiles(self):
+        return sorted(self.dir.glob('*.json'))
+
+    def test_staff_header_profiles_request(self):
+        self.client.force_login(self.staff)
+        with override_settings(PROFILE_DIR=self.dir, PROFILE_SAMPLE_RATE=0):
+            response = self.client.get('/api/books/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        [meta_path] = self.profiles()
+        self.assertEqual(response['X-Profile-Id'], meta_path.stem)
+        meta = json.loads(meta_path.read_text())
+        self.assertEqual(meta['endpoint'], 'books-list')
+        self.assertEqual(meta['status'], 200)
+        self.assertTrue((self.dir / meta['folded']).exists())
+
+    def test_header_ignored_for_customers(self):
+        self.client.force_login(self.customer)
+        with override_settings(PROFILE_DIR=self.dir, PROFILE_SAMPLE_RATE=0):
+            response = self.client.get('/api/books/', HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.profiles(), [])
+
+    def test_sample_rate(self):
+        self.client.force_login(self.customer)
+        with override_settings(PROFILE_DIR=self.dir, PROFILE_SAMPLE_RATE=1.0):
+            self.client.get('/api/books/')
+            self.client.get('/api/carts/')
+        self.assertEqual(len(self.profiles()), 2)
+
+    @override_settings(PROFILE_SAMPLE_RATE=0, PROFILE_HEADER=None)
+    def test_disabled_removes_itself(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+    def test_report(self):
+        self.client.force_login(self.staff)
+        with override_settings(PROFILE_DIR=self.dir):
+            for _ in range(3):
+                self.client.get('/api/books/', HTTP_X_PROFILE='1')
+            self.client.get('/api/orders/', HTTP_X_PROFILE='1')
+
+        merged = self.dir / 'merged'
+        out = StringIO()
+        call_command('profile_report', dir=str(self.dir), merge_to=str(merged), stdout=out)
+        output = out.getvalue()
+        self.assertIn('books-list: 3 requests', output)
+        self.assertIn('orders-list: 1 requests', output)
+        self.assertTrue((merged / 'books-list.folded').exists())
+
+        out = StringIO()
+        call_command('profile_report', dir=str(self.dir), endpoint='orders-list', stdout=out)
+        self.assertNotIn('books-list', out.getvalue())
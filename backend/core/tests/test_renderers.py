@@ -0,0 +1,61 @@
+import io
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import FastJSONParser, FastJSONRenderer
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def assert_same_output(self, data, *args):
+        self.assertEqual(FastJSONRenderer().render(data, *args), JSONRenderer().render(data, *args))
+
+    def test_matches_drf_output(self):
+        self.assert_same_output({
+            'price': Decimal('12.50'),
+            'created': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+            'naive': datetime(2024, 5, 1, 12, 30),
+            'day': date(2024, 5, 1),
+            'label': gettext_lazy('Books'),
+            'title': 'Ünïcode   line   separators',
+            'counts': {1: 2},
+            'items': [{'id': 1, 'stock': None, 'active': True, 'score': 1.5}],
+        })
+
+    def test_falls_back_to_drf(self):
+        # Pretty printing and integers beyond 64 bits are left to the stdlib
+        self.assert_same_output({'a': [1, 2]}, 'application/json; indent=4')
+        self.assert_same_output({'big': 2 ** 70})
+
+    def test_none_renders_empty(self):
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+
+class FastJSONParserTests(SimpleTestCase):
+    def parse(self, body):
+        return FastJSONParser().parse(io.BytesIO(body))
+
+    def test_parses_json(self):
+        self.assertEqual(self.parse('{"title": "Ünïcode", "quantity": 2}'.encode()),
+                         {'title': 'Ünïcode', 'quantity': 2})
+
+    def test_rejects_invalid_json(self):
+        for body in (b'{"quantity": }', b'{"quantity": NaN}'):
+            with self.assertRaises(ParseError):
+                self.parse(body)
+
+
+class NegotiationTests(TestCase):
+    def test_api_renders_and_parses_with_orjson(self):
+        user = User.objects.create_user(username='reader', password='password')
+        self.client.force_login(user)
+        response = self.client.post('/api/cart-items/', '{"book_id": 999, "quantity": 1}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertIn('book_id', response.json())
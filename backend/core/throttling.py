@@ -0,0 +1,211 @@
+"""
+Token bucket rate limits, as DRF throttles.
+
+A rate 'N/period' from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] is a bucket
+of N tokens per key that refills continuously over the period: bursts of up
+to N requests go through, then one request per period/N. A rejected request
+gets a 429 with Retry-After set to when the next token arrives.
+
+Buckets live in this process, or in the default cache when RATE_LIMIT_STORE
+is 'cache' so that all workers sharing it share the limits. The cache store
+reads and writes each bucket without a lock, so concurrent workers may let
+a few extra requests through.
+
+Login, register and HTTP Basic credentials are limited per client IP and per
+username before any password is hashed: login and register authenticate with
+sessions only, and ThrottledBasicAuthentication checks the buckets before it
+checks the password. Basic credentials spend login tokens only when the
+password is wrong, so signed in clients are limited by their user bucket alone.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import exceptions
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+def refill(tokens, elapsed, capacity, period, spend=True):
+    """
+    Take one token from a bucket holding `tokens` `elapsed` seconds ago, or
+    with spend=False only check there is one. Returns the tokens left and 0,
+    or the tokens unchanged and the seconds until the next one.
+    """
+    tokens = min(capacity, tokens + elapsed * capacity / period)
+    if tokens >= 1:
+        return tokens - spend, 0.0
+    return tokens, (1 - tokens) * period / capacity
+
+
+class LocalBuckets:
+    """Token buckets in process memory; past `max_keys` the least recently used are dropped"""
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period, spend=True):
+        now = self.clock()
+        with self._lock:
+            if not spend:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                return refill(tokens, now - updated, capacity, period, spend=False)[1]
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens, wait = refill(tokens, now - updated, capacity, period)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                # A dropped bucket comes back full
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBuckets:
+    """Token buckets in the default cache, shared by the processes using it"""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+
+    def take(self, key, capacity, period, spend=True):
+        now = self.clock()
+        tokens, updated = cache.get(key, (capacity, now))
+        tokens, wait = refill(tokens, now - updated, capacity, period, spend)
+        if spend:
+            # A bucket left alone for a period is full again, as a missing one is
+            cache.set(key, (tokens, now), period)
+        return wait
+
+    def clear(self):
+        pass
+
+
+local_buckets = LocalBuckets()
+cache_buckets = CacheBuckets()
+
+
+def bucket_store():
+    return cache_buckets if settings.RATE_LIMIT_STORE == 'cache' else local_buckets
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    SimpleRateThrottle with a token bucket per key instead of a list of
+    request times. Rates are read when the throttle is created, so
+    overridden settings apply.
+    """
+    cache_format = 'ratelimit:%(scope)s:%(ident)s'
+
+    def get_rate(self):
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(f"No throttle rate set for the '{self.scope}' scope")
+
+    def allow_request(self, request, view, spend=True):
+        """Take a token; with spend=False only check that there is one"""
+        self._wait = 0.0
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        self._wait = bucket_store().take(key, self.num_requests, self.duration, spend)
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+class AnonBucketThrottle(TokenBucketThrottle):
+    """Anonymous requests, per client IP"""
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class UserBucketThrottle(TokenBucketThrottle):
+    """Authenticated requests, per user"""
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': request.user.pk}
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    """Password attempts, per client IP"""
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginUsernameThrottle(TokenBucketThrottle):
+    """Password attempts, per username whatever the IP; the username comes from the body unless given"""
+    scope = 'login_username'
+
+    def __init__(self, username=None):
+        super().__init__()
+        self.username = username
+
+    def get_cache_key(self, request, view):
+        username = self.username
+        if username is None:
+            data = request.data
+            username = data.get('username') if hasattr(data, 'get') else None
+        if not isinstance(username, str) or not username.strip():
+            return None
+        # Usernames are hashed to keep the cache keys short and safe
+        ident = hashlib.sha256(username.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class RegisterIPThrottle(LoginIPThrottle):
+    """Sign ups, per client IP"""
+    scope = 'register_ip'
+
+
+def check_throttles(request, throttle_classes=None):
+    """
+    The throttle check of DRF views, for plain Django ones: raises Throttled
+    when one of `throttle_classes`, by default DEFAULT_THROTTLE_CLASSES,
+    refuses `request`. request.user must already be loaded.
+    """
+    throttles = [throttle() for throttle in throttle_classes or api_settings.DEFAULT_THROTTLE_CLASSES]
+    waits = [throttle.wait() for throttle in throttles if not throttle.allow_request(request, None)]
+    if waits:
+        raise exceptions.Throttled(max(waits))
+
+
+class ThrottledBasicAuthentication(BasicAuthentication):
+    """
+    BasicAuthentication that checks the login buckets before hashing the
+    password and spends their tokens when the password is wrong
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        throttles = [LoginIPThrottle(), LoginUsernameThrottle(username=userid)]
+        waits = [throttle.wait() for throttle in throttles if not throttle.allow_request(request, None, spend=False)]
+        if waits:
+            raise exceptions.Throttled(max(waits))
+        try:
+            return super().authenticate_credentials(userid, password, request)
+        except exceptions.AuthenticationFailed:
+            for throttle in throttles:
+                throttle.allow_request(request, None)
+            raise
@@ -1,48 +1,106 @@
-from datetime import datetime
+import httpx
 import requests
-from rest_framework.decorators import api_view
-from rest_framework import viewsets, status, filters, serializers
-from rest_framework.decorators import action
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions, viewsets, status, filters, serializers
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes, throttle_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db import transaction
-from .models import Book, Cart, CartItem, Order, SearchHistory
-from .serializers import BookSerializer, CartSerializer, CartItemSerializer, OrderSerializer
+from django.conf import settings
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.models import User
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
-
-class BookViewSet(viewsets.ModelViewSet):
+from django.db import transaction
+from django.db.models import Count, Max, Prefetch, Sum
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from .models import Book, Cart, CartItem, Order, OrderItem, SearchQueryDaily, UserSearchDaily
+from .serializers import (BatchSerializer, BookSerializer, CartSerializer, CartItemLineSerializer,
+                          CartItemSerializer, OrderSerializer, OrderSummarySerializer,
+                          SearchAnalyticsQuerySerializer)
+from .batch import SAFE_METHODS as BATCH_SAFE_METHODS, run_batch
+from .compiled_serializers import CompiledReadMixin, CompiledSerializer
+from .conditional import ConditionalGetMixin, catalog_state, latest, owner_state
+from .fieldsets import SparseFieldsetMixin
+from .filters import FullTextSearchFilter
+from .google_books import afetch_volumes, fetch_volumes, volume_books
+from .history import record_search
+from .ingestion import aupsert_books, upsert_books
+from .inventory import (OutOfStock, available_stock, decrement_stock, hold_stock, increment_stock, lock_books,
+                        reserve_stock, stock_edited)
+from .pagination import PageNumberOrKeysetMixin
+from .replicas import ReplicaReadMixin
+from .throttling import LoginIPThrottle, LoginUsernameThrottle, RegisterIPThrottle, check_throttles
+
+class BookViewSet(ReplicaReadMixin, ConditionalGetMixin, PageNumberOrKeysetMixin, SparseFieldsetMixin,
+                  CompiledReadMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
+    # Reads render straight from .values() rows; writes still use BookSerializer
+    read_serializer = CompiledSerializer(BookSerializer, sources={'stock': 'current_stock'})
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'author', 'description']
     filterset_fields = ['author']
-    ordering_fields = ['price', 'title', 'created_at']
+    # Each ordering has a matching (field, id) index for keyset pagination
+    ordering_fields = ['price', 'title']
 
     def get_queryset(self):
-        queryset = Book.objects.all()
+        queryset = Book.objects.with_current_stock()
         # Filter out books with no stock
         if self.request.query_params.get('in_stock_only'):
-            queryset = queryset.filter(stock__gt=0)
+            queryset = queryset.in_stock()
         return queryset
 
-class CartViewSet(viewsets.ModelViewSet):
+    def get_read_serializer(self):
+        # values() then selects only the columns of the fields left
+        if self.get_fieldset() is None:
+            return self.read_serializer
+        return self.read_serializer.subset(self.get_serializer().fields)
+
+    def get_validators(self):
+        if self.action == 'retrieve':
+            try:
+                books = self.get_queryset().filter(pk=self.kwargs['pk'])
+            except (TypeError, ValueError):
+                return None
+            # Stock taken from shards leaves Book.updated_at alone
+            state = books.annotate(shards_updated_at=Max('shards__updated_at')) \
+                .values_list('updated_at', 'shards_updated_at').first()
+            if state is None:
+                return None
+            return ('book', *state), latest(*state)
+        return catalog_state()
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            stock_edited(serializer.save(), serializer.validated_data)
+
+class CartViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         # Users can only see their own cart
-        return Cart.objects.filter(user=self.request.user)
-
-    def retrieve(self, request, *args, **kwargs):
+        queryset = self.sparse_queryset(Cart.objects.filter(user=self.request.user).with_totals())
+        items = self.sparse_queryset(CartItem.objects.select_related('book').with_line_totals().with_book_stock(),
+                                     'items', keep=['cart'])
+        if items is None:
+            # e.g. ?fields=total_items for a cart badge: no lines to load
+            return queryset
+        return queryset.prefetch_related(Prefetch('cart_items', queryset=items))
+
+    def get_validators(self):
+        return owner_state(Cart.objects.filter(user=self.request.user), 'cart_items')
+
+    def get_object(self):
+        if self.action != 'retrieve':
+            return super().get_object()
         # Get or create cart for user
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data)
+        cart, created = Cart.objects.get_or_create(user=self.request.user)
+        return self.get_queryset().get(pk=cart.pk)
 
 class CartItemViewSet(viewsets.ModelViewSet):
     serializer_class = CartItemSerializer
@@ -51,7 +109,7 @@ class CartItemViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         # Users can only see their own cart items
         cart = self.get_user_cart()
-        return CartItem.objects.filter(cart=cart)
+        return CartItem.objects.filter(cart=cart).select_related('book').with_line_totals().with_book_stock()
 
     def get_user_cart(self):
         """Get or create cart for the current user"""
@@ -63,103 +121,209 @@ class CartItemViewSet(viewsets.ModelViewSet):
         book = serializer.validated_data['book']
         quantity = serializer.validated_data['quantity']
 
-        # Check if book is in stock
-        if book.stock < quantity:
-            raise serializers.ValidationError({
-                'error': f'Only {book.stock} items available in stock'
-            })
-
-        # Check if item already exists in cart
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            book=book,
-            defaults={'quantity': quantity}
-        )
-
-        if not created:
-            # Update quantity if item already exists
-            cart_item.quantity += quantity
-            if cart_item.quantity > book.stock:
+        with transaction.atomic():
+            # Check if item already exists in cart
+            cart_item, created = CartItem.objects.get_or_create(
+                cart=cart,
+                book=book,
+                defaults={'quantity': quantity}
+            )
+            if not created:
+                # Update quantity if item already exists
+                cart_item.quantity += quantity
+
+            # Hold the units for this cart; rolls back the new item if they are not available
+            try:
+                reserve_stock([cart_item])
+            except OutOfStock as exc:
+                available = exc.books[0].available
                 raise serializers.ValidationError({
-                    'error': f'Cannot add more than {book.stock} items'
+                    'error': f'Only {available} items available in stock' if created
+                    else f'Cannot add more than {available} items'
                 })
-            cart_item.save()
+            if not created:
+                cart_item.save()
+        cart.touch()
 
     def perform_update(self, serializer):
-        cart_item = self.get_object()
-        new_quantity = serializer.validated_data['quantity']
+        with transaction.atomic():
+            cart_item = serializer.save()
+            try:
+                reserve_stock([cart_item])
+            except OutOfStock as exc:
+                raise serializers.ValidationError({
+                    'error': f'Only {exc.books[0].available} items available in stock'
+                })
+        cart_item.cart.touch()
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        instance.cart.touch()
 
-        # Check stock
-        if new_quantity > cart_item.book.stock:
-            raise serializers.ValidationError({
-                'error': f'Only {cart_item.book.stock} items available in stock'
-            })
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Add a list of {book_id, quantity} lines to the cart at once, e.g. to
+        reorder a past order. Each line is added like a single POST and gets
+        its own result; lines that do not fit in stock are left out. Runs in
+        one transaction with a fixed number of queries, whatever the length.
+        """
+        lines = CartItemLineSerializer(data=request.data, many=True, allow_empty=False,
+                                       max_length=settings.CART_BULK_MAX_LINES)
+        lines.is_valid(raise_exception=True)
+        cart = self.get_user_cart()
+        book_ids = {line['book_id'] for line in lines.validated_data}
 
-        serializer.save()
+        results, created, updated = [], {}, {}
+        with transaction.atomic():
+            items = {item.book_id: item for item in cart.cart_items.filter(book_id__in=book_ids)}
+            # One locking query checks the stock of every book
+            books = available_stock(book_ids, exclude_items=[item.pk for item in items.values()])
+            for line in lines.validated_data:
+                book_id, quantity = line['book_id'], line['quantity']
+                result = {'book_id': book_id, 'quantity': quantity}
+                results.append(result)
+                book, item = books.get(book_id), items.get(book_id)
+                if book is None:
+                    result.update(status='error', error='Book not found')
+                    continue
+                if (item.quantity if item else 0) + quantity > book.available:
+                    result.update(status='error', error=f'Only {book.available} items available in stock'
+                                  if item is None else f'Cannot add more than {book.available} items')
+                    continue
+
+                if item is None:
+                    item = items[book_id] = created[book_id] = CartItem(cart=cart, book=book, quantity=quantity)
+                    result.update(status='created', item=item)
+                    continue
+                item.book = book
+                item.quantity += quantity
+                if book_id not in created:
+                    updated[book_id] = item
+                result.update(status='updated', item=item)
+
+            CartItem.objects.bulk_create(created.values())
+            CartItem.objects.bulk_update(updated.values(), ['quantity'])
+            hold_stock([*created.values(), *updated.values()])
+        if created or updated:
+            cart.touch()
+
+        for result in results:
+            if 'item' in result:
+                result['item'] = CartItemSerializer(result['item']).data
+        return Response({'results': results})
 
     @action(detail=False, methods=['post'])
     def clear_cart(self, request):
         cart = self.get_user_cart()
-        cart.items.all().delete()
+        cart.cart_items.all().delete()
+        cart.touch()
         return Response({'message': 'Cart cleared successfully'})
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ReplicaReadMixin, ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     ordering_fields = ['created_at', 'total_price']
+    # Newest first, along the (user, created_at, id) index
+    ordering = ['-created_at', '-id']
+
+    def is_summary(self):
+        """?summary=1: orders with their item counts instead of their lines"""
+        return self.action in ('list', 'retrieve') and \
+            self.request.query_params.get('summary', '').lower() in ('1', 'true')
+
+    def get_serializer_class(self):
+        return OrderSummarySerializer if self.is_summary() else OrderSerializer
 
     def get_queryset(self):
         # Users can only see their own orders
-        return Order.objects.filter(user=self.request.user)
+        queryset = self.sparse_queryset(Order.objects.filter(user=self.request.user))
+        if self.is_summary():
+            return queryset.annotate(
+                item_count=Count('order_items'),
+                total_quantity=Coalesce(Sum('order_items__quantity'), 0),
+            )
+        if self.action == 'cancel_order':
+            return queryset
+        # One query for the lines of the whole page and their books
+        items = self.sparse_queryset(OrderItem.objects.select_related('book').with_book_stock(), 'items',
+                                     keep=['order'])
+        if items is None:
+            return queryset
+        return queryset.prefetch_related(Prefetch('order_items', queryset=items))
+
+    def get_validators(self):
+        return owner_state(Order.objects.filter(user=self.request.user), 'order_items')
 
     def perform_create(self, serializer):
         with transaction.atomic():
             # Get user's cart
-            cart = Cart.objects.get(user=self.request.user)
-            cart_items = cart.items.all()
+            cart = Cart.objects.filter(user=self.request.user).first()
+            items = cart.cart_items.select_related('reservation', 'book') if cart else ()
+            cart_items = list(items)
 
             if not cart_items:
-                raise self.serializers.ValidationError({'error': 'Cart is empty'})
-
-            # Check stock for all items
-            for item in cart_items:
-                if item.quantity > item.book.stock:
-                    raise self.serializers.ValidationError({
-                        'error': f'Not enough stock for {item.book.title}'
-                    })
-
-            # Calculate total price
-            total_price = cart.total_price
-
-            # Create order
-            order = serializer.save(user=self.request.user, total_price=total_price)
+                raise serializers.ValidationError({'error': 'Cart is empty'})
 
-            # Create order items and update book stock
+            quantities, books = {}, {}
             for item in cart_items:
-                order.order_items.create(
-                    book=item.book,
-                    quantity=item.quantity,
-                    price=item.book.price
-                )
-                # Update book stock
-                item.book.stock -= item.quantity
-                item.book.save()
+                quantities[item.book_id] = quantities.get(item.book_id, 0) + item.quantity
+                books[item.book_id] = item.book
+
+            # Lines still covered by their reservation were checked when they
+            # were added; only the rest need their books locked and checked now
+            unreserved = [item for item in cart_items if not self.is_reserved(item)]
+            try:
+                reserve_stock(unreserved, hold=False)
+                # Update book stock with one guarded UPDATE, and sharded books' shards
+                decrement_stock(quantities, shards={
+                    book_id: book.stock_shards for book_id, book in books.items() if book.stock_shards
+                })
+            except OutOfStock as exc:
+                raise serializers.ValidationError({'error': str(exc)})
+
+            # Create order and its items
+            total_price = sum(books[book_id].price * quantity for book_id, quantity in quantities.items())
+            order = serializer.save(user=self.request.user, cart=cart, total_price=total_price)
+            order_items = OrderItem.objects.bulk_create([
+                OrderItem(order=order, book=books[book_id], quantity=quantity, price=books[book_id].price)
+                for book_id, quantity in quantities.items()
+            ])
+            # Rendered in the response as they are, like a prefetch would have,
+            # with their books' stock as it is after this checkout
+            stock = dict(Book.objects.with_current_stock().filter(id__in=quantities)
+                         .values_list('id', 'current_stock'))
+            for item in order_items:
+                item.book_stock = stock[item.book_id]
+            order._prefetched_objects_cache = {'order_items': order_items}
 
             # Clear the cart
-            cart.items.all().delete()
+            cart.cart_items.all().delete()
+            cart.touch()
+
+    @staticmethod
+    def is_reserved(item):
+        reservation = getattr(item, 'reservation', None)
+        return reservation is not None and reservation.active and reservation.quantity >= item.quantity
 
     @action(detail=True, methods=['post'])
     def cancel_order(self, request, pk=None):
         order = self.get_object()
-        if order.status == 'pending':
-            # Restore stock
-            with transaction.atomic():
-                for order_item in order.order_items.all():
-                    order_item.book.stock += order_item.quantity
-                    order_item.book.save()
-                order.status = 'cancelled'
-                order.save()
+        with transaction.atomic():
+            # Only the request that moves the order out of pending restores stock
+            cancelled = Order.objects.filter(pk=order.pk, status='pending').update(
+                status='cancelled', updated_at=timezone.now(),
+            )
+            if cancelled:
+                quantities = dict(
+                    order.order_items.values_list('book_id').annotate(quantity=Sum('quantity'))
+                )
+                books = lock_books(quantities)
+                increment_stock(quantities, shards={
+                    book_id: book.stock_shards for book_id, book in books.items() if book.stock_shards
+                })
+        if cancelled:
             return Response({'message': 'Order cancelled successfully'})
         else:
             return Response(
@@ -167,6 +331,42 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+class SearchAnalyticsViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    """
+    Search analytics for staff, read from the daily rollups only, so the
+    cost depends on the number of days and distinct queries asked for,
+    not on the size of SearchHistory.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get_params(self):
+        params = SearchAnalyticsQuerySerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
+
+    @action(detail=False, url_path='top-queries')
+    def top_queries(self, request):
+        """Most searched normalized queries between `since` and `until`"""
+        params = self.get_params()
+        days = {'day__gte': params['since'], 'day__lte': params['until']}
+        top = (SearchQueryDaily.objects.filter(**days)
+               .values('query').annotate(count=Sum('count')).order_by('-count', 'query')[:params['limit']])
+        total = UserSearchDaily.objects.filter(**days).aggregate(total=Sum('count'))['total'] or 0
+        return Response({'since': params['since'], 'until': params['until'], 'total': total, 'results': list(top)})
+
+    @action(detail=False, url_path='users')
+    def users(self, request):
+        """Searches per user per day between `since` and `until`, busiest first"""
+        params = self.get_params()
+        rows = UserSearchDaily.objects.filter(day__gte=params['since'], day__lte=params['until'])
+        if 'user' in params:
+            rows = rows.filter(user_id=params['user'])
+        rows = rows.values('day', 'user_id', 'user__username', 'count').order_by('-day', '-count', 'user_id')
+        return Response({'since': params['since'], 'until': params['until'], 'results': [
+            {'day': row['day'], 'user': row['user_id'], 'username': row['user__username'], 'count': row['count']}
+            for row in rows[:params['limit']]
+        ]})
+
 # Google Books API Integration
 @api_view(['GET'])
 def search_books(request):
@@ -174,48 +374,77 @@ def search_books(request):
     if not query:
         return Response({'error': 'Query parameter "q" is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    url = f'https://www.googleapis.com/books/v1/volumes?q={query}'
-    response = requests.get(url)
-    SearchHistory.objects.create(user=request.user, query=query)
-
-    if response.status_code != 200:
-        return Response({'error': 'Failed to fetch data from Google Books API'}, status=response.status_code)
-
-    data = response.json()
-    books = []
-
-    for item in data.get('items', []):
-        volume = item.get('volumeInfo', {})
-        books.append({
-            'title': volume.get('title', 'Unknown'),
-            'author': ', '.join(volume.get('authors', [])) if 'authors' in volume else 'Unknown',
-            'description': volume.get('description', ''),
-            'published_date': volume.get('publishedDate', ''),
-            'isbn': volume.get('industryIdentifiers', [{}])[0].get('identifier', ''),
-            'price' : volume.get('retailPrice', {}).get('amount', 0)
-        })
+    record_search(request.user, query)
+    try:
+        status_code, data = fetch_volumes(query)
+    except requests.RequestException:
+        status_code, data = status.HTTP_502_BAD_GATEWAY, None
+
+    if status_code != 200:
+        return Response({'error': 'Failed to fetch data from Google Books API'}, status=status_code)
+
+    books = volume_books(data)
 
     # Save books in database
-    for book in books:
-        if not Book.objects.filter(isbn=book['isbn']).exists():
-            if book['published_date']:
-                published_date = book['published_date']
-                try:
-                    correct_published_date = datetime.strptime(published_date, '%Y-%m-%d').date()
-                    Book.objects.create(title=book['title'],
-                                        author=book['author'],
-                                        description=book['description'],
-                                        published_date=correct_published_date,
-                                        isbn=book['isbn'],
-                                        price=book['price'])
-                except ValueError:
-                    correct_published_date = None
-
-    return Response(books, status=status.HTTP_200_OK)
+    update_fields = ('price', 'description') if settings.GOOGLE_BOOKS_UPDATE_EXISTING else ()
+    result = upsert_books(books, update_fields=update_fields)
+
+    return Response(books, status=status.HTTP_200_OK, headers={
+        'X-Books-Inserted': str(result.inserted),
+        'X-Books-Updated': str(result.updated),
+        'X-Books-Skipped': str(result.skipped),
+    })
+
 
+@require_GET
+async def search_books_async(request):
+    """
+    search_books as a native async view for ASGI servers. The upstream call
+    is awaited on a pooled client, so a slow Google Books does not hold a
+    worker thread; the database writes come after it for the same reason.
+    Authenticates with the session only, and spends tokens of the same anon
+    and user buckets as the rest of the API.
+    """
+    request.user = user = await request.auser()
+    try:
+        await sync_to_async(check_throttles)(request)
+    except exceptions.Throttled as exc:
+        return JsonResponse({'detail': exc.detail}, status=exc.status_code,
+                            headers={'Retry-After': '%d' % exc.wait})
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                            status=status.HTTP_403_FORBIDDEN)
+    query = request.GET.get('q')
+    if not query:
+        return JsonResponse({'error': 'Query parameter "q" is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        status_code, data = await afetch_volumes(query)
+    except TimeoutError:
+        status_code, data = status.HTTP_504_GATEWAY_TIMEOUT, None
+    except httpx.HTTPError:
+        status_code, data = status.HTTP_502_BAD_GATEWAY, None
+    await sync_to_async(record_search)(user, query)
+
+    if status_code != 200:
+        return JsonResponse({'error': 'Failed to fetch data from Google Books API'}, status=status_code)
+
+    books = volume_books(data)
+    update_fields = ('price', 'description') if settings.GOOGLE_BOOKS_UPDATE_EXISTING else ()
+    result = await aupsert_books(books, update_fields=update_fields)
+
+    return JsonResponse(books, safe=False, status=status.HTTP_200_OK, headers={
+        'X-Books-Inserted': str(result.inserted),
+        'X-Books-Updated': str(result.updated),
+        'X-Books-Skipped': str(result.skipped),
+    })
 
+# Session authentication only, which hashes nothing: a client over its
+# limit is turned away before create_user() or authenticate() hash a password
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@authentication_classes([SessionAuthentication])
+@throttle_classes([RegisterIPThrottle])
 def register(request):
     username = request.data.get('username')
     password = request.data.get('password')
@@ -247,6 +476,8 @@ def register(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@authentication_classes([SessionAuthentication])
+@throttle_classes([LoginIPThrottle, LoginUsernameThrottle])
 def login_view(request):
     username = request.data.get('username')
     password = request.data.get('password')
@@ -289,4 +520,20 @@ def current_user(request):
         return Response(
             {'error': 'Not authenticated'},
             status=status.HTTP_401_UNAUTHORIZED
-        )
\ No newline at end of file
+        )
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def batch(request):
+    """
+    Serve several API requests in one round trip. The body is
+    {"requests": [{"method", "path", "params", "body"}, ...]}; the response
+    is {"responses": [{"status", "headers", "body"}, ...]} in the same
+    order. Each sub-request gets the permission checks of its own view.
+    """
+    serializer = BatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    specs = serializer.validated_data['requests']
+    # A batch of reads does not need to pin the client to the primary
+    request._request.pin_to_primary = any(spec['method'] not in BATCH_SAFE_METHODS for spec in specs)
+    return run_batch(request._request, request.user, specs)
@@ -126,7 +126,7 @@ function OrderHistory() {
 
                             <div className="order-items">
                                 <h4>Order Items:</h4>
-                                {order.order_items && order.order_items.map(item => (
+                                {order.items && order.items.map(item => (
                                     <div key={item.id} className="order-item">
                                         <div className="order-item-details">
                                             <p className="item-title">{item.book?.title || 'Unknown Book'}</p>
@@ -71,6 +71,8 @@ export const cartAPI = {
     getCart: () => api.get('/carts/'),
     addToCart: (bookId, quantity = 1) =>
         api.post('/cart-items/', { book_id: bookId, quantity }),
+    // lines: [{ book_id, quantity }]; resolves to per-line results
+    addManyToCart: (lines) => api.post('/cart-items/bulk/', lines),
     updateCartItem: (itemId, quantity) =>
         api.patch(`/cart-items/${itemId}/`, { quantity }),
     removeFromCart: (itemId) => api.delete(`/cart-items/${itemId}/`),
@@ -79,8 +81,21 @@ export const cartAPI = {
 
 export const orderAPI = {
     getOrders: () => api.get('/orders/'),
+    // Item counts and totals only, without the lines and their books
+    getOrderSummaries: () => api.get('/orders/', { params: { summary: 1 } }),
     createOrder: () => api.post('/orders/'),
     cancelOrder: (orderId) => api.post(`/orders/${orderId}/cancel_order/`),
 };
 
+// requests: [{ method, path, params, body }] with paths relative to the API,
+// e.g. { path: '/carts/' }; resolves to [{ status, headers, body }] in order
+export const batchAPI = {
+    run: (requests) =>
+        api
+            .post('/batch/', {
+                requests: requests.map((request) => ({ ...request, path: `/api${request.path}` })),
+            })
+            .then((response) => response.data.responses),
+};
+
 export default api;
\ No newline at end of file